@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from ona.utils.metrics import metrics_registry
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -7,4 +8,11 @@ async def health_check():
     """
     Проверка работоспособности API
     """
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"}
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Текущие внутренние метрики приложения
+    """
+    return metrics_registry.collect()
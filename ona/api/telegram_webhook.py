@@ -1,14 +1,61 @@
 from fastapi import APIRouter, Request, Depends, HTTPException
-from ona.config.settings import TELEGRAM_BOT_TOKEN
+from ona.config.settings import TELEGRAM_BOT_TOKEN, settings
 from ona.core.services.telegram_service import TelegramService
+from ona.core.services.registry import service_registry
+from ona.core.services.update_queue import UpdateQueue, PRIORITY_NORMAL, PRIORITY_LOW
+from ona.core.services.update_dispatcher import update_dispatcher
+from ona.core.db.executor import db_executor
+from ona.core.services.conversation_writer import conversation_writer
+from ona.utils.metrics import metrics_registry
+from ona.utils.tokens import preload_encoding
+from ona.utils.update_decoder import RawUpdate
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/telegram", tags=["telegram"])
 
-# Создание экземпляра TelegramService
-telegram_service = TelegramService()
+# Ленивое создание TelegramService (Bot и Application) при первой обработке обновления
+telegram_service = service_registry.register("telegram_service", TelegramService)
+
+# Очередь обновлений: вебхук отвечает сразу, обработка идет в фоновых воркерах.
+# При перегрузке обычные сообщения, а затем и команды сбрасываются с вежливым ответом.
+# Обновления, ожидающие в очередях пользователей диспетчера, учитываются в лимитах
+update_queue = UpdateQueue(
+    lambda raw_update: telegram_service.dispatch_update(raw_update),
+    workers=settings.UPDATE_QUEUE_WORKERS,
+    maxsize=settings.UPDATE_QUEUE_MAXSIZE,
+    classifier=TelegramService.get_update_priority,
+    key=lambda raw_update: raw_update.user_id,
+    shed_thresholds={
+        PRIORITY_LOW: settings.UPDATE_QUEUE_SHED_LOW_AT,
+        PRIORITY_NORMAL: settings.UPDATE_QUEUE_SHED_NORMAL_AT,
+    },
+    on_shed=lambda raw_update: telegram_service.send_overload_reply(raw_update),
+    backlog=lambda: update_dispatcher.queued
+)
+metrics_registry.register("update_queue", update_queue.get_stats)
+
+@router.on_event("startup")
+async def start_update_queue():
+    """
+    Запуск воркеров очереди обновлений при старте приложения
+    """
+    # Кодировка для подсчета токенов чата загружается в потоке, а не на первом сообщении
+    await asyncio.get_running_loop().run_in_executor(None, preload_encoding)
+    await update_queue.start()
+
+@router.on_event("shutdown")
+async def stop_update_queue():
+    """
+    Дообработка принятых обновлений при остановке приложения
+    """
+    await update_queue.stop()
+    # Сообщения диалога, оставшиеся в буфере, записываются до остановки пула
+    await conversation_writer.close()
+    # Запросы к базе, начатые при дообработке, завершаются до остановки процесса
+    db_executor.shutdown()
 
 # Зависимость для проверки токена Telegram в заголовке
 async def verify_telegram_token(request: Request):
@@ -26,14 +73,23 @@ async def telegram_webhook(request: Request):
     Обработчик вебхуков от Telegram Bot API
     """
     try:
-        # Получение JSON-данных из запроса
-        update_data = await request.json()
-        logger.info(f"Получено обновление от Telegram: {update_data}")
+        # Быстрое декодирование: полный Update строится только при обработке
+        try:
+            raw_update = RawUpdate.from_bytes(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid update: {e}")
+        logger.debug(
+            "Получено обновление %s (%s) от %s",
+            raw_update.update_id, raw_update.update_type, raw_update.user_id
+        )
         
-        # Обработка обновления с помощью TelegramService
-        await telegram_service.process_update(update_data)
+        # Обновление обрабатывается в фоне, Telegram получает ответ сразу
+        if not await update_queue.enqueue(raw_update):
+            raise HTTPException(status_code=503, detail="Update queue is full")
         
         return {"status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при обработке вебхука: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,3 @@
+"""
+Бенчмарки производительности сервисов ONA
+"""
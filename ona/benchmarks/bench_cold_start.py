@@ -0,0 +1,94 @@
+"""
+Бенчмарк холодного старта: время импорта ona.main и время до первого
+ответа вебхука в свежем процессе интерпретатора
+
+Запуск:
+    python -m ona.benchmarks.bench_cold_start
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Корневая директория проекта
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Код, выполняемый в отдельном процессе: каждый запуск - настоящий холодный старт
+CHILD_CODE = """
+import json, time
+started = time.perf_counter()
+import ona.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+from ona.core.services.registry import service_registry
+
+with TestClient(ona.main.app) as client:
+    app_started = time.perf_counter()
+    response = client.post("/telegram/webhook", json={
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 1700000000, "text": "Привет",
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Анна"}
+        }
+    })
+    responded = time.perf_counter()
+    initialized = sorted(service_registry.get_stats()["initialized"])
+
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (responded - app_started) * 1000,
+    "total_ms": (responded - started) * 1000,
+    "status": response.status_code,
+    "initialized": initialized,
+}))
+"""
+
+
+def run_once() -> dict:
+    """
+    Один холодный старт в отдельном процессе
+
+    Returns:
+        dict: Замеры времени в миллисекундах
+    """
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "123456:benchmark")
+    env["PYTHONPATH"] = os.pathsep.join([ROOT_DIR, os.path.join(ROOT_DIR, "ona"), env.get("PYTHONPATH", "")])
+    # Фоновая обработка обновления не должна обращаться к Telegram
+    env.setdefault("UPDATE_QUEUE_WORKERS", "1")
+
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int = 5):
+    """
+    Запуск бенчмарка и вывод медиан по нескольким холодным стартам
+    """
+    samples = [run_once() for _ in range(runs)]
+
+    print(f"холодных стартов: {runs}")
+    for metric, title in (
+        ("import_ms", "импорт ona.main"),
+        ("first_response_ms", "первый ответ вебхука"),
+        ("total_ms", "всего"),
+    ):
+        values = [sample[metric] for sample in samples]
+        print(f"{title:<22} медиана {statistics.median(values):>8.1f} мс, максимум {max(values):>8.1f} мс")
+
+    print(f"статус ответа: {samples[-1]['status']}")
+    print(f"созданные при старте сервисы: {', '.join(samples[-1]['initialized']) or 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
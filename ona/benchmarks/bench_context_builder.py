@@ -0,0 +1,72 @@
+"""
+Бенчмарк сборки промпта чата: токены промпта на каждый запрос в прежнем
+варианте (системный промпт и последние 10 сообщений любой длины) и с
+бюджетом токенов и кратким содержанием ранней части диалога.
+
+Диалог синтетический: короткие вопросы пользователя и длинные ответы
+наставника. Краткое содержание составляется заглушкой фиксированной длины
+(в приложении - отдельным запросом к модели), токены считаются локально
+(tiktoken, если установлен, иначе приближенно).
+
+Запуск:
+    python -m ona.benchmarks.bench_context_builder
+"""
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ona.config.settings import settings
+from ona.core.services.context_builder import ContextBuilder
+from ona.utils import tokens
+
+EXCHANGES = 20
+SYSTEM_PROMPT = "Ты - ONA, AI-наставник для женщин. " * 20
+QUESTION = "Как мне справиться с тревогой перед важной встречей на работе?"
+ANSWER = (
+    "Тревога перед важной встречей - естественная реакция. Попробуй дыхание 4-7-8: "
+    "вдох на четыре счета, задержка на семь, выдох на восемь. "
+) * 12
+
+
+async def summarize(summary, rows):
+    """
+    Заглушка составления краткого содержания (около 150 токенов)
+    """
+    return "Пользователь обсуждает тревогу на работе и дыхательные практики. " * 6
+
+
+async def main():
+    builder = ContextBuilder(
+        model="gpt-4",
+        token_budget=settings.CHAT_TOKEN_BUDGET,
+        reply_min_tokens=settings.CHAT_REPLY_MIN_TOKENS,
+        summarize=summarize,
+        summary_min_messages=settings.CHAT_SUMMARY_MIN_MESSAGES
+    )
+    print(f"tiktoken: {'да' if tokens.tiktoken is not None else 'нет (приближенный подсчет)'}")
+    print(f"Бюджет: {builder.token_budget} токенов, минимальный ответ: {builder.reply_min_tokens}")
+    print(f"{'запрос':>6} {'до':>8} {'после':>8} {'история':>8} {'max_tokens':>10}")
+
+    history = []
+    for index in range(EXCHANGES):
+        context = builder.build(42, SYSTEM_PROMPT, history[-settings.CHAT_HISTORY_LIMIT:], QUESTION)
+        print(
+            f"{index + 1:>6} {context.baseline_tokens:>8} {context.prompt_tokens:>8} "
+            f"{context.history_messages:>8} {context.max_tokens:>10}"
+        )
+        await builder.wait()
+        for is_user, text in ((True, QUESTION), (False, ANSWER)):
+            history.append({"message_text": text, "is_user": is_user, "created_at": str(len(history))})
+
+    stats = builder.get_stats()
+    print(
+        f"Среднее: {stats['avg_baseline_tokens']} -> {stats['avg_prompt_tokens']} токенов промпта, "
+        f"обновлений краткого содержания: {stats['summary_updates']}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Бенчмарк проекций столбцов: объем ответа и время запроса профиля
+с select("*") и с проекциями для проверок прогресса и натальных данных.
+
+PostgREST/Postgres заменен локальной моделью: SQLite в памяти выполняет
+запрос, строки сериализуются в JSON (как ответ PostgREST) и разбираются
+клиентом. Сетевая задержка не учитывается, поэтому разница во времени -
+нижняя оценка; разница в байтах переносится на реальный ответ как есть.
+
+Запуск:
+    python -m ona.benchmarks.bench_projections
+"""
+import json
+import os
+import sqlite3
+import sys
+import timeit
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ona.core.db.projections import (
+    PROFILE, PROFILE_NATAL, PROFILE_PSYCHOLOGY_ANSWERS, PROFILE_PSYCHOLOGY_PROGRESS, TABLE_COLUMNS
+)
+from ona.core.models.psychology_questions import questions
+
+PROFILES = 1000
+ITERATIONS = 5000
+
+# Столбцы profiles в порядке создания таблицы
+PROFILE_COLUMNS = (
+    "id", "user_id", "birth_date", "birth_time", "birth_place", "age",
+    "psychology_progress", "psychology_answers", "psychology_profile",
+    "created_at", "updated_at",
+)
+
+
+def create_database() -> sqlite3.Connection:
+    """
+    Таблица profiles с заполненными ответами опросника и психологическим профилем
+    """
+    assert set(PROFILE_COLUMNS) == TABLE_COLUMNS["profiles"]
+    connection = sqlite3.connect(":memory:")
+    connection.execute(f"CREATE TABLE profiles ({', '.join(PROFILE_COLUMNS)})")
+    connection.execute("CREATE UNIQUE INDEX idx_profiles_user_id ON profiles(user_id)")
+
+    answers = {
+        str(index): {
+            "question_id": question["id"],
+            "question_text": question["text"],
+            "option_id": question["options"][0]["id"],
+            "option_text": question["options"][0]["text"],
+        }
+        for index, question in enumerate(questions)
+    }
+    psychology_profile = "Ты открыт новому опыту и умеешь адаптироваться к изменениям. " * 40
+    rows = [
+        (
+            user_id, 100000 + user_id, "01.01.1990", "12:00", "Москва", 35,
+            len(questions), json.dumps(answers, ensure_ascii=False), psychology_profile,
+            "2026-10-18T00:00:00+00:00", "2026-10-18T00:00:00+00:00",
+        )
+        for user_id in range(PROFILES)
+    ]
+    connection.executemany(f"INSERT INTO profiles VALUES ({', '.join('?' * len(PROFILE_COLUMNS))})", rows)
+    return connection
+
+
+def make_query(connection: sqlite3.Connection, columns):
+    """
+    Запрос профиля с сериализацией ответа в JSON и разбором на клиенте
+
+    Returns:
+        Функция без аргументов, возвращающая размер ответа в байтах
+    """
+    select = ", ".join(columns)
+    sql = f"SELECT {select} FROM profiles WHERE user_id = ? LIMIT 1"
+    state = {"user_id": 100000}
+
+    def query() -> int:
+        state["user_id"] = 100000 + (state["user_id"] + 7) % PROFILES
+        cursor = connection.execute(sql, (state["user_id"],))
+        names = [description[0] for description in cursor.description]
+        payload = json.dumps([dict(zip(names, row)) for row in cursor.fetchall()], ensure_ascii=False).encode()
+        json.loads(payload)
+        return len(payload)
+
+    return query
+
+
+def main():
+    connection = create_database()
+    cases = [
+        ('select("*")', PROFILE_COLUMNS),
+        ("PROFILE", PROFILE.columns),
+        ("PROFILE_PSYCHOLOGY_ANSWERS", PROFILE_PSYCHOLOGY_ANSWERS.columns),
+        ("PROFILE_NATAL", PROFILE_NATAL.columns),
+        ("PROFILE_PSYCHOLOGY_PROGRESS", PROFILE_PSYCHOLOGY_PROGRESS.columns),
+    ]
+
+    print(f"{'проекция':<30} {'байт/ответ':>11} {'мкс/запрос':>11}")
+    for name, columns in cases:
+        query = make_query(connection, columns)
+        payload_bytes = query()
+        best = min(timeit.repeat(query, number=ITERATIONS, repeat=5))
+        print(f"{name:<30} {payload_bytes:>11} {best / ITERATIONS * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
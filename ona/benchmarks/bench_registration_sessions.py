@@ -0,0 +1,75 @@
+"""
+Бенчмарк памяти хранилища сессий регистрации: 100 000 одновременных
+незавершенных регистраций в RegistrationSessionStore и в словарях
+
+Запуск:
+    python -m ona.benchmarks.bench_registration_sessions
+"""
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ona.core.services.registration_sessions import RegistrationSessionStore
+
+ANSWERS = {
+    "birth_date": "15.03.1990",
+    "birth_time": "14:30",
+    "birth_place": "Санкт-Петербург",
+    "age": 34,
+}
+
+
+async def fill_store(sessions: int) -> RegistrationSessionStore:
+    """
+    Заполнение хранилища сессиями с полным набором ответов
+    """
+    store = RegistrationSessionStore(max_sessions=sessions)
+    for user_id in range(sessions):
+        await store.update(user_id, **ANSWERS)
+    return store
+
+
+def fill_dicts(sessions: int) -> dict:
+    """
+    Тот же объем данных в словаре словарей (по аналогии с прежним user_data)
+    """
+    return {user_id: dict(ANSWERS) for user_id in range(sessions)}
+
+
+def measure(factory):
+    """
+    Память (байт) и время (с), затраченные на построение структуры
+    """
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    result = factory()
+    elapsed = time.perf_counter() - started_at
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def main(sessions: int = 100_000):
+    """
+    Запуск бенчмарка и вывод результатов
+    """
+    store, store_bytes, store_time = measure(lambda: asyncio.run(fill_store(sessions)))
+    dicts, dict_bytes, dict_time = measure(lambda: fill_dicts(sessions))
+
+    print(f"сессий: {sessions}")
+    print(f"{'структура':<28} {'всего, МБ':>10} {'на сессию, байт':>16} {'время, с':>9}")
+    print(f"{'RegistrationSessionStore':<28} {store_bytes / 2 ** 20:>10.1f} {store_bytes / sessions:>16.0f} {store_time:>9.2f}")
+    print(f"{'dict словарей':<28} {dict_bytes / 2 ** 20:>10.1f} {dict_bytes / sessions:>16.0f} {dict_time:>9.2f}")
+    print(f"сессий в хранилище: {len(store)}, вытеснено: {store.get_stats()['evicted']}")
+    del dicts
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Микробенчмарк маршрутизации FSM: скомпилированная таблица переходов
+против цепочки if/elif по подсостояниям и разбора callback_data split("_")
+
+Запуск:
+    python -m ona.benchmarks.bench_router
+"""
+import os
+import sys
+import timeit
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from ona.utils.callback_data import ANSWER, encode
+from ona.utils.dispatch_table import CALLBACK_QUERY, MESSAGE, DispatchTable, Route
+
+ITERATIONS = 200_000
+
+# Подсостояния регистрации в порядке прежней цепочки if/elif
+STATES = [
+    "REGISTRATION_START",
+    "REGISTRATION_BIRTH_DATE",
+    "REGISTRATION_BIRTH_TIME",
+    "REGISTRATION_BIRTH_PLACE",
+    "REGISTRATION_AGE",
+    "PROFILING_NATAL",
+]
+QUIZ_STATE = "PROFILING_PSYCHOLOGY"
+
+
+class _Handler:
+    """
+    Обработчик-заглушка: у каждого подсостояния свой метод
+    """
+    def on_state(self, update):
+        return update
+
+    def on_answer(self, update):
+        return update
+
+
+class _CallbackQuery:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+
+class _Update:
+    __slots__ = ("callback_query",)
+
+    def __init__(self, callback_query=None):
+        self.callback_query = callback_query
+
+
+def ladder_route(handler, state, update):
+    """
+    Прежняя маршрутизация: цепочка сравнений и разбор строки callback_data
+    """
+    if update.callback_query:
+        parts = update.callback_query.data.split("_")
+        if len(parts) == 3 and parts[0] == "answer":
+            return handler.on_answer
+    if state == STATES[0]:
+        return handler.on_state
+    elif state == STATES[1]:
+        return handler.on_state
+    elif state == STATES[2]:
+        return handler.on_state
+    elif state == STATES[3]:
+        return handler.on_state
+    elif state == STATES[4]:
+        return handler.on_state
+    elif state == STATES[5]:
+        return handler.on_state
+    return handler.on_state
+
+
+def build_table(handler) -> DispatchTable:
+    """
+    Таблица переходов для тех же состояний
+    """
+    table = DispatchTable()
+    table.compile(handler, [Route(state, None, None, "on_state") for state in STATES] + [
+        Route(QUIZ_STATE, CALLBACK_QUERY, ANSWER, "on_answer"),
+        Route(QUIZ_STATE, None, None, "on_state"),
+    ])
+    return table
+
+
+def main():
+    handler = _Handler()
+    table = build_table(handler)
+
+    message = _Update()
+    legacy_answer = _Update(_CallbackQuery("answer_3_b"))
+    answer = _Update(_CallbackQuery(encode(ANSWER, 3, "b")))
+    last_state = STATES[-1]
+
+    cases = [
+        ("сообщение, последнее подсостояние", "if/elif",
+         lambda: ladder_route(handler, last_state, message)),
+        ("сообщение, последнее подсостояние", "таблица",
+         lambda: table.match(last_state, message)),
+        ("ответ на вопрос", "if/elif + split",
+         lambda: ladder_route(handler, QUIZ_STATE, legacy_answer)),
+        ("ответ на вопрос", "таблица + codec",
+         lambda: table.match(QUIZ_STATE, answer)),
+    ]
+
+    assert table.lookup(last_state, MESSAGE) == handler.on_state
+    assert table.match(QUIZ_STATE, answer) == handler.on_answer
+
+    print(f"{'случай':<36} {'способ':<18} {'нс/обновление':>14}")
+    for case, method, func in cases:
+        best = min(timeit.repeat(func, number=ITERATIONS, repeat=5))
+        print(f"{case:<36} {method:<18} {best / ITERATIONS * 1e9:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Бенчмарк декодирования тела вебхука: стоимость разбора одного обновления
+до и после перехода на быстрый путь RawUpdate
+
+Запуск:
+    python -m ona.benchmarks.bench_webhook_decode
+"""
+import json
+import sys
+import os
+import timeit
+
+# Добавляем корневую директорию проекта в путь для импорта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from telegram import Update
+from ona.utils import update_decoder
+from ona.utils.update_decoder import RawUpdate
+
+# Типы обновлений, для которых в TelegramService есть обработчики
+HANDLED_UPDATE_TYPES = {"message", "edited_message", "channel_post", "edited_channel_post", "callback_query"}
+
+USER = {"id": 123456789, "is_bot": False, "first_name": "Анна", "username": "anna", "language_code": "ru"}
+CHAT = {"id": 123456789, "type": "private", "first_name": "Анна", "username": "anna"}
+
+SAMPLE_UPDATES = {
+    "message": {
+        "update_id": 1,
+        "message": {
+            "message_id": 10, "date": 1700000000, "chat": CHAT, "from": USER,
+            "text": "Привет! Расскажи, как мне справиться со стрессом на работе?"
+        }
+    },
+    "callback_query": {
+        "update_id": 2,
+        "callback_query": {
+            "id": "4382", "chat_instance": "-1", "data": "answer_3_b", "from": USER,
+            "message": {
+                "message_id": 11, "date": 1700000000, "chat": CHAT,
+                "from": {"id": 1, "is_bot": True, "first_name": "ONA"},
+                "text": "Вопрос 4/10: Как ты принимаешь важные решения?",
+                "reply_markup": {"inline_keyboard": [
+                    [{"text": f"Вариант {option}", "callback_data": f"answer_3_{option}"}]
+                    for option in "abcd"
+                ]}
+            }
+        }
+    },
+    "my_chat_member": {
+        "update_id": 3,
+        "my_chat_member": {
+            "chat": CHAT, "from": USER, "date": 1700000000,
+            "old_chat_member": {"status": "member", "user": {"id": 1, "is_bot": True, "first_name": "ONA"}},
+            "new_chat_member": {"status": "kicked", "until_date": 0,
+                                "user": {"id": 1, "is_bot": True, "first_name": "ONA"}}
+        }
+    },
+}
+
+
+def decode_before(body: bytes):
+    """
+    Прежний путь: request.json(), f-строка с полным обновлением для INFO-лога
+    и полный Update для любого обновления
+    """
+    update_data = json.loads(body)
+    log_line = f"Получено обновление от Telegram: {update_data}"
+    return Update.de_json(update_data, None), log_line
+
+
+def decode_after(body: bytes):
+    """
+    Новый путь: сырые байты, orjson (если доступен) и ленивое построение Update
+    """
+    raw_update = RawUpdate.from_bytes(body)
+    if raw_update.update_type in HANDLED_UPDATE_TYPES:
+        raw_update.to_update(None)
+    return raw_update
+
+
+def peek_only(body: bytes):
+    """
+    Только быстрый разбор: то, что происходит в обработчике вебхука до постановки в очередь
+    """
+    return RawUpdate.from_bytes(body)
+
+
+def measure(func, body: bytes, number: int) -> float:
+    """
+    Среднее время одного вызова в микросекундах
+    """
+    timer = timeit.Timer(lambda: func(body))
+    best = min(timer.repeat(repeat=5, number=number))
+    return best / number * 1_000_000
+
+
+def main(number: int = 5000):
+    """
+    Запуск бенчмарка и вывод таблицы результатов
+    """
+    print(f"orjson: {'да' if update_decoder.orjson is not None else 'нет (json)'}")
+    print(f"{'тип обновления':<16} {'до, мкс':>10} {'после, мкс':>11} {'вебхук, мкс':>12} {'ускорение':>10}")
+    for update_type, update_data in SAMPLE_UPDATES.items():
+        body = json.dumps(update_data, ensure_ascii=False).encode()
+        before = measure(decode_before, body, number)
+        after = measure(decode_after, body, number)
+        webhook = measure(peek_only, body, number)
+        print(f"{update_type:<16} {before:>10.2f} {after:>11.2f} {webhook:>12.2f} {before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Профилировщик запуска: время импорта каждого модуля, время создания
+сервисов и пиковое потребление памяти для ona.main:app и polling_runner.py
+
+Каждая цель запускается в свежем процессе интерпретатора с -X importtime.
+Результаты сохраняются в JSON и HTML; с флагом --check превышение порогов
+из startup_thresholds.json завершает процесс с ненулевым кодом.
+
+Запуск:
+    python -m ona.benchmarks.startup_profiler --check
+"""
+import argparse
+import html
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+# Корневая директория проекта
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "startup_thresholds.json")
+DEFAULT_OUTPUT_DIR = os.path.join(ROOT_DIR, "reports")
+
+# Строка вывода -X importtime: "import time:  self | cumulative | module"
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+# Модули с ленивыми экземплярами сервисов
+SERVICE_MODULES = [
+    "core.services.openai_service",
+    "core.services.profile_service",
+    "core.services.recommendation_service",
+    "core.services.elevenlabs_service",
+    "core.services.meditation_service",
+    "core.services.payment_service",
+    "core.services.subscription_service",
+    "ona.core.db.supabase_client",
+]
+
+# Код, выполняемый в дочернем процессе для каждой цели
+CHILD_CODE = {
+    "main": f"SERVICE_MODULES = {SERVICE_MODULES!r}\n" + """
+import json, resource, time
+started = time.perf_counter()
+import ona.main
+imported = time.perf_counter()
+
+# Сервисы, не импортируемые при старте приложения, подключаются после замера импорта
+import importlib
+services, errors = {}, {}
+for module in SERVICE_MODULES:
+    try:
+        importlib.import_module(module)
+    except Exception as e:
+        errors[module] = f"{type(e).__name__}: {e}"
+
+from ona.core.services.registry import service_registry
+for name in service_registry.get_stats()["registered"]:
+    try:
+        service_registry.get(name)
+        services[name] = service_registry.init_times[name] * 1000
+    except Exception as e:
+        errors[name] = f"{type(e).__name__}: {e}"
+""",
+    "polling": """
+import asyncio, json, resource, time
+started = time.perf_counter()
+import ona.polling_runner
+imported = time.perf_counter()
+
+from ona.core.services.telegram_service import TelegramService
+services, errors = {}, {}
+service_started = time.perf_counter()
+service = TelegramService()
+asyncio.run(service.setup_handlers())
+services["telegram_service"] = (time.perf_counter() - service_started) * 1000
+""",
+}
+
+CHILD_REPORT = """
+print("STARTUP_PROFILE " + json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "services_ms": services,
+    "service_errors": errors,
+    # ru_maxrss в Linux - в килобайтах
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+# Переменные окружения, без которых сервисы не создаются
+PLACEHOLDER_ENV = {
+    "TELEGRAM_BOT_TOKEN": "123456:profiler",
+    "OPENAI_API_KEY": "profiler",
+    "ELEVENLABS_API_KEY": "profiler",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "profiler",
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Разбор вывода -X importtime
+
+    Args:
+        stderr: Поток ошибок дочернего процесса
+
+    Returns:
+        List[Dict[str, Any]]: Модули с собственным и накопленным временем импорта в мс
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        modules.append({
+            "module": module,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            # Отступ в выводе importtime - по два пробела на уровень вложенности
+            "depth": max(0, (len(indent) - 1) // 2),
+        })
+    return modules
+
+
+def profile_target(target: str) -> Dict[str, Any]:
+    """
+    Профилирование запуска одной цели в отдельном процессе
+
+    Args:
+        target: main (ona.main:app) или polling (polling_runner.py)
+
+    Returns:
+        Dict[str, Any]: Отчет о запуске
+    """
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT_DIR, os.path.join(ROOT_DIR, "ona"), env.get("PYTHONPATH", "")])
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_CODE[target] + CHILD_REPORT],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    report_line = next(
+        (line for line in result.stdout.splitlines() if line.startswith("STARTUP_PROFILE ")),
+        None
+    )
+    if result.returncode != 0 or report_line is None:
+        raise RuntimeError(f"Не удалось профилировать {target}: {result.stderr[-2000:]}")
+
+    report = json.loads(report_line[len("STARTUP_PROFILE "):])
+    modules = parse_importtime(result.stderr)
+    report["target"] = target
+    report["modules"] = sorted(modules, key=lambda module: module["self_ms"], reverse=True)
+    report["services_total_ms"] = sum(report["services_ms"].values())
+    report["startup_ms"] = report["import_ms"] + report["services_total_ms"]
+    return report
+
+
+def check_thresholds(report: Dict[str, Any], thresholds: Dict[str, Any]) -> List[str]:
+    """
+    Проверка отчета на превышение порогов
+
+    Args:
+        report: Отчет profile_target
+        thresholds: Пороги для цели ({метрика: максимум})
+
+    Returns:
+        List[str]: Описания превышенных порогов (пустой список - регрессии нет)
+    """
+    violations = []
+    for metric, limit in thresholds.items():
+        # Порог services_ms применяется к каждому сервису отдельно
+        if metric == "services_ms":
+            for name, value in report["services_ms"].items():
+                if value > limit:
+                    violations.append(f"{report['target']}: services_ms.{name} = {value:.1f} > {limit}")
+            continue
+
+        value = report.get(metric)
+        if value is not None and value > limit:
+            violations.append(f"{report['target']}: {metric} = {value:.1f} > {limit}")
+    return violations
+
+
+def render_html(reports: List[Dict[str, Any]], top: int = 30) -> str:
+    """
+    HTML-отчет: сводка по целям, время создания сервисов и самые медленные модули
+    """
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>ONA startup profile</title>",
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse;margin-bottom:24px}"
+        "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}td:first-child{text-align:left}</style>",
+        "</head><body><h1>Профиль запуска ONA</h1>",
+    ]
+    for report in reports:
+        parts.append(f"<h2>{html.escape(report['target'])}</h2>")
+        parts.append(
+            "<table><tr><th>метрика</th><th>значение</th></tr>"
+            f"<tr><td>импорт, мс</td><td>{report['import_ms']:.1f}</td></tr>"
+            f"<tr><td>создание сервисов, мс</td><td>{report['services_total_ms']:.1f}</td></tr>"
+            f"<tr><td>запуск всего, мс</td><td>{report['startup_ms']:.1f}</td></tr>"
+            f"<tr><td>пиковый RSS, МБ</td><td>{report['peak_rss_mb']:.1f}</td></tr></table>"
+        )
+        parts.append("<table><tr><th>сервис</th><th>создание, мс</th></tr>")
+        for name, value in sorted(report["services_ms"].items(), key=lambda item: -item[1]):
+            parts.append(f"<tr><td>{html.escape(name)}</td><td>{value:.1f}</td></tr>")
+        for name, error in report["service_errors"].items():
+            parts.append(f"<tr><td>{html.escape(name)}</td><td>ошибка: {html.escape(error)}</td></tr>")
+        parts.append("</table>")
+        parts.append("<table><tr><th>модуль</th><th>собственное, мс</th><th>накопленное, мс</th></tr>")
+        for module in report["modules"][:top]:
+            parts.append(
+                f"<tr><td>{html.escape(module['module'])}</td>"
+                f"<td>{module['self_ms']:.1f}</td><td>{module['cumulative_ms']:.1f}</td></tr>"
+            )
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Профилирование целей, сохранение отчетов и проверка порогов
+
+    Returns:
+        int: Код завершения (1 - пороги превышены)
+    """
+    parser = argparse.ArgumentParser(description="Профилировщик запуска ONA")
+    parser.add_argument("--target", choices=sorted(CHILD_CODE), action="append",
+                        help="Цель профилирования (по умолчанию - все)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Каталог для отчетов")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="JSON-файл с порогами")
+    parser.add_argument("--check", action="store_true", help="Завершиться с ошибкой при превышении порогов")
+    args = parser.parse_args(argv)
+
+    reports = [profile_target(target) for target in (args.target or sorted(CHILD_CODE))]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    json_path = os.path.join(args.output_dir, "startup_profile.json")
+    html_path = os.path.join(args.output_dir, "startup_profile.html")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(reports, f, ensure_ascii=False, indent=2)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(render_html(reports))
+
+    for report in reports:
+        slowest = ", ".join(f"{module['module']} {module['self_ms']:.0f}" for module in report["modules"][:3])
+        print(
+            f"{report['target']:<8} импорт {report['import_ms']:>7.1f} мс, "
+            f"сервисы {report['services_total_ms']:>7.1f} мс, RSS {report['peak_rss_mb']:>6.1f} МБ "
+            f"(самые медленные модули, мс: {slowest})"
+        )
+    print(f"Отчеты: {json_path}, {html_path}")
+
+    if not args.check:
+        return 0
+
+    with open(args.thresholds, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    violations = []
+    for report in reports:
+        violations.extend(check_thresholds(report, thresholds.get(report["target"], {})))
+
+    for violation in violations:
+        print(f"РЕГРЕССИЯ: {violation}")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,8 @@ class Settings:
 
     # Конфигурация 11Labs
     ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
+    ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # Rachel
+    ELEVENLABS_MODEL_ID = os.getenv("ELEVENLABS_MODEL_ID", "eleven_monolingual_v1")
 
     # Настройки приложения
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -33,6 +35,95 @@ class Settings:
     YOOKASSA_SHOP_ID: str = os.getenv("YOOKASSA_SHOP_ID", "")
     YOOKASSA_API_KEY: str = os.getenv("YOOKASSA_API_KEY", "")
 
+    # Очередь входящих обновлений Telegram
+    UPDATE_QUEUE_WORKERS = int(os.getenv("UPDATE_QUEUE_WORKERS", "4"))
+    UPDATE_QUEUE_MAXSIZE = int(os.getenv("UPDATE_QUEUE_MAXSIZE", "1000"))
+    # Глубина очереди, начиная с которой сбрасываются обычные сообщения и команды (0 - не сбрасывать)
+    UPDATE_QUEUE_SHED_LOW_AT = int(os.getenv("UPDATE_QUEUE_SHED_LOW_AT", "200"))
+    UPDATE_QUEUE_SHED_NORMAL_AT = int(os.getenv("UPDATE_QUEUE_SHED_NORMAL_AT", "800"))
+    # Общий лимит параллельно обрабатываемых обновлений (по всем пользователям)
+    UPDATE_MAX_CONCURRENCY = int(os.getenv("UPDATE_MAX_CONCURRENCY", "8"))
+
+    # Хранилище состояний FSM пользователей (memory/supabase); для supabase нужна
+    # таблица user_states (миграции 20261018000100 и 20261018000200)
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+    STATE_CACHE_MAX_SIZE = int(os.getenv("STATE_CACHE_MAX_SIZE", "10000"))
+    STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "300"))
+    # Количество повторов перехода при одновременном изменении состояния
+    STATE_CAS_MAX_RETRIES = int(os.getenv("STATE_CAS_MAX_RETRIES", "5"))
+
+    # Незавершенные регистрации (memory/supabase)
+    REGISTRATION_SESSION_BACKEND = os.getenv("REGISTRATION_SESSION_BACKEND", "memory")
+    REGISTRATION_SESSION_MAX = int(os.getenv("REGISTRATION_SESSION_MAX", "100000"))
+    REGISTRATION_SESSION_TTL = float(os.getenv("REGISTRATION_SESSION_TTL", "86400"))
+
+    # Кэш ответов модели для рекомендаций и практик (memory/supabase): размер кэша
+    # в памяти и время жизни ответа в секундах
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "10000"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+
+    # База данных: supabase или sqlite (локальная база для нагрузочных тестов)
+    DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase")
+    SQLITE_PATH = os.getenv("SQLITE_PATH", ":memory:")
+    # Моделирование стоимости запросов и отказов локальной базы
+    LOCAL_DB_LATENCY_MS = float(os.getenv("LOCAL_DB_LATENCY_MS", "0"))
+    LOCAL_DB_JITTER_MS = float(os.getenv("LOCAL_DB_JITTER_MS", "0"))
+    LOCAL_DB_FAULT_RATE = float(os.getenv("LOCAL_DB_FAULT_RATE", "0"))
+
+    # Максимальное количество одновременных запросов к Supabase (размер пула потоков)
+    SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "10"))
+
+    # Пакетная запись сообщений диалога: размер пакета, задержка в секундах,
+    # максимум незаписанных строк при ошибках базы
+    CONVERSATION_BATCH_SIZE = int(os.getenv("CONVERSATION_BATCH_SIZE", "50"))
+    CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.5"))
+    CONVERSATION_BUFFER_MAX = int(os.getenv("CONVERSATION_BUFFER_MAX", "10000"))
+    # Кэш последних сообщений диалога в памяти: сообщений на пользователя и общий объем в байтах
+    CONVERSATION_CACHE_MESSAGES = int(os.getenv("CONVERSATION_CACHE_MESSAGES", "50"))
+    CONVERSATION_CACHE_MAX_BYTES = int(os.getenv("CONVERSATION_CACHE_MAX_BYTES", "67108864"))
+
+    # Окно объединения записей полей профиля вне обработки обновления (секунды)
+    PROFILE_WRITE_WINDOW = float(os.getenv("PROFILE_WRITE_WINDOW", "0.02"))
+
+    # Кэш соответствия telegram_id -> users.id
+    USER_ID_CACHE_MAX_SIZE = int(os.getenv("USER_ID_CACHE_MAX_SIZE", "100000"))
+    # Сколько секунд помнить, что пользователь не найден
+    USER_ID_NEGATIVE_TTL = float(os.getenv("USER_ID_NEGATIVE_TTL", "60"))
+
+    # Контекст обновления: RPC, загружающая данные пользователя за один запрос
+    # (пустое значение - загружать части отдельными запросами); история загружается
+    # в объеме не меньше CHAT_HISTORY_LIMIT
+    SESSION_CONTEXT_RPC = os.getenv("SESSION_CONTEXT_RPC", "get_session_context")
+    SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "10"))
+
+    # Потоковый вывод ответов в чате: ответ появляется по мере генерации,
+    # сообщение редактируется не чаще одного раза в CHAT_STREAM_EDIT_INTERVAL секунд
+    CHAT_STREAMING = os.getenv("CHAT_STREAMING", "true").lower() == "true"
+    CHAT_STREAM_EDIT_INTERVAL = float(os.getenv("CHAT_STREAM_EDIT_INTERVAL", "1.0"))
+
+    # Бюджет токенов запроса в чате (промпт и ответ): минимальная длина ответа,
+    # количество загружаемых сообщений истории; не вошедшие в бюджет сообщения
+    # сворачиваются в краткое содержание, когда их накопится CHAT_SUMMARY_MIN_MESSAGES
+    CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "4000"))
+    CHAT_REPLY_MIN_TOKENS = int(os.getenv("CHAT_REPLY_MIN_TOKENS", "1000"))
+    CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "30"))
+    CHAT_SUMMARY_MIN_MESSAGES = int(os.getenv("CHAT_SUMMARY_MIN_MESSAGES", "4"))
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+
+    # Лимиты исходящих сообщений Telegram
+    SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+    SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+    SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+    SEND_GROUP_RATE_PER_MINUTE = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+    SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+    # Дедупликация повторно доставленных обновлений
+    UPDATE_DEDUP_MAX_SIZE = int(os.getenv("UPDATE_DEDUP_MAX_SIZE", "10000"))
+    UPDATE_DEDUP_TTL = float(os.getenv("UPDATE_DEDUP_TTL", "600"))
+    # memory - только в пределах процесса, supabase - общее хранилище для всех воркеров
+    UPDATE_DEDUP_BACKEND = os.getenv("UPDATE_DEDUP_BACKEND", "memory")
+
 # Создаем экземпляр настроек для импорта в других модулях
 settings = Settings()
 
@@ -0,0 +1,102 @@
+"""
+Счетчик обращений к базе данных в рамках обработки одного обновления
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from ona.utils.metrics import metrics_registry
+
+
+class UpdateDbCalls:
+    """
+    Обращения к базе при обработке одного обновления
+    """
+    __slots__ = ("calls", "operations")
+
+    def __init__(self):
+        self.calls = 0
+        # Количество обращений по операциям (например, "rpc:get_session_context")
+        self.operations: Dict[str, int] = {}
+
+    def record(self, operation: str):
+        self.calls += 1
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+
+
+_current_calls: ContextVar[Optional[UpdateDbCalls]] = ContextVar("db_calls", default=None)
+
+
+class DbCallCounter:
+    """
+    Подсчет обращений к базе на одно обновление.
+
+    Обращения считаются в текущем контексте (asyncio-задаче), поэтому
+    параллельные обновления разных пользователей не смешиваются.
+    """
+    def __init__(self):
+        self.updates = 0
+        self.calls = 0
+        self.untracked_calls = 0
+        self.max_calls_per_update = 0
+        self.last_update: Dict[str, int] = {}
+
+    @contextmanager
+    def track(self):
+        """
+        Область подсчета для одного обновления
+
+        Yields:
+            UpdateDbCalls: Счетчик обращений этого обновления
+        """
+        calls = UpdateDbCalls()
+        token = _current_calls.set(calls)
+        try:
+            yield calls
+        finally:
+            _current_calls.reset(token)
+            self.updates += 1
+            self.max_calls_per_update = max(self.max_calls_per_update, calls.calls)
+            self.last_update = dict(calls.operations)
+
+    def record(self, operation: str = "query"):
+        """
+        Регистрация одного обращения к базе
+
+        Args:
+            operation: Название операции (таблица или RPC)
+        """
+        self.calls += 1
+        calls = _current_calls.get()
+        if calls is None:
+            self.untracked_calls += 1
+        else:
+            calls.record(operation)
+
+    def current(self) -> Optional[UpdateDbCalls]:
+        """
+        Счетчик текущего обновления (None вне области track)
+        """
+        return _current_calls.get()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики счетчика
+
+        Returns:
+            Dict[str, Any]: Обращения к базе всего и в среднем на одно обновление
+        """
+        tracked = self.calls - self.untracked_calls
+        return {
+            "updates": self.updates,
+            "calls": self.calls,
+            "untracked_calls": self.untracked_calls,
+            "avg_calls_per_update": round(tracked / self.updates, 3) if self.updates else 0.0,
+            "max_calls_per_update": self.max_calls_per_update,
+            "last_update": self.last_update,
+        }
+
+
+# Создание экземпляра счетчика обращений к базе
+db_call_counter = DbCallCounter()
+metrics_registry.register("db_calls", db_call_counter.get_stats)
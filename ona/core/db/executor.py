@@ -0,0 +1,123 @@
+"""
+Выполнение синхронных запросов к Supabase вне цикла событий
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from ona.config.settings import settings
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+
+class DbExecutor:
+    """
+    Ограниченный пул потоков для сетевых запросов клиента Supabase.
+
+    Клиент supabase-py выполняет execute() синхронно; в пуле запрос не
+    блокирует цикл событий, а размер пула ограничивает количество
+    одновременных запросов к базе (и соединений httpx). Запросы сверх
+    лимита ждут в очереди пула.
+    """
+    def __init__(self, max_concurrency: int = 10):
+        """
+        Инициализация пула
+
+        Args:
+            max_concurrency: Максимальное количество одновременных запросов к базе
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.pending = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.queue_latency = LatencyStats()
+        self.query_latency = LatencyStats()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        Пул создается при первом запросе (и заново после shutdown)
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency,
+                        thread_name_prefix="supabase"
+                    )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Выполнение блокирующей функции в пуле
+
+        Args:
+            func: Функция, выполняющая запрос (например, query.execute)
+            *args: Аргументы функции
+
+        Returns:
+            Any: Результат функции
+        """
+        submitted_at = time.perf_counter()
+
+        def call():
+            started_at = time.perf_counter()
+            self.queue_latency.observe(started_at - submitted_at)
+            with self._lock:
+                self.in_flight += 1
+            try:
+                return func(*args)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self.query_latency.observe(time.perf_counter() - started_at)
+
+        self.calls += 1
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        """
+        Остановка пула (дожидается выполняющихся запросов)
+
+        Args:
+            wait: Ждать завершения запросов
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики пула
+
+        Returns:
+            Dict[str, Any]: Лимит, очередь, выполняющиеся запросы и задержки
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "queue_latency": self.queue_latency.snapshot(),
+            "query_latency": self.query_latency.snapshot(),
+        }
+
+
+# Создание экземпляра пула запросов к базе
+db_executor = DbExecutor(max_concurrency=settings.SUPABASE_MAX_CONCURRENCY)
+metrics_registry.register("db_executor", db_executor.get_stats)
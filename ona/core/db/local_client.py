@@ -0,0 +1,503 @@
+"""
+Локальная замена клиента Supabase на SQLite для нагрузочных тестов и
+бенчмарков без сети.
+
+LocalClient реализует ту часть построителя запросов supabase-py, которую
+использует приложение (table().select/insert/update/upsert/delete,
+фильтры eq/neq/gt/gte/lt/lte, order, limit, execute и rpc), поэтому
+сервисы и хранилища работают с ним без изменений. Стоимость обращения к
+базе моделируется задержкой на запрос, отказы - внедрением ошибок.
+"""
+import json
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class LocalTable(NamedTuple):
+    """
+    Описание таблицы локальной базы
+    """
+    columns: Tuple[str, ...]
+    primary_key: str
+    serial: bool = False
+    unique: Tuple[str, ...] = ()
+    indexes: Tuple[Tuple[str, ...], ...] = ()
+    json_columns: Tuple[str, ...] = ()
+    bool_columns: Tuple[str, ...] = ()
+
+
+# Таблицы приложения (schema.sql, supabase_setup.sql и migrations/)
+SCHEMA: Dict[str, LocalTable] = {
+    "users": LocalTable(
+        ("id", "telegram_id", "first_name", "last_name", "username", "created_at", "updated_at"),
+        "id", serial=True, unique=("telegram_id",)
+    ),
+    "profiles": LocalTable(
+        ("id", "user_id", "birth_date", "birth_time", "birth_place", "age",
+         "psychology_progress", "psychology_answers", "psychology_profile", "created_at", "updated_at"),
+        "id", serial=True, unique=("user_id",), json_columns=("psychology_answers", "psychology_profile")
+    ),
+    "conversations": LocalTable(
+        ("id", "user_id", "message_text", "is_user", "created_at"),
+        "id", serial=True, indexes=(("user_id", "created_at"),), bool_columns=("is_user",)
+    ),
+    "subscriptions": LocalTable(
+        ("id", "user_id", "plan_type", "status", "start_date", "end_date", "payment_id",
+         "order_id", "price", "cancelled_at"),
+        "id", serial=True, indexes=(("user_id", "status", "end_date"), ("payment_id",))
+    ),
+    "recommendations": LocalTable(
+        ("id", "user_id", "type", "content", "created_at"),
+        "id", serial=True, indexes=(("user_id", "created_at"),)
+    ),
+    "practices": LocalTable(
+        ("id", "user_id", "type", "content", "created_at"),
+        "id", serial=True, indexes=(("user_id", "created_at"),)
+    ),
+    "meditations": LocalTable(
+        ("id", "user_id", "type", "text", "audio_filename", "created_at"),
+        "id", serial=True, indexes=(("user_id", "created_at"),)
+    ),
+    "user_states": LocalTable(("telegram_id", "state", "version", "updated_at"), "telegram_id"),
+    "registration_sessions": LocalTable(
+        ("telegram_id", "data", "updated_at"), "telegram_id", json_columns=("data",)
+    ),
+    "processed_updates": LocalTable(
+        ("update_id", "created_at"), "update_id", indexes=(("created_at",),)
+    ),
+    "response_cache": LocalTable(
+        ("key", "value", "expires_at", "created_at"), "key", indexes=(("expires_at",),)
+    ),
+}
+
+# Столбцы, которые база заполняет текущим временем при вставке
+TIMESTAMP_DEFAULTS = ("created_at", "updated_at")
+
+# Операторы фильтров PostgREST
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class LocalAPIError(Exception):
+    """
+    Ошибка запроса в формате PostgREST (код ошибки Postgres в тексте и в code)
+    """
+    def __init__(self, message: str, code: str):
+        super().__init__(f"{{'message': '{message}', 'code': '{code}'}}")
+        self.message = message
+        self.code = code
+
+
+class LocalResponse(NamedTuple):
+    """
+    Ответ запроса (как APIResponse supabase-py)
+    """
+    data: Any
+    count: Optional[int] = None
+
+
+def _encode(value: Any) -> Any:
+    """
+    Преобразование значения Python в значение SQLite (даты - ISO, JSON - строка)
+    """
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class LocalQuery:
+    """
+    Построитель запроса к таблице с интерфейсом postgrest-py
+    """
+    def __init__(self, client: "LocalClient", table: str):
+        self.client = client
+        self.table = table
+        # Последний сегмент пути используется счетчиком обращений к базе
+        self.path = f"/rest/v1/{table}"
+        self.method = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.on_conflict = ""
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.ordering: List[Tuple[str, bool]] = []
+        self.row_limit: Optional[int] = None
+
+    def select(self, columns: str = "*"):
+        self.method, self.columns = "select", columns
+        return self
+
+    def insert(self, data):
+        self.method, self.payload = "insert", data
+        return self
+
+    def upsert(self, data, on_conflict: str = "", **kwargs):
+        self.method, self.payload, self.on_conflict = "upsert", data, on_conflict
+        return self
+
+    def update(self, data):
+        self.method, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.method = "delete"
+        return self
+
+    def _filter(self, operator: str, column: str, value):
+        self.filters.append((column, operator, value))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column: str, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column: str, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column: str, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column: str, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column: str, value):
+        return self._filter("lte", column, value)
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self.row_limit = size
+        return self
+
+    def execute(self) -> LocalResponse:
+        """
+        Выполнение запроса (синхронно, как в supabase-py)
+        """
+        return self.client.run(self)
+
+
+class LocalRpc:
+    """
+    Вызов функции базы (rpc) с интерфейсом postgrest-py
+    """
+    def __init__(self, client: "LocalClient", function: str, params: Dict[str, Any]):
+        self.client = client
+        self.function = function
+        self.params = params or {}
+        self.path = f"/rest/v1/rpc/{function}"
+
+    def execute(self) -> LocalResponse:
+        return self.client.call(self)
+
+
+class LocalClient:
+    """
+    Клиент базы SQLite (в памяти или в файле) с интерфейсом клиента Supabase.
+
+    Соединение общее для потоков пула запросов, операции выполняются под
+    блокировкой. latency добавляет к каждому запросу задержку сетевого
+    обращения, fault_rate - долю запросов, завершающихся ошибкой.
+    """
+    def __init__(
+        self,
+        path: str = ":memory:",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fault_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Инициализация клиента
+
+        Args:
+            path: Путь к файлу SQLite (":memory:" - база в памяти)
+            latency: Задержка каждого запроса в секундах
+            jitter: Случайная добавка к задержке в секундах (от 0 до jitter)
+            fault_rate: Вероятность ошибки запроса (от 0 до 1)
+            seed: Начальное значение генератора для воспроизводимых отказов
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self._random = random.Random(seed)
+        self._fail_next = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self.functions: Dict[str, Callable[["LocalClient", Dict[str, Any]], Any]] = {
+            "get_session_context": _get_session_context,
+        }
+        self._create_schema()
+
+        # Метрики
+        self.calls: Dict[str, int] = {}
+        self.faults = 0
+
+    def _create_schema(self):
+        """
+        Создание таблиц и индексов
+        """
+        with self._connection:
+            for name, table in SCHEMA.items():
+                columns = []
+                for column in table.columns:
+                    if column == table.primary_key:
+                        columns.append(f"{column} INTEGER PRIMARY KEY AUTOINCREMENT" if table.serial
+                                       else f"{column} PRIMARY KEY")
+                    elif column in table.unique:
+                        columns.append(f"{column} UNIQUE")
+                    else:
+                        columns.append(column)
+                self._connection.execute(f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(columns)})")
+                for index in table.indexes:
+                    self._connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{name}_{'_'.join(index)} ON {name}({', '.join(index)})"
+                    )
+
+    # Интерфейс клиента Supabase
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def from_(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> LocalRpc:
+        return LocalRpc(self, function, params)
+
+    # Моделирование стоимости запросов и отказов
+
+    def fail_next(self, count: int = 1):
+        """
+        Отказ следующих count запросов (для детерминированных тестов)
+        """
+        self._fail_next += count
+
+    def _before_request(self, operation: str):
+        """
+        Задержка сетевого обращения и внедрение отказа
+        """
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            fail = self._fail_next > 0
+            if fail:
+                self._fail_next -= 1
+            elif self.fault_rate:
+                fail = self._random.random() < self.fault_rate
+        if fail:
+            self.faults += 1
+            raise LocalAPIError(f"Внедренный отказ запроса {operation}", "08006")
+
+    # Выполнение запросов
+
+    def run(self, query: LocalQuery) -> LocalResponse:
+        """
+        Выполнение запроса к таблице
+        """
+        self._before_request(query.table)
+        with self._lock:
+            try:
+                with self._connection:
+                    return LocalResponse(self._run(query))
+            except sqlite3.IntegrityError as e:
+                raise LocalAPIError(f"duplicate key value violates unique constraint: {e}", "23505")
+
+    def call(self, rpc: LocalRpc) -> LocalResponse:
+        """
+        Вызов функции базы
+        """
+        self._before_request(rpc.function)
+        function = self.functions.get(rpc.function)
+        if function is None:
+            raise LocalAPIError(f"Could not find the function {rpc.function}", "PGRST202")
+        with self._lock:
+            return LocalResponse(function(self, rpc.params))
+
+    def _table(self, name: str) -> LocalTable:
+        table = SCHEMA.get(name)
+        if table is None:
+            raise LocalAPIError(f'relation "{name}" does not exist', "42P01")
+        return table
+
+    def _check_columns(self, table_name: str, columns) -> List[str]:
+        table = self._table(table_name)
+        columns = list(columns)
+        for column in columns:
+            if column not in table.columns:
+                raise LocalAPIError(f"column {table_name}.{column} does not exist", "42703")
+        return columns
+
+    def _where(self, query: LocalQuery) -> Tuple[str, List[Any]]:
+        if not query.filters:
+            return "", []
+        self._check_columns(query.table, (column for column, _, _ in query.filters))
+        clauses = [f"{column} {OPERATORS[operator]} ?" for column, operator, _ in query.filters]
+        return " WHERE " + " AND ".join(clauses), [_encode(value) for _, _, value in query.filters]
+
+    def _decode(self, table_name: str, rows) -> List[Dict[str, Any]]:
+        table = self._table(table_name)
+        result = []
+        for row in rows:
+            item = dict(row)
+            for column in table.json_columns:
+                if isinstance(item.get(column), str):
+                    try:
+                        item[column] = json.loads(item[column])
+                    except ValueError:
+                        pass
+            for column in table.bool_columns:
+                if item.get(column) is not None:
+                    item[column] = bool(item[column])
+            result.append(item)
+        return result
+
+    def _rows(self, table_name: str, payload) -> List[Dict[str, Any]]:
+        """
+        Строки для вставки с заполнением времени создания
+        """
+        table = self._table(table_name)
+        rows = payload if isinstance(payload, list) else [payload]
+        now = datetime.now().isoformat()
+        result = []
+        for row in rows:
+            self._check_columns(table_name, row)
+            row = dict(row)
+            for column in TIMESTAMP_DEFAULTS:
+                if column in table.columns and row.get(column) is None:
+                    row[column] = now
+            result.append(row)
+        return result
+
+    def _run(self, query: LocalQuery) -> List[Dict[str, Any]]:
+        table_name = query.table
+        table = self._table(table_name)
+
+        if query.method == "select":
+            if query.columns.strip() == "*":
+                columns = list(table.columns)
+            else:
+                columns = self._check_columns(
+                    table_name, (column.strip() for column in query.columns.split(",") if column.strip())
+                )
+            where, params = self._where(query)
+            sql = f"SELECT {', '.join(columns)} FROM {table_name}{where}"
+            if query.ordering:
+                self._check_columns(table_name, (column for column, _ in query.ordering))
+                sql += " ORDER BY " + ", ".join(
+                    f"{column} {'DESC' if desc else 'ASC'}" for column, desc in query.ordering
+                )
+            if query.row_limit is not None:
+                sql += " LIMIT ?"
+                params.append(query.row_limit)
+            return self._decode(table_name, self._connection.execute(sql, params).fetchall())
+
+        if query.method in ("insert", "upsert"):
+            result = []
+            for row in self._rows(table_name, query.payload):
+                columns = list(row)
+                sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                       f"VALUES ({', '.join('?' * len(columns))})")
+                if query.method == "upsert":
+                    conflict = query.on_conflict or table.primary_key
+                    # При конфликте меняются только переданные поля (время создания сохраняется)
+                    payload = query.payload[0] if isinstance(query.payload, list) else query.payload
+                    updates = [column for column in payload if column != conflict]
+                    if updates:
+                        sql += (f" ON CONFLICT({conflict}) DO UPDATE SET "
+                                + ", ".join(f"{column} = excluded.{column}" for column in updates))
+                    else:
+                        sql += f" ON CONFLICT({conflict}) DO NOTHING"
+                sql += " RETURNING *"
+                result.extend(self._connection.execute(sql, [_encode(row[column]) for column in columns]).fetchall())
+            return self._decode(table_name, result)
+
+        if query.method == "update":
+            columns = self._check_columns(table_name, query.payload)
+            where, params = self._where(query)
+            sql = f"UPDATE {table_name} SET {', '.join(f'{column} = ?' for column in columns)}{where} RETURNING *"
+            values = [_encode(query.payload[column]) for column in columns]
+            return self._decode(table_name, self._connection.execute(sql, values + params).fetchall())
+
+        if query.method == "delete":
+            where, params = self._where(query)
+            sql = f"DELETE FROM {table_name}{where} RETURNING *"
+            return self._decode(table_name, self._connection.execute(sql, params).fetchall())
+
+        raise LocalAPIError(f"Неизвестная операция {query.method}", "PGRST100")
+
+    def select(self, table_name: str, columns: str = "*", **filters) -> List[Dict[str, Any]]:
+        """
+        Выборка строк по равенству столбцов без моделирования задержки
+        (для функций базы и проверок в тестах; вызывается под блокировкой
+        или вне конкурентных запросов)
+        """
+        query = LocalQuery(self, table_name).select(columns)
+        for column, value in filters.items():
+            query.eq(column, value)
+        return self._run(query)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики клиента
+
+        Returns:
+            Dict[str, Any]: Количество запросов по таблицам и функциям и внедренных отказов
+        """
+        return {
+            "calls": dict(self.calls),
+            "faults": self.faults,
+            "latency": self.latency,
+            "fault_rate": self.fault_rate,
+        }
+
+
+def _get_session_context(client: LocalClient, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Аналог функции get_session_context (migrations/20261018000400)
+    """
+    telegram_id = params["p_telegram_id"]
+    history_limit = params.get("p_history_limit", 10)
+
+    users = client.select("users", telegram_id=telegram_id)
+    user = users[0] if users else None
+    profiles = client.select("profiles", user_id=telegram_id)
+
+    subscription = None
+    if user is not None:
+        query = (
+            LocalQuery(client, "subscriptions").select("*")
+            .eq("user_id", user["id"])
+            .eq("status", "active")
+            .gte("end_date", datetime.now().isoformat())
+            .order("end_date", desc=True)
+            .limit(1)
+        )
+        subscriptions = client._run(query)
+        subscription = subscriptions[0] if subscriptions else None
+
+    history = client._run(
+        LocalQuery(client, "conversations").select("message_text, is_user, created_at")
+        .eq("user_id", telegram_id)
+        .order("created_at", desc=True)
+        .limit(history_limit)
+    )
+    return {
+        "user": user,
+        "profile": profiles[0] if profiles else None,
+        "subscription": subscription,
+        "history": list(reversed(history)),
+    }
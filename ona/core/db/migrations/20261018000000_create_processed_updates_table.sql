@@ -0,0 +1,13 @@
+-- Создание таблицы обработанных обновлений Telegram (общая дедупликация для всех воркеров)
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индекс для удаления устаревших записей
+CREATE INDEX IF NOT EXISTS idx_processed_updates_created_at ON processed_updates(created_at);
+
+-- Комментарии
+COMMENT ON TABLE processed_updates IS 'ID недавно принятых обновлений Telegram для отбрасывания повторных доставок';
+COMMENT ON COLUMN processed_updates.update_id IS 'update_id из Telegram Bot API';
+COMMENT ON COLUMN processed_updates.created_at IS 'Дата и время первого получения обновления';
@@ -0,0 +1,12 @@
+-- Создание таблицы состояний FSM пользователей
+CREATE TABLE IF NOT EXISTS user_states (
+    telegram_id BIGINT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Комментарии
+COMMENT ON TABLE user_states IS 'Текущее состояние диалога (FSM) каждого пользователя';
+COMMENT ON COLUMN user_states.telegram_id IS 'Telegram ID пользователя';
+COMMENT ON COLUMN user_states.state IS 'Текущее состояние FSM';
+COMMENT ON COLUMN user_states.updated_at IS 'Дата и время последнего перехода';
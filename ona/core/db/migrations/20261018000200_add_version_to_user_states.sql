@@ -0,0 +1,5 @@
+-- Версия состояния для условной записи (compare-and-set) при одновременных переходах
+ALTER TABLE user_states ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+
+-- Комментарии
+COMMENT ON COLUMN user_states.version IS 'Версия состояния, увеличивается при каждом переходе';
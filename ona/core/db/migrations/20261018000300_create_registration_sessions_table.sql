@@ -0,0 +1,15 @@
+-- Создание таблицы незавершенных регистраций (ответы до сохранения в профиль)
+CREATE TABLE IF NOT EXISTS registration_sessions (
+    telegram_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индекс для удаления брошенных регистраций
+CREATE INDEX IF NOT EXISTS idx_registration_sessions_updated_at ON registration_sessions(updated_at);
+
+-- Комментарии
+COMMENT ON TABLE registration_sessions IS 'Натальные данные пользователей, не завершивших регистрацию';
+COMMENT ON COLUMN registration_sessions.telegram_id IS 'Telegram ID пользователя';
+COMMENT ON COLUMN registration_sessions.data IS 'Уже полученные ответы (дата, время, место рождения, возраст)';
+COMMENT ON COLUMN registration_sessions.updated_at IS 'Дата и время последнего ответа';
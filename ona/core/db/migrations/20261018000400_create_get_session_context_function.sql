@@ -0,0 +1,41 @@
+-- Данные пользователя для обработки одного обновления за одно обращение к базе:
+-- пользователь, профиль, активная подписка и последние сообщения диалога.
+-- profiles.user_id и conversations.user_id содержат Telegram ID (см. schema.sql),
+-- subscriptions.user_id - users.id
+CREATE OR REPLACE FUNCTION get_session_context(p_telegram_id BIGINT, p_history_limit INTEGER DEFAULT 10)
+RETURNS JSONB
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'user', (
+            SELECT to_jsonb(u) FROM users u WHERE u.telegram_id = p_telegram_id
+        ),
+        'profile', (
+            SELECT to_jsonb(p) FROM profiles p WHERE p.user_id = p_telegram_id LIMIT 1
+        ),
+        'subscription', (
+            SELECT to_jsonb(s)
+            FROM subscriptions s
+            JOIN users u ON u.id = s.user_id
+            WHERE u.telegram_id = p_telegram_id
+              AND s.status = 'active'
+              AND s.end_date >= NOW()
+            ORDER BY s.end_date DESC
+            LIMIT 1
+        ),
+        'history', COALESCE((
+            SELECT jsonb_agg(to_jsonb(h) ORDER BY h.created_at)
+            FROM (
+                SELECT c.message_text, c.is_user, c.created_at
+                FROM conversations c
+                WHERE c.user_id = p_telegram_id
+                ORDER BY c.created_at DESC
+                LIMIT p_history_limit
+            ) h
+        ), '[]'::jsonb)
+    );
+$$;
+
+-- Комментарии
+COMMENT ON FUNCTION get_session_context(BIGINT, INTEGER) IS 'Пользователь, профиль, активная подписка и последние сообщения для SessionContext';
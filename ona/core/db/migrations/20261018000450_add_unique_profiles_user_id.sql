@@ -0,0 +1,20 @@
+-- Уникальный индекс на profiles.user_id.
+-- ProfileWriter записывает поля профиля одним upsert с on_conflict="user_id",
+-- для которого в Postgres нужно уникальное ограничение на этот столбец.
+-- schema.sql создает его (UNIQUE), supabase_setup.sql - нет, поэтому индекс
+-- создается, только если столбец еще не покрыт уникальным индексом
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'profiles'::regclass
+          AND i.indisunique
+          AND i.indnatts = 1
+          AND a.attname = 'user_id'
+    ) THEN
+        CREATE UNIQUE INDEX idx_profiles_user_id_unique ON profiles(user_id);
+    END IF;
+END
+$$;
@@ -0,0 +1,47 @@
+-- Индексы для частых запросов сервисов.
+-- Запросы перечислены в tests/test_migrations.py, где для каждого проверяется
+-- план выполнения (EXPLAIN)
+
+-- История диалога: WHERE user_id = ? ORDER BY created_at DESC LIMIT n
+-- (OpenAIService.get_conversation_history, SessionContext, get_session_context)
+CREATE INDEX IF NOT EXISTS idx_conversations_user_id_created_at
+    ON conversations(user_id, created_at DESC);
+
+-- Одностолбцовые индексы покрываются составным и только замедляют вставку сообщений
+-- (имена из schema.sql и supabase_setup.sql)
+DROP INDEX IF EXISTS idx_conversations_user_id;
+DROP INDEX IF EXISTS idx_conversation_user_id;
+
+-- Активная подписка: WHERE user_id = ? AND status = 'active' [AND end_date >= now()]
+-- ORDER BY end_date DESC LIMIT 1 (SubscriptionService, get_session_context)
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id_status_end_date
+    ON subscriptions(user_id, status, end_date DESC);
+
+-- Активация и проверка оплаты: WHERE payment_id = ?
+CREATE INDEX IF NOT EXISTS idx_subscriptions_payment_id
+    ON subscriptions(payment_id);
+
+-- Поиск пользователя: WHERE telegram_id = ? (UserIdentityMap, get_user_by_telegram_id).
+-- Индекс создается, только если столбец еще не покрыт уникальным ограничением
+-- (schema.sql создает его, supabase_setup.sql - нет). Профиль (WHERE user_id = ?)
+-- покрыт уникальным индексом из 20261018000450_add_unique_profiles_user_id.sql
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'users'::regclass
+          AND i.indisunique
+          AND i.indnatts = 1
+          AND a.attname = 'telegram_id'
+    ) THEN
+        CREATE UNIQUE INDEX idx_users_telegram_id_unique ON users(telegram_id);
+    END IF;
+END
+$$;
+
+-- Комментарии
+COMMENT ON INDEX idx_conversations_user_id_created_at IS 'Последние сообщения диалога пользователя';
+COMMENT ON INDEX idx_subscriptions_user_id_status_end_date IS 'Активная подписка пользователя с самой поздней датой окончания';
+COMMENT ON INDEX idx_subscriptions_payment_id IS 'Подписка по ID платежа';
@@ -0,0 +1,16 @@
+-- Создание таблицы кэша ответов модели (рекомендации и практики)
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индекс для удаления истекших ответов
+CREATE INDEX IF NOT EXISTS idx_response_cache_expires_at ON response_cache(expires_at);
+
+-- Комментарии
+COMMENT ON TABLE response_cache IS 'Ответы модели для детерминированных промптов';
+COMMENT ON COLUMN response_cache.key IS 'SHA-256 от модели, версии шаблона промпта, профиля и типа запроса';
+COMMENT ON COLUMN response_cache.value IS 'Текст ответа';
+COMMENT ON COLUMN response_cache.expires_at IS 'Дата и время истечения ответа';
@@ -0,0 +1,101 @@
+"""
+Проекции: наборы столбцов, которые запрос выбирает из таблицы вместо select("*")
+"""
+from typing import Dict, FrozenSet, Tuple
+
+# Известные столбцы таблиц (schema.sql и поля, которые записывает приложение)
+TABLE_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "users": frozenset((
+        "id", "telegram_id", "first_name", "last_name", "username", "created_at", "updated_at",
+    )),
+    "profiles": frozenset((
+        "id", "user_id", "birth_date", "birth_time", "birth_place", "age",
+        "psychology_progress", "psychology_answers", "psychology_profile",
+        "created_at", "updated_at",
+    )),
+    "subscriptions": frozenset((
+        "id", "user_id", "plan_type", "status", "start_date", "end_date", "payment_id",
+    )),
+    "conversations": frozenset((
+        "id", "user_id", "message_text", "is_user", "created_at",
+    )),
+}
+
+
+class Projection:
+    """
+    Набор столбцов одной таблицы.
+
+    Столбцы проверяются при создании проекции, поэтому опечатка в имени
+    столбца обнаруживается при импорте модуля, а не ошибкой PostgREST.
+    """
+    __slots__ = ("table", "columns", "clause")
+
+    def __init__(self, table: str, *columns: str):
+        """
+        Создание проекции
+
+        Args:
+            table: Имя таблицы
+            *columns: Выбираемые столбцы
+        """
+        known = TABLE_COLUMNS.get(table)
+        if known is None:
+            raise ValueError(f"Неизвестная таблица: {table}")
+        if not columns:
+            raise ValueError(f"Проекция таблицы {table} без столбцов")
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы таблицы {table}: {', '.join(unknown)}")
+
+        self.table = table
+        self.columns: Tuple[str, ...] = tuple(dict.fromkeys(columns))
+        # Готовая строка для select(), чтобы не собирать ее на каждый запрос
+        self.clause = ",".join(self.columns)
+
+    def select(self, db_client):
+        """
+        Построение запроса select по столбцам проекции
+
+        Args:
+            db_client: Клиент Supabase
+
+        Returns:
+            Запрос PostgREST, к которому добавляются фильтры
+        """
+        return db_client.table(self.table).select(self.clause)
+
+    def __add__(self, other: "Projection") -> "Projection":
+        if not isinstance(other, Projection) or other.table != self.table:
+            return NotImplemented
+        return Projection(self.table, *self.columns, *other.columns)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.columns
+
+    def __repr__(self) -> str:
+        return f"Projection({self.table!r}, {self.clause!r})"
+
+
+# Пользователь без служебных отметок времени
+USER = Projection("users", "id", "telegram_id", "first_name", "last_name", "username")
+
+# Профиль целиком и его части для отдельных проверок
+PROFILE = Projection(
+    "profiles",
+    "user_id", "birth_date", "birth_time", "birth_place", "age",
+    "psychology_progress", "psychology_answers", "psychology_profile", "updated_at"
+)
+PROFILE_NATAL = Projection("profiles", "user_id", "birth_date", "birth_time", "birth_place", "age")
+PROFILE_PSYCHOLOGY_PROGRESS = Projection("profiles", "user_id", "psychology_progress")
+PROFILE_PSYCHOLOGY_ANSWERS = Projection("profiles", "user_id", "psychology_answers")
+# Психологический профиль для промптов рекомендаций и практик
+PROFILE_PSYCHOLOGY = Projection("profiles", "user_id", "age", "psychology_answers", "psychology_profile")
+
+# Подписка: полная строка, состояние для проверок доступа и тариф для активации
+SUBSCRIPTION = Projection("subscriptions", "id", "user_id", "plan_type", "status", "start_date", "end_date", "payment_id")
+SUBSCRIPTION_STATUS = Projection("subscriptions", "id", "plan_type", "status", "start_date", "end_date")
+SUBSCRIPTION_PLAN = Projection("subscriptions", "id", "plan_type")
+
+# Сообщение диалога для построения контекста OpenAI
+CONVERSATION_MESSAGE = Projection("conversations", "message_text", "is_user", "created_at")
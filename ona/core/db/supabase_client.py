@@ -1,7 +1,11 @@
-from supabase import create_client
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+from ona.config.settings import settings
+from ona.core.services.registry import service_registry
+from ona.core.db.call_counter import db_call_counter
+from ona.core.db.executor import db_executor
+from ona.core.db.projections import CONVERSATION_MESSAGE, PROFILE, USER, Projection
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -10,15 +14,56 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
-# Создание клиента Supabase
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY, options={"schema": "public"})  
+def _create_supabase_client():
+    """
+    Создание клиента Supabase (вызывается при первом обращении к supabase).
+    При DATABASE_BACKEND=sqlite создается локальный клиент с тем же интерфейсом
+    """
+    if settings.DATABASE_BACKEND == "sqlite":
+        from ona.core.db.local_client import LocalClient
+        return LocalClient(
+            settings.SQLITE_PATH,
+            latency=settings.LOCAL_DB_LATENCY_MS / 1000,
+            jitter=settings.LOCAL_DB_JITTER_MS / 1000,
+            fault_rate=settings.LOCAL_DB_FAULT_RATE
+        )
+    from supabase import ClientOptions, create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(schema="public"))
+
+# Ленивое создание клиента Supabase при первом запросе к базе
+supabase = service_registry.register("supabase", _create_supabase_client)
+
+def _operation_name(query) -> str:
+    """
+    Имя таблицы или RPC запроса PostgREST (последний сегмент пути)
+    """
+    path = getattr(getattr(query, "request", None), "path", None) or getattr(query, "path", None) or ""
+    return str(path).rstrip("/").rsplit("/", 1)[-1] or "query"
+
+async def execute(query):
+    """
+    Выполнение запроса PostgREST в пуле потоков (без блокировки цикла событий)
+    с учетом в счетчике обращений к базе
+    
+    Args:
+        query: Построенный запрос (supabase.table(...)... или supabase.rpc(...))
+        
+    Returns:
+        Ответ PostgREST (APIResponse)
+    """
+    db_call_counter.record(_operation_name(query))
+    return await db_executor.run(query.execute)
 
 # Функции для работы с пользователями
-async def get_user_by_telegram_id(telegram_id: int):
+async def get_user_by_telegram_id(telegram_id: int, projection: Projection = USER):
     """
     Получение пользователя по его Telegram ID
+    
+    Args:
+        telegram_id: Telegram ID пользователя
+        projection: Выбираемые столбцы users
     """
-    response = supabase.table("users").select("*").eq("telegram_id", telegram_id).execute()
+    response = await execute(projection.select(supabase).eq("telegram_id", telegram_id).limit(1))
     if response.data and len(response.data) > 0:
         return response.data[0]
     return None
@@ -33,17 +78,24 @@ async def create_user(telegram_id: int, first_name: str = None, last_name: str =
         "last_name": last_name,
         "username": username
     }
-    response = supabase.table("users").insert(user_data).execute()
+    response = await execute(supabase.table("users").insert(user_data))
     if response.data and len(response.data) > 0:
+        # Новый пользователь больше не числится отсутствующим в кэше идентификаторов
+        from ona.core.services.user_identity import user_identity
+        user_identity.remember(telegram_id, response.data[0]["id"])
         return response.data[0]
     return None
 
 # Функции для работы с профилями
-async def get_profile(user_id: int):
+async def get_profile(user_id: int, projection: Projection = PROFILE):
     """
     Получение профиля пользователя
+    
+    Args:
+        user_id: ID пользователя
+        projection: Выбираемые столбцы profiles
     """
-    response = supabase.table("profiles").select("*").eq("user_id", user_id).execute()
+    response = await execute(projection.select(supabase).eq("user_id", user_id).limit(1))
     if response.data and len(response.data) > 0:
         return response.data[0]
     return None
@@ -58,7 +110,7 @@ async def create_profile(profile_data: dict):
     if "updated_at" not in profile_data:
         profile_data["updated_at"] = datetime.now().isoformat()
     
-    response = supabase.table("profiles").insert(profile_data).execute()
+    response = await execute(supabase.table("profiles").insert(profile_data))
     if response.data and len(response.data) > 0:
         return response.data[0]
     return None
@@ -75,7 +127,22 @@ async def update_profile(user_id: int, profile_data: dict):
     if "updated_at" not in profile_data:
         profile_data["updated_at"] = datetime.now().isoformat()
     
-    response = supabase.table("profiles").update(profile_data).eq("user_id", user_id).execute()
+    response = await execute(supabase.table("profiles").update(profile_data).eq("user_id", user_id))
+    if response.data and len(response.data) > 0:
+        return response.data[0]
+    return None
+
+async def upsert_profile(profile_data: dict):
+    """
+    Создание или обновление профиля одним запросом (по profiles.user_id)
+    
+    Args:
+        profile_data: Данные профиля с user_id; при обновлении меняются только переданные поля
+    """
+    if "updated_at" not in profile_data:
+        profile_data["updated_at"] = datetime.now().isoformat()
+    
+    response = await execute(supabase.table("profiles").upsert(profile_data, on_conflict="user_id"))
     if response.data and len(response.data) > 0:
         return response.data[0]
     return None
@@ -90,19 +157,24 @@ async def save_message(user_id: int, message_text: str, is_user: bool = True):
         "message_text": message_text,
         "is_user": is_user
     }
-    response = supabase.table("conversations").insert(message_data).execute()
+    response = await execute(supabase.table("conversations").insert(message_data))
     if response.data and len(response.data) > 0:
         return response.data[0]
     return None
 
-async def get_user_conversation_history(user_id: int, limit: int = 10):
+async def get_user_conversation_history(user_id: int, limit: int = 10, projection: Projection = CONVERSATION_MESSAGE):
     """
     Получение истории диалогов пользователя
+    
+    Args:
+        user_id: ID пользователя
+        limit: Количество последних сообщений
+        projection: Выбираемые столбцы conversations
     """
-    response = supabase.table("conversations") \
-        .select("*") \
-        .eq("user_id", user_id) \
-        .order("created_at", desc=True) \
-        .limit(limit) \
-        .execute()
+    response = await execute(
+        projection.select(supabase)
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+        .limit(limit)
+    )
     return response.data if response.data else [] 
@@ -2,10 +2,14 @@
 Обработчик состояния чата с AI-наставником
 """
 import logging
+import time
 from telegram import Update
-from core.fsm.base_handler import StateHandler
+from ona.core.fsm.state_handler import StateHandler
 from core.services.openai_service import openai_service
 from core.services.subscription_service import subscription_service
+from ona.config.settings import settings
+from ona.core.services.send_scheduler import NO_MERGE
+from ona.utils.message_stream import MessageStream
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +27,7 @@ class ChatHandler(StateHandler):
         if not update.message or not update.message.text:
             return
         
+        started_at = time.perf_counter()
         try:
             # Проверяем наличие активной подписки
             has_subscription = await subscription_service.has_active_subscription(
@@ -37,6 +42,10 @@ class ChatHandler(StateHandler):
                 )
                 return
             
+            if settings.CHAT_STREAMING:
+                await self.stream_reply(update, started_at)
+                return
+            
             # Генерируем ответ с помощью OpenAI
             response = await openai_service.generate_response(
                 user_id=update.effective_user.id,
@@ -58,6 +67,45 @@ class ChatHandler(StateHandler):
                 "Пожалуйста, попробуйте позже."
             )
     
+    async def stream_reply(self, update: Update, started_at: float):
+        """
+        Вывод ответа по мере генерации: первое сообщение после первых токенов,
+        затем редактирование с ограниченной частотой
+        
+        Args:
+            update: Обновление от Telegram
+            started_at: Начало обработки сообщения (time.perf_counter)
+        """
+        bot = update.get_bot()
+        stream = MessageStream(
+            # Сообщение потом редактируется, поэтому планировщик не объединяет его с другими
+            lambda text: bot.send_message(update.effective_chat.id, text, rate_limit_args=NO_MERGE),
+            edit_interval=settings.CHAT_STREAM_EDIT_INTERVAL,
+            started_at=started_at
+        )
+        try:
+            async for delta in openai_service.stream_response(
+                user_id=update.effective_user.id,
+                user_message=update.message.text
+            ):
+                await stream.feed(delta)
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой генерации ответа: {e}")
+            # Показываем уже полученную часть ответа
+            await stream.finish()
+            if not stream.visible:
+                await update.message.reply_text(
+                    "Извините, произошла ошибка при генерации ответа. "
+                    "Пожалуйста, попробуйте позже."
+                )
+            return
+        
+        if not await stream.finish():
+            await update.message.reply_text(
+                "Извините, произошла ошибка при генерации ответа. "
+                "Пожалуйста, попробуйте позже."
+            )
+    
     def get_subscription_keyboard(self):
         """
         Создает клавиатуру для перехода к подписке
@@ -3,6 +3,9 @@ from ..state_handler import StateHandler
 from core.models.psychology_questions import questions
 from core.services.profile_service import profile_service
 from core.services.openai_service import openai_service
+from ona.core.db.projections import PROFILE_PSYCHOLOGY_ANSWERS, PROFILE_PSYCHOLOGY_PROGRESS
+from ona.utils.callback_data import ANSWER, decode, encode
+from ona.utils.dispatch_table import CALLBACK_QUERY, Route
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +17,13 @@ class ProfilingPsychologyHandler(StateHandler):
     """
     Обработчик для состояния психологического профайлинга
     """
+    # Строки таблицы переходов StateRouter: ответы на вопросы обрабатываются
+    # сразу, без загрузки прогресса опросника
+    ROUTES = (
+        Route(STATE, CALLBACK_QUERY, ANSWER, "handle_answer"),
+        Route(STATE, None, None, "handle"),
+    )
+
     def __init__(self):
         # После завершения психологического профайлинга переходим к следующему этапу
         super().__init__(next_state="PROFILE_READY")
@@ -43,6 +53,15 @@ class ProfilingPsychologyHandler(StateHandler):
             # Если все вопросы заданы, генерируем психологический профиль
             await self.generate_profile(update)
     
+    async def handle_answer(self, update: Update):
+        """
+        Обработка нажатия на вариант ответа
+        
+        Args:
+            update: Обновление от Telegram
+        """
+        await self.process_answer(update.callback_query)
+    
     async def ask_question(self, update, question_index):
         """
         Отправка вопроса пользователю
@@ -56,7 +75,7 @@ class ProfilingPsychologyHandler(StateHandler):
         # Создание клавиатуры с вариантами ответов
         keyboard = []
         for option in question["options"]:
-            callback_data = f"answer_{question_index}_{option['id']}"
+            callback_data = encode(ANSWER, question_index, option["id"])
             keyboard.append([InlineKeyboardButton(option["text"], callback_data=callback_data)])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -69,7 +88,7 @@ class ProfilingPsychologyHandler(StateHandler):
         else:
             await update.message.reply_text(message_text, reply_markup=reply_markup)
     
-    async def process_answer(self, callback_query, user_progress):
+    async def process_answer(self, callback_query, user_progress=None):
         """
         Обработка ответа на вопрос
         
@@ -78,14 +97,13 @@ class ProfilingPsychologyHandler(StateHandler):
             user_progress: Текущий прогресс пользователя
         """
         # Разбор данных callback
-        data = callback_query.data
-        parts = data.split("_")
+        callback = decode(callback_query.data)
         
-        if len(parts) != 3 or parts[0] != "answer":
+        if callback.action != ANSWER or len(callback.args) != 2:
             return
         
-        question_index = int(parts[1])
-        option_id = parts[2]
+        question_index = int(callback.args[0])
+        option_id = callback.args[1]
         
         # Получение вопроса и выбранного ответа
         question = questions[question_index]
@@ -160,7 +178,7 @@ class ProfilingPsychologyHandler(StateHandler):
         
         # Переход к следующему состоянию
         from utils.state_router import state_router
-        await state_router.set_user_state(user_id, "PROFILE_READY")
+        await self.transition(user_id, state_router, "PROFILE_READY")
         
         # Отправка результатов пользователю
         await update.message.reply_text(
@@ -182,7 +200,7 @@ class ProfilingPsychologyHandler(StateHandler):
         """
         # Получение прогресса из базы данных
         try:
-            profile = await profile_service.get_profile(user_id)
+            profile = await profile_service.get_profile(user_id, PROFILE_PSYCHOLOGY_PROGRESS)
             if profile and "psychology_progress" in profile:
                 return profile["psychology_progress"]
         except Exception as e:
@@ -215,7 +233,7 @@ class ProfilingPsychologyHandler(StateHandler):
         """
         try:
             # Получение текущих ответов
-            profile = await profile_service.get_profile(user_id)
+            profile = await profile_service.get_profile(user_id, PROFILE_PSYCHOLOGY_ANSWERS)
             psychology_answers = profile.get("psychology_answers", {}) if profile else {}
             
             # Добавление нового ответа
@@ -242,7 +260,7 @@ class ProfilingPsychologyHandler(StateHandler):
             Словарь с ответами пользователя
         """
         try:
-            profile = await profile_service.get_profile(user_id)
+            profile = await profile_service.get_profile(user_id, PROFILE_PSYCHOLOGY_ANSWERS)
             if profile and "psychology_answers" in profile:
                 return profile["psychology_answers"]
         except Exception as e:
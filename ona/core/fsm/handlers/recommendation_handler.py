@@ -3,9 +3,10 @@
 """
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from core.fsm.base_handler import StateHandler
+from ona.core.fsm.state_handler import StateHandler
 from core.services.recommendation_service import recommendation_service
 from core.services.subscription_service import subscription_service
+from ona.utils.callback_data import PRACTICE, decode, encode
 
 logger = logging.getLogger(__name__)
 
@@ -92,12 +93,12 @@ class RecommendationHandler(StateHandler):
         """
         keyboard = [
             [
-                InlineKeyboardButton("Осознанность", callback_data="practice_mindfulness"),
-                InlineKeyboardButton("Антистресс", callback_data="practice_stress")
+                InlineKeyboardButton("Осознанность", callback_data=encode(PRACTICE, "mindfulness")),
+                InlineKeyboardButton("Антистресс", callback_data=encode(PRACTICE, "stress"))
             ],
             [
-                InlineKeyboardButton("Сон", callback_data="practice_sleep"),
-                InlineKeyboardButton("Энергия", callback_data="practice_energy")
+                InlineKeyboardButton("Сон", callback_data=encode(PRACTICE, "sleep")),
+                InlineKeyboardButton("Энергия", callback_data=encode(PRACTICE, "energy"))
             ]
         ]
         
@@ -119,14 +120,17 @@ class RecommendationHandler(StateHandler):
             callback_query = update.callback_query
             await callback_query.answer()
             
+            # Извлекаем тип практики из callback_data
+            callback = decode(callback_query.data)
+            if callback.action != PRACTICE or not callback.args:
+                return
+            practice_type = callback.args[0]
+            
             # Отправляем сообщение о генерации
             await callback_query.message.reply_text(
                 "Генерирую персонализированную практику... 🤔"
             )
             
-            # Извлекаем тип практики из callback_data
-            practice_type = callback_query.data.replace("practice_", "")
-            
             # Генерируем практику
             practice = await recommendation_service.generate_practice(
                 callback_query.from_user.id,
@@ -1,6 +1,8 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from ona.core.fsm.state_handler import StateHandler
 from ona.core.services.profile_service import profile_service
+from ona.core.services.registration_sessions import registration_sessions
+from ona.utils.dispatch_table import Route
 from datetime import datetime
 import logging
 import re
@@ -18,14 +20,32 @@ STATES = {
     "PROFILING_NATAL": "PROFILING_NATAL"  # Добавлено для соответствия work-plan
 }
 
+# Метод обработки для каждого подсостояния регистрации
+SUBSTATE_METHODS = {
+    STATES["START"]: "handle_start",
+    STATES["BIRTH_DATE"]: "handle_birth_date",
+    STATES["BIRTH_TIME"]: "handle_birth_time",
+    STATES["BIRTH_PLACE"]: "handle_birth_place",
+    STATES["AGE"]: "handle_age",
+    # Регистрация начинается заново, как и раньше для неизвестного подсостояния
+    STATES["COMPLETE"]: "handle_start",
+    # Добавлено для соответствия work-plan, по сути дублирует START
+    STATES["PROFILING_NATAL"]: "handle_start",
+}
+
 class RegistrationHandler(StateHandler):
     """
     Обработчик для регистрации пользователя и сбора натальных данных
     """
+    # Строки таблицы переходов StateRouter
+    ROUTES = tuple(Route(state, None, None, method) for state, method in SUBSTATE_METHODS.items())
+
     def __init__(self):
         # После завершения регистрации переходим к началу профайлинга личности
         super().__init__(next_state=STATES["COMPLETE"])
-        self.user_data = {}
+        # Ответы хранятся отдельно для каждого пользователя до завершения регистрации
+        self.sessions = registration_sessions
+        self._substate_handlers = {state: getattr(self, method) for state, method in SUBSTATE_METHODS.items()}
     
     async def handle(self, update: Update):
         """
@@ -38,26 +58,13 @@ class RegistrationHandler(StateHandler):
         from ona.utils.state_router import state_router
         
         # Определяем текущее подсостояние пользователя
-        current_state = await state_router.get_user_state(user_id)
+        current_state, version = await state_router.get_user_state_versioned(user_id)
         logger.info(f"Обработка регистрации для пользователя {user_id}, состояние: {current_state}")
         
-        # Маршрутизация по подсостояниям
-        if current_state == STATES["START"]:
-            await self.handle_start(update)
-        elif current_state == STATES["BIRTH_DATE"]:
-            await self.handle_birth_date(update)
-        elif current_state == STATES["BIRTH_TIME"]:
-            await self.handle_birth_time(update)
-        elif current_state == STATES["BIRTH_PLACE"]:
-            await self.handle_birth_place(update)
-        elif current_state == STATES["AGE"]:
-            await self.handle_age(update)
-        elif current_state == STATES["PROFILING_NATAL"]:
-            # Добавлено для соответствия work-plan, по сути дублирует START
-            await self.handle_start(update)
-        else:
-            # Если состояние неизвестно, начинаем с начала
-            await self.handle_start(update)
+        # Маршрутизация по подсостояниям (если состояние неизвестно, начинаем с начала)
+        handler = self._substate_handlers.get(current_state, self.handle_start)
+        with state_router.expecting(user_id, version):
+            await handler(update)
     
     async def handle_start(self, update: Update):
         """
@@ -77,7 +84,7 @@ class RegistrationHandler(StateHandler):
         )
         
         # Переход к сбору даты рождения
-        await self.transition(user_id, state_router, STATES["BIRTH_DATE"])
+        await self.transition(user_id, state_router, STATES["BIRTH_DATE"], state_router.current_version(user_id))
     
     async def handle_birth_date(self, update: Update):
         """
@@ -109,7 +116,7 @@ class RegistrationHandler(StateHandler):
                     return
                 
                 # Сохранение даты рождения
-                self.user_data["birth_date"] = birth_date_text
+                await self.sessions.update(user_id, birth_date=birth_date_text)
                 
                 # Запрос времени рождения
                 keyboard = ReplyKeyboardMarkup(
@@ -125,7 +132,7 @@ class RegistrationHandler(StateHandler):
                 )
                 
                 # Переход к сбору времени рождения
-                await self.transition(user_id, state_router, STATES["BIRTH_TIME"])
+                await self.transition(user_id, state_router, STATES["BIRTH_TIME"], state_router.current_version(user_id))
             
             except ValueError:
                 await update.message.reply_text(
@@ -150,12 +157,12 @@ class RegistrationHandler(StateHandler):
         
         # Обработка случая, когда пользователь не знает время рождения
         if birth_time_text == "Я не знаю время рождения":
-            self.user_data["birth_time"] = "неизвестно"
+            await self.sessions.update(user_id, birth_time="неизвестно")
             await update.message.reply_text(
                 "Хорошо, это не проблема. Теперь, пожалуйста, введи место твоего рождения (город или населенный пункт).",
                 reply_markup=ReplyKeyboardRemove()
             )
-            await self.transition(user_id, state_router, STATES["BIRTH_PLACE"])
+            await self.transition(user_id, state_router, STATES["BIRTH_PLACE"], state_router.current_version(user_id))
             return
         
         # Валидация времени с помощью регулярного выражения
@@ -169,7 +176,7 @@ class RegistrationHandler(StateHandler):
                 # Проверка валидности времени
                 if 0 <= hour <= 23 and 0 <= minute <= 59:
                     # Сохранение времени рождения
-                    self.user_data["birth_time"] = birth_time_text
+                    await self.sessions.update(user_id, birth_time=birth_time_text)
                     
                     # Запрос места рождения
                     await update.message.reply_text(
@@ -178,7 +185,7 @@ class RegistrationHandler(StateHandler):
                     )
                     
                     # Переход к сбору места рождения
-                    await self.transition(user_id, state_router, STATES["BIRTH_PLACE"])
+                    await self.transition(user_id, state_router, STATES["BIRTH_PLACE"], state_router.current_version(user_id))
                 else:
                     await update.message.reply_text(
                         "Пожалуйста, введи корректное время в формате ЧЧ:ММ (например, 14:30)."
@@ -212,7 +219,7 @@ class RegistrationHandler(StateHandler):
             return
         
         # Сохранение места рождения
-        self.user_data["birth_place"] = birth_place
+        await self.sessions.update(user_id, birth_place=birth_place)
         
         # Запрос возраста
         keyboard = [[str(i)] for i in range(18, 81, 10)]
@@ -224,7 +231,7 @@ class RegistrationHandler(StateHandler):
         )
         
         # Переход к сбору возраста
-        await self.transition(user_id, state_router, STATES["AGE"])
+        await self.transition(user_id, state_router, STATES["AGE"], state_router.current_version(user_id))
     
     async def handle_age(self, update: Update):
         """
@@ -252,18 +259,18 @@ class RegistrationHandler(StateHandler):
             # Проверка валидности возраста
             if 1 <= age <= 120:
                 # Сохранение возраста
-                self.user_data["age"] = age
+                await self.sessions.update(user_id, age=age)
                 
                 # Сохранение данных пользователя
-                await self.save_user_data(user_id)
+                natal_data = await self.save_user_data(user_id)
                 
                 # Завершение регистрации
                 await update.message.reply_text(
                     f"Отлично! Первый этап профайлинга завершен. Вот данные, которые я записала:\n\n"
-                    f"📅 Дата рождения: {self.user_data.get('birth_date')}\n"
-                    f"🕒 Время рождения: {self.user_data.get('birth_time')}\n"
-                    f"📍 Место рождения: {self.user_data.get('birth_place')}\n"
-                    f"👤 Возраст: {self.user_data.get('age')}\n\n"
+                    f"📅 Дата рождения: {natal_data.get('birth_date')}\n"
+                    f"🕒 Время рождения: {natal_data.get('birth_time')}\n"
+                    f"📍 Место рождения: {natal_data.get('birth_place')}\n"
+                    f"👤 Возраст: {natal_data.get('age')}\n\n"
                     f"Теперь мы можем перейти к следующему этапу профайлинга.",
                     reply_markup=InlineKeyboardMarkup([
                         [InlineKeyboardButton("Продолжить профайлинг", callback_data="continue_profiling")]
@@ -271,7 +278,7 @@ class RegistrationHandler(StateHandler):
                 )
                 
                 # Переход к завершению регистрации
-                await self.transition(user_id, state_router, STATES["COMPLETE"])
+                await self.transition(user_id, state_router, STATES["COMPLETE"], state_router.current_version(user_id))
             else:
                 await update.message.reply_text(
                     "Пожалуйста, введи корректный возраст (от 1 до 120 лет)."
@@ -291,16 +298,17 @@ class RegistrationHandler(StateHandler):
         Returns:
             Словарь с сохраненными данными
         """
-        logger.info(f"Сохранение натальных данных для пользователя {user_id}: {self.user_data}")
+        session = await self.sessions.get(user_id)
+        natal_data = session.to_dict()
+        logger.info(f"Сохранение натальных данных для пользователя {user_id}: {natal_data}")
         
         # Используем сервис профилей для сохранения данных
         try:
-            await profile_service.save_natal_data(user_id, self.user_data)
+            await profile_service.save_natal_data(user_id, natal_data)
         except Exception as e:
             logger.error(f"Ошибка при сохранении натальных данных: {e}")
         
-        # Возвращаем копию данных и очищаем хранилище
-        natal_data = self.user_data.copy()
-        self.user_data = {}
+        # Возвращаем данные и удаляем сессию регистрации
+        await self.sessions.discard(user_id)
         
         return natal_data 
@@ -1,5 +1,6 @@
 from telegram import Update
 import logging
+from ona.core.services.state_store import StateConflictError
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ class StateHandler:
         """
         raise NotImplementedError("Subclasses must implement this method")
     
-    async def transition(self, user_id, state_router, state=None):
+    async def transition(self, user_id, state_router, state=None, expected_version=None):
         """
         Переход в следующее состояние
         
@@ -33,8 +34,24 @@ class StateHandler:
             user_id: ID пользователя
             state_router: Объект маршрутизатора состояний
             state: Состояние, в которое нужно перейти (если не задано, используется self.next_state)
+            expected_version: Версия состояния, прочитанная обработчиком; если другой
+                обработчик успел изменить состояние, переход не выполняется
+            
+        Returns:
+            bool: True если переход выполнен
         """
         target_state = state or self.next_state
-        if target_state:
-            await state_router.set_user_state(user_id, target_state)
-            logger.info(f"Пользователь {user_id} перешел в состояние {target_state}") 
\ No newline at end of file
+        if not target_state:
+            return False
+
+        try:
+            await state_router.set_user_state(user_id, target_state, expected_version)
+        except StateConflictError as e:
+            logger.warning(f"Переход в состояние {target_state} отменен: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Переход в состояние {target_state} не сохранен: {e}")
+            return False
+
+        logger.info(f"Пользователь {user_id} перешел в состояние {target_state}")
+        return True 
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Формирование промпта чата в пределах бюджета токенов: последние сообщения
+диалога и краткое содержание более ранней части
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from ona.utils.tokens import MESSAGE_OVERHEAD, count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Составление краткого содержания: (предыдущее содержание, новые строки) -> текст
+Summarizer = Callable[[Optional[str], List[Dict[str, Any]]], Awaitable[str]]
+
+SUMMARY_PREFIX = "Краткое содержание более ранней части диалога:\n"
+
+
+class Summary(NamedTuple):
+    """
+    Краткое содержание диалога до сообщения с created_at == until (включительно)
+    """
+    text: str
+    until: Optional[str]
+
+
+class PromptContext(NamedTuple):
+    """
+    Сформированный запрос к модели
+    """
+    messages: List[Dict[str, str]]
+    # Токены промпта и допустимая длина ответа
+    prompt_tokens: int
+    max_tokens: int
+    # Токены промпта без бюджета (системный промпт и последние baseline_messages сообщений)
+    baseline_tokens: int
+    history_messages: int
+
+
+def parse_created_at(value: Any) -> Optional[datetime]:
+    """
+    created_at строки conversations как наивное время UTC: строки буфера записи
+    хранят время без часового пояса, строки из базы - с ним (+00:00)
+
+    Returns:
+        Optional[datetime]: Время или None, если его нет или формат не распознан
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def to_message(row: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Строка conversations в формате сообщения OpenAI
+    """
+    return {"role": "user" if row["is_user"] else "assistant", "content": row["message_text"]}
+
+
+class ContextBuilder:
+    """
+    Сборка промпта чата по бюджету токенов.
+
+    Системный промпт, краткое содержание и новое сообщение входят всегда;
+    оставшийся бюджет (за вычетом минимальной длины ответа) заполняется
+    сообщениями истории от новых к старым. Сообщения, не вошедшие в
+    промпт, в фоне добавляются к краткому содержанию диалога пользователя.
+    Длина ответа (max_tokens) - остаток бюджета, но не больше reply_max_tokens.
+    """
+    def __init__(
+        self,
+        model: str,
+        token_budget: int = 4000,
+        reply_min_tokens: int = 1000,
+        reply_max_tokens: int = 2000,
+        summarize: Optional[Summarizer] = None,
+        summary_min_messages: int = 4,
+        max_summaries: int = 10000,
+        baseline_messages: int = 10
+    ):
+        """
+        Инициализация сборщика
+
+        Args:
+            model: Модель OpenAI (для подсчета токенов)
+            token_budget: Бюджет токенов на промпт и ответ
+            reply_min_tokens: Минимальная длина ответа в токенах
+            reply_max_tokens: Максимальная длина ответа в токенах
+            summarize: Составление краткого содержания (None - без краткого содержания)
+            summary_min_messages: Количество не вошедших сообщений, при котором обновляется содержание
+            max_summaries: Максимальное количество пользователей с кратким содержанием в памяти
+            baseline_messages: Количество сообщений истории в прежнем промпте (для сравнения)
+        """
+        self.model = model
+        self.token_budget = token_budget
+        self.reply_min_tokens = reply_min_tokens
+        self.reply_max_tokens = reply_max_tokens
+        self.summarize = summarize
+        self.summary_min_messages = summary_min_messages
+        self.max_summaries = max_summaries
+        self.baseline_messages = baseline_messages
+        self._summaries: "OrderedDict[Any, Summary]" = OrderedDict()
+        self._pending: Dict[Any, asyncio.Task] = {}
+
+        # Метрики
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.baseline_tokens = 0
+        self.last_prompt_tokens = 0
+        self.last_baseline_tokens = 0
+        self.dropped_messages = 0
+        self.summary_updates = 0
+        self.summary_errors = 0
+
+    def get_summary(self, user_id) -> Optional[Summary]:
+        """
+        Текущее краткое содержание диалога пользователя
+        """
+        return self._summaries.get(user_id)
+
+    def _unsummarized(self, user_id, dropped: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Не вошедшие в промпт сообщения, которых еще нет в кратком содержании
+        """
+        summary = self._summaries.get(user_id)
+        until = parse_created_at(summary.until) if summary is not None else None
+        if until is None:
+            return dropped
+        # Сообщения без времени нельзя упорядочить относительно содержания - пропускаем их
+        return [
+            row for row in dropped
+            if (created_at := parse_created_at(row.get("created_at"))) is not None and created_at > until
+        ]
+
+    def build(
+        self,
+        user_id,
+        system_prompt: str,
+        history: List[Dict[str, Any]],
+        user_message: str
+    ) -> PromptContext:
+        """
+        Формирование запроса к модели
+
+        Args:
+            user_id: ID пользователя
+            system_prompt: Системный промпт
+            history: Последние сообщения диалога в хронологическом порядке
+            user_message: Новое сообщение пользователя
+
+        Returns:
+            PromptContext: Сообщения запроса, количество токенов и max_tokens
+        """
+        head = [{"role": "system", "content": system_prompt}]
+        summary = self._summaries.get(user_id)
+        if summary is not None:
+            self._summaries.move_to_end(user_id)
+            head.append({"role": "system", "content": SUMMARY_PREFIX + summary.text})
+        tail = [{"role": "user", "content": user_message}]
+
+        prompt_tokens = count_message_tokens(head + tail, self.model)
+        available = self.token_budget - self.reply_min_tokens - prompt_tokens
+
+        # История от новых сообщений к старым, пока помещается в бюджет
+        included: List[Dict[str, str]] = []
+        for row in reversed(history):
+            message = to_message(row)
+            tokens = MESSAGE_OVERHEAD + count_tokens(message["role"], self.model) + count_tokens(message["content"], self.model)
+            if tokens > available:
+                break
+            available -= tokens
+            prompt_tokens += tokens
+            included.append(message)
+        included.reverse()
+
+        dropped = history[:len(history) - len(included)]
+        self.dropped_messages += len(dropped)
+        self._schedule_summary(user_id, dropped)
+
+        baseline = [{"role": "system", "content": system_prompt}]
+        baseline.extend(to_message(row) for row in history[-self.baseline_messages:])
+        baseline_tokens = count_message_tokens(baseline + tail, self.model)
+
+        max_tokens = max(self.reply_min_tokens, min(self.reply_max_tokens, self.token_budget - prompt_tokens))
+
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.baseline_tokens += baseline_tokens
+        self.last_prompt_tokens = prompt_tokens
+        self.last_baseline_tokens = baseline_tokens
+        logger.info(
+            f"Промпт пользователя {user_id}: {prompt_tokens} токенов (без бюджета - {baseline_tokens}), "
+            f"сообщений истории {len(included)} из {len(history)}, max_tokens={max_tokens}"
+        )
+        return PromptContext(head + included + tail, prompt_tokens, max_tokens, baseline_tokens, len(included))
+
+    def _schedule_summary(self, user_id, dropped: List[Dict[str, Any]]):
+        """
+        Запуск фонового обновления краткого содержания, если накопилось достаточно сообщений
+        """
+        if self.summarize is None or user_id in self._pending:
+            return
+        rows = self._unsummarized(user_id, dropped)
+        if len(rows) < self.summary_min_messages:
+            return
+        self._pending[user_id] = asyncio.create_task(self._update_summary(user_id, rows))
+
+    async def _update_summary(self, user_id, rows: List[Dict[str, Any]]):
+        """
+        Добавление сообщений к краткому содержанию диалога пользователя
+        """
+        previous = self._summaries.get(user_id)
+        try:
+            text = await self.summarize(previous.text if previous else None, rows)
+            if text:
+                self._summaries[user_id] = Summary(text, rows[-1].get("created_at"))
+                self._summaries.move_to_end(user_id)
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+                self.summary_updates += 1
+        except Exception as e:
+            self.summary_errors += 1
+            logger.error(f"Ошибка при обновлении краткого содержания диалога пользователя {user_id}: {e}")
+        finally:
+            self._pending.pop(user_id, None)
+
+    async def wait(self):
+        """
+        Ожидание запущенных обновлений краткого содержания
+        """
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики сборки промптов
+
+        Returns:
+            Dict[str, Any]: Токены промпта с бюджетом и без него, краткие содержания
+        """
+        return {
+            "requests": self.requests,
+            "token_budget": self.token_budget,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else 0.0,
+            "avg_baseline_tokens": round(self.baseline_tokens / self.requests, 1) if self.requests else 0.0,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "last_baseline_tokens": self.last_baseline_tokens,
+            "dropped_messages": self.dropped_messages,
+            "summaries": len(self._summaries),
+            "summary_updates": self.summary_updates,
+            "summary_errors": self.summary_errors,
+            "summaries_pending": len(self._pending),
+        }
@@ -0,0 +1,210 @@
+"""
+Последние сообщения диалога каждого пользователя в памяти процесса
+"""
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from ona.config.settings import settings
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Оценка памяти, занимаемой строкой помимо текста сообщения (словарь, created_at)
+ROW_OVERHEAD = 400
+
+# Загрузка последних сообщений из базы: limit -> строки в хронологическом порядке
+HistoryLoader = Callable[[int], Awaitable[List[Dict[str, Any]]]]
+
+
+class _History:
+    """
+    Кольцевой буфер сообщений одного пользователя
+    """
+    __slots__ = ("rows", "complete", "size")
+
+    def __init__(self, max_messages: int):
+        self.rows: Deque[Dict[str, Any]] = deque(maxlen=max_messages)
+        # True - в буфере все сообщения пользователя (более старых в базе нет)
+        self.complete = False
+        self.size = 0
+
+
+def _row_size(row: Dict[str, Any]) -> int:
+    return len((row.get("message_text") or "").encode("utf-8")) + ROW_OVERHEAD
+
+
+class ConversationCache:
+    """
+    Кэш последних сообщений диалога перед таблицей conversations.
+
+    При промахе загружаются нужные сообщения (warm-load), затем каждое
+    сохраненное сообщение добавляется в буфер пользователя, поэтому
+    активные пользователи получают историю без запросов к базе. Буфер
+    пользователя хранит не более max_messages сообщений; при превышении
+    max_bytes вытесняются пользователи, которые дольше всех не писали.
+    """
+    def __init__(self, max_messages: int = 50, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Инициализация кэша
+
+        Args:
+            max_messages: Максимальное количество сообщений в буфере пользователя
+            max_bytes: Ограничение оценки занимаемой памяти в байтах
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._users: "OrderedDict[Any, _History]" = OrderedDict()
+        # Пользователи, история которых загружается, и загрузки, устаревшие до окончания
+        self._loading: Dict[Any, int] = {}
+        self._stale: Set[Any] = set()
+        self.bytes = 0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self):
+        """
+        Вытеснение самых давно использованных пользователей до max_bytes
+        """
+        while self.bytes > self.max_bytes and self._users:
+            _, history = self._users.popitem(last=False)
+            self.bytes -= history.size
+            self.evictions += 1
+
+    def _append(self, history: _History, row: Dict[str, Any]):
+        if len(history.rows) == history.rows.maxlen:
+            dropped = history.rows.popleft()
+            history.size -= _row_size(dropped)
+            self.bytes -= _row_size(dropped)
+            history.complete = False
+        history.rows.append(row)
+        history.size += _row_size(row)
+        self.bytes += _row_size(row)
+
+    def covers(self, user_id, limit: int) -> bool:
+        """
+        Может ли кэш вернуть limit последних сообщений без обращения к базе
+
+        Args:
+            user_id: ID пользователя
+            limit: Количество сообщений
+
+        Returns:
+            bool: True если история пользователя в кэше и содержит limit сообщений (или все)
+        """
+        history = self._users.get(user_id)
+        return history is not None and (len(history.rows) >= limit or history.complete)
+
+    async def get(self, user_id, limit: int, load: HistoryLoader) -> List[Dict[str, Any]]:
+        """
+        Последние сообщения пользователя в хронологическом порядке
+
+        Args:
+            user_id: ID пользователя
+            limit: Количество сообщений
+            load: Загрузка последних сообщений из базы при промахе
+
+        Returns:
+            List[Dict[str, Any]]: Строки conversations (message_text, is_user, created_at)
+        """
+        if self.covers(user_id, limit):
+            history = self._users[user_id]
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return list(history.rows)[-limit:]
+
+        self.misses += 1
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        try:
+            rows = await load(limit)
+        finally:
+            stale = user_id in self._stale
+            self._loading[user_id] -= 1
+            if not self._loading[user_id]:
+                del self._loading[user_id]
+                self._stale.discard(user_id)
+
+        # Сообщение, сохраненное во время загрузки, могло в нее не попасть
+        if not stale:
+            self._store(user_id, rows, complete=len(rows) < limit)
+        return rows[-limit:]
+
+    def _store(self, user_id, rows: List[Dict[str, Any]], complete: bool):
+        """
+        Замена буфера пользователя загруженной историей
+        """
+        self.discard(user_id)
+        history = _History(self.max_messages)
+        for row in rows:
+            self._append(history, {
+                "message_text": row.get("message_text"),
+                "is_user": row.get("is_user"),
+                "created_at": row.get("created_at"),
+            })
+        history.complete = complete and len(rows) <= self.max_messages
+        self._users[user_id] = history
+        self._evict()
+
+    def append(self, user_id, message_text: str, is_user: bool, created_at: Optional[str] = None):
+        """
+        Добавление сохраненного сообщения (если история пользователя в кэше)
+
+        Args:
+            user_id: ID пользователя
+            message_text: Текст сообщения
+            is_user: Сообщение от пользователя
+            created_at: Время создания в формате ISO
+        """
+        if user_id in self._loading:
+            self._stale.add(user_id)
+        history = self._users.get(user_id)
+        if history is None:
+            return
+        self._append(history, {"message_text": message_text, "is_user": is_user, "created_at": created_at})
+        self._users.move_to_end(user_id)
+        self._evict()
+
+    def discard(self, user_id=None):
+        """
+        Удаление истории пользователя (или всего кэша)
+
+        Args:
+            user_id: ID пользователя (по умолчанию - все пользователи)
+        """
+        if user_id is None:
+            self._users.clear()
+            self.bytes = 0
+            return
+        history = self._users.pop(user_id, None)
+        if history is not None:
+            self.bytes -= history.size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики кэша
+
+        Returns:
+            Dict[str, Any]: Размер кэша, попадания, промахи и вытеснения
+        """
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "messages": sum(len(history.rows) for history in self._users.values()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Создание экземпляра кэша истории диалогов
+conversation_cache = ConversationCache(
+    max_messages=settings.CONVERSATION_CACHE_MESSAGES,
+    max_bytes=settings.CONVERSATION_CACHE_MAX_BYTES
+)
+metrics_registry.register("conversation_cache", conversation_cache.get_stats)
@@ -0,0 +1,254 @@
+"""
+Отложенная пакетная запись сообщений диалога в таблицу conversations
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseConversationBackend:
+    """
+    Запись сообщений в таблицу conversations одним INSERT на пакет
+    """
+    def __init__(self, db_client=None, table: str = "conversations"):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            table: Имя таблицы сообщений
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.table = table
+
+    async def insert(self, rows: List[Dict[str, Any]]):
+        """
+        Вставка пакета сообщений (строки вставляются в порядке списка)
+
+        Args:
+            rows: Строки conversations
+        """
+        await execute(self.db_client.table(self.table).insert(rows))
+
+
+class ConversationWriter:
+    """
+    Буфер сообщений диалога с записью пакетами (write-behind).
+
+    Пакет записывается, когда в буфере набралось max_batch строк или
+    прошло flush_interval секунд с первой незаписанной строки, а также
+    при остановке приложения. Пакеты записываются строго по очереди,
+    строки внутри пакета - в порядке добавления, а created_at назначается
+    при добавлении и строго возрастает, поэтому порядок сообщений каждого
+    пользователя сохраняется.
+    """
+    def __init__(
+        self,
+        backend=None,
+        max_batch: int = 50,
+        flush_interval: float = 0.5,
+        max_buffer: int = 10000
+    ):
+        """
+        Инициализация буфера
+
+        Args:
+            backend: Хранилище с методом insert(rows) (по умолчанию - Supabase)
+            max_batch: Количество строк, при котором пакет записывается сразу
+            flush_interval: Максимальная задержка записи в секундах
+            max_buffer: Максимальное количество незаписанных строк (при ошибках записи)
+        """
+        self._backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        # Строки и момент их добавления (time.monotonic)
+        self._buffer: List[Tuple[Dict[str, Any], float]] = []
+        self._in_flight: List[Tuple[Dict[str, Any], float]] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_created_at = datetime.min
+
+        # Метрики
+        self.added = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.max_flush_size = 0
+        self.lag = LatencyStats()
+        self.flush_latency = LatencyStats()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = SupabaseConversationBackend()
+        return self._backend
+
+    def _next_created_at(self) -> str:
+        """
+        Время создания строки: строго больше предыдущего, даже в пределах одной микросекунды
+        """
+        now = datetime.now()
+        if now <= self._last_created_at:
+            now = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = now
+        return now.isoformat()
+
+    def add(self, user_id, message_text: str, is_user: bool = True) -> Dict[str, Any]:
+        """
+        Добавление сообщения в буфер
+
+        Args:
+            user_id: ID пользователя
+            message_text: Текст сообщения
+            is_user: Сообщение от пользователя
+
+        Returns:
+            Dict[str, Any]: Строка conversations, которая будет записана
+        """
+        row = {
+            "user_id": user_id,
+            "message_text": message_text,
+            "is_user": is_user,
+            "created_at": self._next_created_at(),
+        }
+        self._buffer.append((row, time.monotonic()))
+        self.added += 1
+
+        if len(self._buffer) >= self.max_batch:
+            self._spawn(self.flush())
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_later())
+        return row
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        """
+        Запуск фоновой задачи с сохранением ссылки на нее
+        """
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self):
+        """
+        Запись буфера через flush_interval после первой незаписанной строки
+        """
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self._timer = None
+        await self.flush()
+
+    def has_pending(self, user_id) -> bool:
+        """
+        Есть ли незаписанные сообщения пользователя (в буфере или в записываемом пакете)
+
+        Args:
+            user_id: ID пользователя
+        """
+        return any(row["user_id"] == user_id for row, _ in self._in_flight) or \
+            any(row["user_id"] == user_id for row, _ in self._buffer)
+
+    async def flush_user(self, user_id):
+        """
+        Запись буфера, если в нем есть сообщения пользователя
+        (перед чтением истории, чтобы она включала последние сообщения)
+
+        Args:
+            user_id: ID пользователя
+        """
+        if self.has_pending(user_id):
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Запись всех строк буфера одним пакетом
+
+        Returns:
+            int: Количество записанных строк
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+
+            batch, self._buffer = self._buffer, []
+            self._in_flight = batch
+            started_at = time.monotonic()
+            try:
+                await self.backend.insert([row for row, _ in batch])
+            except Exception as e:
+                # Строки возвращаются в начало буфера, чтобы сохранить порядок
+                self.failed_flushes += 1
+                self._buffer = batch + self._buffer
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+                logger.error(f"Ошибка при записи {len(batch)} сообщений диалога: {e}")
+                if self._timer is None:
+                    self._timer = self._spawn(self._flush_later())
+                return 0
+            finally:
+                self._in_flight = []
+
+            finished_at = time.monotonic()
+            self.flush_latency.observe(finished_at - started_at)
+            for _, enqueued_at in batch:
+                self.lag.observe(finished_at - enqueued_at)
+            self.flushes += 1
+            self.written += len(batch)
+            self.max_flush_size = max(self.max_flush_size, len(batch))
+            return len(batch)
+
+    async def close(self):
+        """
+        Запись оставшихся строк при остановке приложения
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики буфера
+
+        Returns:
+            Dict[str, Any]: Размер буфера, размер пакетов и задержка записи
+        """
+        return {
+            "buffered": len(self._buffer),
+            "in_flight": len(self._in_flight),
+            "added": self.added,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "avg_flush_size": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_size": self.max_flush_size,
+            "lag": self.lag.snapshot(),
+            "flush_latency": self.flush_latency.snapshot(),
+        }
+
+
+# Создание экземпляра буфера сообщений диалога
+conversation_writer = ConversationWriter(
+    max_batch=settings.CONVERSATION_BATCH_SIZE,
+    flush_interval=settings.CONVERSATION_FLUSH_INTERVAL,
+    max_buffer=settings.CONVERSATION_BUFFER_MAX
+)
+metrics_registry.register("conversation_writer", conversation_writer.get_stats)
@@ -5,7 +5,8 @@ import os
 import logging
 import aiohttp
 from typing import Optional, Dict, Any
-from core.config import settings
+from ona.config.settings import settings
+from ona.core.services.registry import service_registry
 
 logger = logging.getLogger(__name__)
 
@@ -41,9 +42,8 @@ class ElevenLabsService:
                 "use_speaker_boost": True
             }
         }
-        
-        # Проверяем доступность API
-        self._check_api_availability()
+        # Доступность API не проверяется при создании сервиса, чтобы не замедлять
+        # холодный старт; при необходимости вызовите await _check_api_availability()
     
     async def _check_api_availability(self):
         """
@@ -169,5 +169,5 @@ class ElevenLabsService:
             logger.error(f"Ошибка при генерации аудио: {e}")
             return None
 
-# Создание экземпляра сервиса
-elevenlabs_service = ElevenLabsService() 
\ No newline at end of file
+# Ленивое создание экземпляра сервиса при первом обращении
+elevenlabs_service = service_registry.register("elevenlabs_service", ElevenLabsService) 
\ No newline at end of file
@@ -7,7 +7,11 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 from core.services.elevenlabs_service import elevenlabs_service
 from core.services.recommendation_service import recommendation_service
-from core.db.supabase_client import supabase
+from core.db.supabase_client import execute, supabase
+from ona.core.services.registry import service_registry
+from ona.core.services.user_identity import user_identity
+from ona.utils.metrics import metrics_registry
+from ona.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +29,10 @@ class MeditationService:
         # Директория для хранения аудиофайлов
         self.audio_dir = "audio"
         os.makedirs(self.audio_dir, exist_ok=True)
+        
+        # Повторные запросы той же медитации, пока она генерируется,
+        # получают тот же файл без отдельных запросов к OpenAI и 11Labs
+        self.flights = SingleFlight()
     
     async def generate_meditation_audio(
         self,
@@ -34,6 +42,22 @@ class MeditationService:
         """
         Генерация аудиомедитации
         
+        Args:
+            telegram_id: Telegram ID пользователя
+            practice_type: Тип практики
+            
+        Returns:
+            Optional[str]: Путь к аудиофайлу или None в случае ошибки
+        """
+        return await self.flights.do(
+            ("meditation", telegram_id, practice_type),
+            lambda: self._generate_meditation_audio(telegram_id, practice_type)
+        )
+    
+    async def _generate_meditation_audio(self, telegram_id: int, practice_type: str) -> Optional[str]:
+        """
+        Генерация текста и аудио медитации и сохранение файла
+        
         Args:
             telegram_id: Telegram ID пользователя
             practice_type: Тип практики
@@ -98,14 +122,12 @@ class MeditationService:
         """
         try:
             # Получаем ID пользователя
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data:
+            if user_id is None:
                 logger.error(f"Пользователь с telegram_id {telegram_id} не найден")
                 return False
             
-            user_id = user_result.data[0]["id"]
-            
             # Сохраняем медитацию
             meditation_data = {
                 "user_id": user_id,
@@ -115,12 +137,20 @@ class MeditationService:
                 "created_at": datetime.now().isoformat()
             }
             
-            response = supabase.table("meditations").insert(meditation_data).execute()
+            response = await execute(supabase.table("meditations").insert(meditation_data))
             return bool(response.data)
             
         except Exception as e:
             logger.error(f"Ошибка при сохранении медитации: {e}")
             return False
 
-# Создание экземпляра сервиса
-meditation_service = MeditationService() 
\ No newline at end of file
+def _create_meditation_service():
+    """
+    Создание сервиса медитаций с регистрацией его метрик
+    """
+    service = MeditationService()
+    metrics_registry.register("meditation_flights", service.flights.get_stats)
+    return service
+
+# Ленивое создание экземпляра сервиса при первом обращении
+meditation_service = service_registry.register("meditation_service", _create_meditation_service) 
\ No newline at end of file
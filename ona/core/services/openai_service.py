@@ -3,10 +3,17 @@
 """
 import logging
 import os
-from typing import List, Dict, Optional
-from openai import AsyncOpenAI
-from datetime import datetime
-#from core.db.supabase_client import supabase
+import time
+from typing import AsyncIterator, List, Dict, Optional
+from ona.config.settings import settings
+from ona.core.db.projections import CONVERSATION_MESSAGE
+from ona.core.services.context_builder import ContextBuilder, PromptContext, to_message
+from ona.core.services.registry import service_registry
+from ona.core.services.conversation_cache import conversation_cache
+from ona.core.services.conversation_writer import conversation_writer
+from ona.core.services.session_context import session_contexts
+from ona.utils.metrics import LatencyStats, metrics_registry
+from core.db.supabase_client import execute, supabase
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +25,27 @@ class OpenAIService:
         """
         Инициализация сервиса OpenAI
         """
+        # Импорт SDK откладывается до создания сервиса: он заметно увеличивает холодный старт
+        from openai import AsyncOpenAI
         self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model = "gpt-4-turbo-preview"  # Используем самую последнюю модель
         self.max_tokens = 2000  # Максимальная длина ответа
         self.temperature = 0.7  # Температура для генерации
         
+        # Промпт собирается в пределах бюджета токенов, ранняя часть диалога - краткое содержание
+        self.context_builder = ContextBuilder(
+            model=self.model,
+            token_budget=settings.CHAT_TOKEN_BUDGET,
+            reply_min_tokens=settings.CHAT_REPLY_MIN_TOKENS,
+            reply_max_tokens=self.max_tokens,
+            summarize=self.summarize_history,
+            summary_min_messages=settings.CHAT_SUMMARY_MIN_MESSAGES
+        )
+        
+        # Метрики: время до первого токена и до окончания ответа
+        self.first_token_latency = LatencyStats()
+        self.completion_latency = LatencyStats()
+        
         # Системный промпт для AI-наставника
         self.system_prompt = """Ты - ONA, AI-наставник для женщин. Твоя задача - помогать женщинам в их личностном росте, 
         саморазвитии и достижении гармонии. Ты используешь комбинацию психологии, астрологии и духовных практик.
@@ -53,35 +76,61 @@ class OpenAIService:
             List[Dict]: Список сообщений в формате для OpenAI
         """
         try:
-            # Получаем историю из базы данных
-            response = supabase.table("conversations") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .order("created_at", desc=True) \
-                .limit(limit) \
-                .execute()
-            
-            if not response.data:
-                return []
+            rows = await self._get_history_rows(user_id, limit)
             
             # Преобразуем сообщения в формат для OpenAI
-            messages = []
-            for msg in reversed(response.data):  # Разворачиваем для хронологического порядка
-                role = "user" if msg["is_user"] else "assistant"
-                messages.append({
-                    "role": role,
-                    "content": msg["message_text"]
-                })
-            
-            return messages
+            return [to_message(msg) for msg in rows]
             
         except Exception as e:
             logger.error(f"Ошибка при получении истории диалога: {e}")
             return []
     
+    async def _get_history_rows(self, user_id: int, limit: int) -> List[Dict]:
+        """
+        Последние строки conversations пользователя в хронологическом порядке
+        
+        Args:
+            user_id: ID пользователя
+            limit: Количество последних сообщений
+            
+        Returns:
+            List[Dict]: Строки conversations (message_text, is_user, created_at)
+        """
+        # Активные пользователи получают историю из памяти, без запросов к базе
+        return await conversation_cache.get(
+            user_id, limit, lambda count: self._load_history(user_id, count)
+        )
+    
+    async def _load_history(self, user_id: int, limit: int) -> List[Dict]:
+        """
+        Загрузка последних сообщений диалога из базы
+        
+        Args:
+            user_id: ID пользователя
+            limit: Количество последних сообщений
+            
+        Returns:
+            List[Dict]: Строки conversations в хронологическом порядке
+        """
+        session = session_contexts.current(user_id)
+        if session is not None:
+            # История уже загружена в контекст обновления (в хронологическом порядке)
+            return await session.get_history(limit)
+        
+        # Получаем историю из базы данных (включая еще не записанные сообщения)
+        await conversation_writer.flush_user(user_id)
+        response = await execute(
+            CONVERSATION_MESSAGE.select(supabase)
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+        )
+        # Разворачиваем для хронологического порядка
+        return list(reversed(response.data or []))
+    
     async def save_message(self, user_id: int, message: str, is_user: bool = True) -> bool:
         """
-        Сохранение сообщения в историю диалога
+        Сохранение сообщения в историю диалога (запись в базу отложенная, пакетами)
         
         Args:
             user_id: ID пользователя
@@ -92,20 +141,74 @@ class OpenAIService:
             bool: True если сообщение успешно сохранено
         """
         try:
-            message_data = {
-                "user_id": user_id,
-                "message_text": message,
-                "is_user": is_user,
-                "created_at": datetime.now().isoformat()
-            }
+            # Строка записывается в базу пакетом вместе с другими сообщениями
+            message_data = conversation_writer.add(user_id, message, is_user)
             
-            response = supabase.table("conversations").insert(message_data).execute()
-            return bool(response.data)
+            session = session_contexts.current(user_id)
+            if session is not None:
+                session.add_message(message, is_user, message_data["created_at"])
+            conversation_cache.append(user_id, message, is_user, message_data["created_at"])
+            return True
             
         except Exception as e:
             logger.error(f"Ошибка при сохранении сообщения: {e}")
             return False
     
+    async def _build_messages(self, user_id: int, user_message: str) -> PromptContext:
+        """
+        Формирование запроса к OpenAI: системный промпт, краткое содержание ранней
+        части диалога, последние сообщения в пределах бюджета токенов и новое сообщение
+        
+        Args:
+            user_id: ID пользователя
+            user_message: Сообщение пользователя
+            
+        Returns:
+            PromptContext: Сообщения запроса и max_tokens
+        """
+        # Получаем историю диалога
+        try:
+            rows = await self._get_history_rows(user_id, settings.CHAT_HISTORY_LIMIT)
+        except Exception as e:
+            logger.error(f"Ошибка при получении истории диалога: {e}")
+            rows = []
+        
+        return self.context_builder.build(user_id, self.system_prompt, rows, user_message)
+    
+    async def summarize_history(self, summary: Optional[str], rows: List[Dict]) -> str:
+        """
+        Добавление сообщений диалога к его краткому содержанию
+        
+        Args:
+            summary: Текущее краткое содержание (None - еще не составлено)
+            rows: Строки conversations, не вошедшие в промпт
+            
+        Returns:
+            str: Новое краткое содержание
+        """
+        dialog = "\n".join(
+            f"{'Пользователь' if row['is_user'] else 'ONA'}: {row['message_text']}" for row in rows
+        )
+        content = f"Текущее краткое содержание:\n{summary}\n\n" if summary else ""
+        content += f"Новые сообщения:\n{dialog}"
+        
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Составь краткое содержание диалога пользователя с AI-наставником ONA: "
+                               "важные факты о пользователе, цели, проблемы и договоренности. "
+                               "Дополни текущее краткое содержание новыми сообщениями. Пиши кратко, "
+                               "в третьем лице, без вступлений."
+                },
+                {"role": "user", "content": content}
+            ],
+            max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+            temperature=0.3
+        )
+        return (response.choices[0].message.content or "").strip()
+    
     async def generate_response(self, user_id: int, user_message: str) -> Optional[str]:
         """
         Генерация ответа на сообщение пользователя
@@ -118,21 +221,17 @@ class OpenAIService:
             Optional[str]: Ответ AI-наставника или None в случае ошибки
         """
         try:
-            # Получаем историю диалога
-            conversation_history = await self.get_conversation_history(user_id)
-            
-            # Формируем список сообщений для OpenAI
-            messages = [{"role": "system", "content": self.system_prompt}]
-            messages.extend(conversation_history)
-            messages.append({"role": "user", "content": user_message})
+            context = await self._build_messages(user_id, user_message)
             
             # Отправляем запрос к OpenAI
+            started_at = time.perf_counter()
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
-                max_tokens=self.max_tokens,
+                messages=context.messages,
+                max_tokens=context.max_tokens,
                 temperature=self.temperature
             )
+            self.completion_latency.observe(time.perf_counter() - started_at)
             
             # Получаем ответ
             ai_response = response.choices[0].message.content
@@ -146,6 +245,67 @@ class OpenAIService:
         except Exception as e:
             logger.error(f"Ошибка при генерации ответа: {e}")
             return None
+    
+    async def stream_response(self, user_id: int, user_message: str) -> AsyncIterator[str]:
+        """
+        Генерация ответа с получением текста по мере генерации (stream=True).
+        Сообщения сохраняются в историю после получения полного ответа
+        
+        Args:
+            user_id: ID пользователя
+            user_message: Сообщение пользователя
+            
+        Yields:
+            str: Очередной фрагмент ответа
+        """
+        context = await self._build_messages(user_id, user_message)
+        
+        started_at = time.perf_counter()
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=context.messages,
+            max_tokens=context.max_tokens,
+            temperature=self.temperature,
+            stream=True
+        )
+        
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not parts:
+                self.first_token_latency.observe(time.perf_counter() - started_at)
+            parts.append(delta)
+            yield delta
+        self.completion_latency.observe(time.perf_counter() - started_at)
+        
+        # Сохраняем сообщения в историю
+        await self.save_message(user_id, user_message, is_user=True)
+        await self.save_message(user_id, "".join(parts), is_user=False)
+    
+    def get_stats(self) -> Dict:
+        """
+        Текущие метрики запросов к OpenAI
+        
+        Returns:
+            Dict: Время до первого токена и до окончания ответа
+        """
+        return {
+            "first_token_latency": self.first_token_latency.snapshot(),
+            "completion_latency": self.completion_latency.snapshot(),
+        }
+
+def _create_openai_service():
+    """
+    Создание сервиса OpenAI с регистрацией его метрик
+    """
+    service = OpenAIService()
+    metrics_registry.register("openai", service.get_stats)
+    metrics_registry.register("chat_context", service.context_builder.get_stats)
+    return service
 
-# Создание экземпляра сервиса
-openai_service = OpenAIService() 
+# Ленивое создание экземпляра сервиса при первом обращении
+openai_service = service_registry.register("openai_service", _create_openai_service) 
@@ -6,6 +6,7 @@ import logging
 import aiohttp
 from datetime import datetime, timedelta
 from config.settings import settings
+from ona.core.services.registry import service_registry
 
 logger = logging.getLogger(__name__)
 
@@ -117,5 +118,5 @@ class PaymentService:
             logger.error(f"Ошибка при проверке платежа: {e}")
             return False
 
-# Создание экземпляра сервиса
-payment_service = PaymentService() 
\ No newline at end of file
+# Ленивое создание экземпляра сервиса при первом обращении
+payment_service = service_registry.register("payment_service", PaymentService) 
\ No newline at end of file
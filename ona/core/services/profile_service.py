@@ -1,5 +1,10 @@
 import logging
-from datetime import datetime
+from ona.config.settings import settings
+from ona.core.db.projections import PROFILE, PROFILE_NATAL
+from ona.core.services.profile_writer import ProfileWriter
+from ona.core.services.registry import service_registry
+from ona.core.services.session_context import session_contexts
+from ona.utils.metrics import metrics_registry
 
 logger = logging.getLogger(__name__)
 
@@ -7,27 +12,39 @@ class ProfileService:
     """
     Сервис для работы с профилями пользователей
     """
-    def __init__(self, db_client=None):
+    def __init__(self, db_client=None, write_window=None):
         """
         Инициализация сервиса профилей
         
         Args:
             db_client: Клиент для работы с базой данных
+            write_window: Окно объединения записей профиля в секундах
+                (по умолчанию - PROFILE_WRITE_WINDOW)
         """
         self.db_client = db_client
+        if write_window is None:
+            write_window = settings.PROFILE_WRITE_WINDOW
+        # Записи полей объединяются в один upsert без предварительного чтения профиля
+        self.writer = ProfileWriter(db_client, window=write_window)
     
-    async def get_profile(self, user_id):
+    async def get_profile(self, user_id, projection=PROFILE):
         """
         Получение профиля пользователя
         
         Args:
             user_id: ID пользователя
+            projection: Нужные столбцы профиля (при чтении из базы выбираются только они)
             
         Returns:
             Профиль пользователя или None, если профиль не найден
         """
+        # Во время обработки обновления профиль берется из контекста, загруженного один раз
+        session = session_contexts.current(user_id)
+        if session is not None:
+            return await session.get_profile()
+        
         if self.db_client:
-            return await self.db_client.get_profile(user_id)
+            return await self.db_client.get_profile(user_id, projection)
         else:
             logger.warning(f"DB клиент не инициализирован. Невозможно получить профиль для {user_id}")
             return None
@@ -41,33 +58,26 @@ class ProfileService:
             natal_data: Натальные данные (дата, время и место рождения, возраст)
             
         Returns:
-            Результат операции
+            Результат операции (True, если запись отложена до завершения обновления;
+            ошибка отложенной записи прерывает завершение обновления)
         """
         if not self.db_client:
             logger.warning(f"DB клиент не инициализирован. Невозможно сохранить данные для {user_id}")
             return False
         
         try:
-            # Получаем текущий профиль, если он существует
-            profile = await self.get_profile(user_id)
-            
-            # Подготавливаем данные для сохранения
             natal_profile_data = {
-                "user_id": user_id,
                 "birth_date": natal_data.get("birth_date"),
                 "birth_time": natal_data.get("birth_time"),
                 "birth_place": natal_data.get("birth_place"),
-                "age": natal_data.get("age"),
-                "updated_at": datetime.now().isoformat()
+                "age": natal_data.get("age")
             }
             
-            if profile:
-                # Если профиль существует, обновляем его
-                return await self.db_client.update_profile(user_id, natal_profile_data)
-            else:
-                # Если профиль не существует, создаем новый
-                natal_profile_data["created_at"] = datetime.now().isoformat()
-                return await self.db_client.create_profile(natal_profile_data)
+            # Профиль создается или обновляется одним upsert
+            result = await self.writer.write(user_id, natal_profile_data)
+            
+            self._apply_to_session(user_id, natal_profile_data)
+            return result
         
         except Exception as e:
             logger.error(f"Ошибка при сохранении натальных данных для {user_id}: {e}")
@@ -83,37 +93,36 @@ class ProfileService:
             field_value: Новое значение поля
             
         Returns:
-            Результат операции
+            Результат операции (True, если запись отложена до завершения обновления;
+            ошибка отложенной записи прерывает завершение обновления)
         """
         if not self.db_client:
             logger.warning(f"DB клиент не инициализирован. Невозможно обновить поле {field_name} для {user_id}")
             return False
         
         try:
-            # Получаем текущий профиль
-            profile = await self.get_profile(user_id)
+            # Поле записывается вместе с другими полями, обновленными в том же обновлении
+            result = await self.writer.write(user_id, {field_name: field_value})
             
-            if not profile:
-                # Если профиль не существует, создаем новый с указанным полем
-                new_profile_data = {
-                    "user_id": user_id,
-                    field_name: field_value,
-                    "created_at": datetime.now().isoformat(),
-                    "updated_at": datetime.now().isoformat()
-                }
-                return await self.db_client.create_profile(new_profile_data)
-            else:
-                # Если профиль существует, обновляем указанное поле
-                update_data = {
-                    field_name: field_value,
-                    "updated_at": datetime.now().isoformat()
-                }
-                return await self.db_client.update_profile(user_id, update_data)
+            self._apply_to_session(user_id, {field_name: field_value})
+            return result
         
         except Exception as e:
             logger.error(f"Ошибка при обновлении поля {field_name} для {user_id}: {e}")
             return False
     
+    def _apply_to_session(self, user_id, fields):
+        """
+        Обновление профиля в контексте текущего обновления при записи
+        
+        Args:
+            user_id: ID пользователя
+            fields: Записанные поля профиля
+        """
+        session = session_contexts.current(user_id)
+        if session is not None:
+            session.update_profile(fields)
+    
     async def get_natal_data(self, user_id):
         """
         Получение натальных данных пользователя
@@ -124,7 +133,7 @@ class ProfileService:
         Returns:
             Натальные данные пользователя или None, если данные не найдены
         """
-        profile = await self.get_profile(user_id)
+        profile = await self.get_profile(user_id, PROFILE_NATAL)
         
         if not profile:
             return None
@@ -160,5 +169,15 @@ class ProfileService:
         return True
 
 
-# Создание экземпляра сервиса профилей
-profile_service = ProfileService() 
\ No newline at end of file
+def _create_profile_service():
+    """
+    Создание сервиса профилей с клиентом Supabase
+    """
+    from ona.core.db import supabase_client
+    service = ProfileService(db_client=supabase_client)
+    metrics_registry.register("profile_writer", service.writer.get_stats)
+    return service
+
+
+# Ленивое создание экземпляра сервиса профилей при первом обращении
+profile_service = service_registry.register("profile_service", _create_profile_service) 
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Объединение записей полей профиля в один upsert по profiles.user_id
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict
+
+from ona.core.services.session_context import session_contexts
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileWriter:
+    """
+    Запись полей профиля без предварительного чтения и с объединением.
+
+    Поля, записанные во время обработки обновления, накапливаются и
+    записываются одним upsert при завершении обновления (SessionContext);
+    ошибка такой записи учитывается в метриках и прерывает завершение
+    обновления, а не только логируется.
+    Вне обработки обновления записи одного профиля, пришедшие в течение
+    window секунд, объединяются в один upsert, результат которого
+    получают все вызывающие.
+    """
+    def __init__(self, db_client, window: float = 0.02):
+        """
+        Инициализация записи
+
+        Args:
+            db_client: Клиент базы с методом upsert_profile(profile_data)
+            window: Окно объединения записей вне обработки обновления в секундах
+        """
+        self.db_client = db_client
+        self.window = window
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._flushes: Dict[Any, asyncio.Future] = {}
+
+        # Метрики
+        self.writes = 0
+        self.deferred = 0
+        self.upserts = 0
+        self.errors = 0
+        self.deferred_errors = 0
+
+    async def write(self, user_id, fields: Dict[str, Any]):
+        """
+        Запись полей профиля
+
+        Args:
+            user_id: ID пользователя (profiles.user_id)
+            fields: Поля профиля
+
+        Returns:
+            Записанный профиль, True для записи, отложенной до конца обновления,
+            или None в случае ошибки
+        """
+        self.writes += 1
+        self._pending.setdefault(user_id, {}).update(fields)
+
+        session = session_contexts.current(user_id)
+        if session is not None:
+            self.deferred += 1
+            session.on_close((id(self), user_id), lambda: self.flush_deferred(user_id))
+            return True
+
+        future = self._flushes.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._flushes[user_id] = future
+        result = None
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            # Следующие записи начнут новое окно
+            self._flushes.pop(user_id, None)
+            try:
+                result = await self.flush(user_id)
+            finally:
+                future.set_result(result)
+        return result
+
+    async def flush(self, user_id):
+        """
+        Запись накопленных полей профиля одним upsert
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Записанный профиль или None
+        """
+        fields = self._pending.pop(user_id, None)
+        if not fields:
+            return None
+
+        try:
+            return await self._upsert(user_id, fields)
+        except Exception as e:
+            logger.error(f"Ошибка при записи профиля {user_id}: {e}")
+            return None
+
+    async def flush_deferred(self, user_id):
+        """
+        Запись полей, отложенных до завершения обновления.
+
+        Вызывающие уже получили True, поэтому ошибка не заменяется на None,
+        а передается в SessionContext.close и дальше обработчику обновления
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Записанный профиль или None, если записывать нечего
+        """
+        fields = self._pending.pop(user_id, None)
+        if not fields:
+            return None
+
+        try:
+            return await self._upsert(user_id, fields)
+        except Exception:
+            self.deferred_errors += 1
+            raise
+
+    async def _upsert(self, user_id, fields: Dict[str, Any]):
+        """
+        Выполнение upsert накопленных полей (ошибка базы учитывается и передается дальше)
+        """
+        profile_data = {"user_id": user_id, **fields, "updated_at": datetime.now().isoformat()}
+        self.upserts += 1
+        try:
+            return await self.db_client.upsert_profile(profile_data)
+        except Exception:
+            self.errors += 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики записи профилей
+
+        Returns:
+            Dict[str, Any]: Количество записей полей и выполненных upsert
+        """
+        return {
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "deferred": self.deferred,
+            "upserts": self.upserts,
+            "coalesced": self.writes - self.upserts - len(self._pending),
+            "errors": self.errors,
+            "deferred_errors": self.deferred_errors,
+        }
@@ -2,11 +2,17 @@
 Сервис для работы с персонализированными рекомендациями
 """
 import logging
-from typing import Optional, Dict, List
-from datetime import datetime
+from typing import Any, Optional, Dict, List
+from datetime import date, datetime
 from core.services.openai_service import openai_service
 from core.services.profile_service import profile_service
-from core.db.supabase_client import supabase
+from core.db.supabase_client import execute, supabase
+from ona.core.db.projections import PROFILE_PSYCHOLOGY
+from ona.core.services.registry import service_registry
+from ona.core.services.response_cache import make_key, response_cache
+from ona.core.services.user_identity import user_identity
+from ona.utils.metrics import metrics_registry
+from ona.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -14,47 +20,60 @@ class RecommendationService:
     """
     Сервис для работы с персонализированными рекомендациями
     """
-    def __init__(self):
+    # Версии шаблонов промптов: увеличиваются при изменении текста промпта,
+    # чтобы кэш не возвращал ответы на прежний промпт
+    DAILY_PROMPT_VERSION = 1
+    PRACTICE_PROMPT_VERSION = 1
+    
+    # Поля профиля, из которых строится промпт (и ключ кэша ответов)
+    PROMPT_PROFILE_FIELDS = ("age", "psychology_profile", "psychology_answers")
+    
+    def __init__(self, cache=None):
         """
         Инициализация сервиса рекомендаций
+        
+        Args:
+            cache: Кэш ответов модели (по умолчанию - общий кэш приложения)
         """
         self.openai_service = openai_service
         self.profile_service = profile_service
+        self.cache = cache if cache is not None else response_cache
+        # Одновременные одинаковые запросы (например, двойное нажатие кнопки)
+        # выполняют один запрос к OpenAI
+        self.flights = SingleFlight()
     
-    async def _check_profile_exists(self, telegram_id: int) -> bool:
+    async def _get_prompt_profile(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """
-        Проверка существования профиля пользователя
+        Получение полей профиля для промпта
         
         Args:
             telegram_id: Telegram ID пользователя
             
         Returns:
-            bool: True если профиль существует
+            Optional[Dict[str, Any]]: Поля профиля или None, если профиль не найден
         """
-        try:
-            profile = await self.profile_service.get_user_profile(telegram_id)
-            return bool(profile)
-        except Exception as e:
-            logger.error(f"Ошибка при проверке профиля: {e}")
-            return False
+        profile = await self.profile_service.get_profile(telegram_id, PROFILE_PSYCHOLOGY)
+        if not profile:
+            return None
+        return {field: profile.get(field) for field in self.PROMPT_PROFILE_FIELDS}
     
-    async def generate_daily_recommendation(self, telegram_id: int) -> Optional[str]:
+    async def generate_daily_recommendation(self, telegram_id: int, refresh: bool = False) -> Optional[str]:
         """
-        Генерирует ежедневную персонализированную рекомендацию
+        Генерирует ежедневную персонализированную рекомендацию (повторный запрос
+        в тот же день с тем же профилем получает ответ из кэша)
         
         Args:
             telegram_id: Telegram ID пользователя
+            refresh: Сгенерировать рекомендацию заново, не используя кэш
             
         Returns:
             Optional[str]: Текст рекомендации или None в случае ошибки
         """
         try:
-            # Проверяем наличие профиля
-            if not await self._check_profile_exists(telegram_id):
-                return "Для получения рекомендаций необходимо сначала пройти профайлинг."
-            
             # Получаем профиль пользователя
-            profile = await self.profile_service.get_user_profile(telegram_id)
+            profile = await self._get_prompt_profile(telegram_id)
+            if profile is None:
+                return "Для получения рекомендаций необходимо сначала пройти профайлинг."
             
             # Формируем системный промпт
             system_prompt = """
@@ -79,46 +98,67 @@ class RecommendationService:
             Дай точный совет, который можно применить сегодня.
             """
             
-            # Генерируем рекомендацию через OpenAI
-            response = await self.openai_service.client.chat.completions.create(
+            async def create():
+                # Генерируем рекомендацию через OpenAI
+                response = await self.openai_service.client.chat.completions.create(
+                    model=self.openai_service.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=500,
+                    temperature=0.7
+                )
+                
+                recommendation = response.choices[0].message.content
+                
+                # Сохраняем рекомендацию в базу данных
+                await self.save_recommendation(telegram_id, recommendation)
+                
+                return recommendation
+            
+            # Рекомендация зависит от модели, шаблона промпта, профиля и дня; ключ
+            # включает пользователя: ответ сохраняется в его историю рекомендаций
+            key = make_key(
+                kind="daily",
+                telegram_id=telegram_id,
                 model=self.openai_service.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
+                version=self.DAILY_PROMPT_VERSION,
+                profile=profile,
+                day=date.today().isoformat()
+            )
+            return await self.flights.do(
+                ("refresh", key) if refresh else key,
+                lambda: self.cache.get_or_create(key, create, refresh=refresh)
             )
-            
-            recommendation = response.choices[0].message.content
-            
-            # Сохраняем рекомендацию в базу данных
-            await self.save_recommendation(telegram_id, recommendation)
-            
-            return recommendation
             
         except Exception as e:
             logger.error(f"Ошибка при генерации ежедневной рекомендации: {e}")
             return None
     
-    async def generate_practice(self, telegram_id: int, practice_type: str = "mindfulness") -> Optional[str]:
+    async def generate_practice(
+        self,
+        telegram_id: int,
+        practice_type: str = "mindfulness",
+        refresh: bool = False
+    ) -> Optional[str]:
         """
-        Генерирует персонализированную практику определенного типа
+        Генерирует персонализированную практику определенного типа (повторный
+        запрос с тем же профилем в течение RESPONSE_CACHE_TTL получает ответ из кэша)
         
         Args:
             telegram_id: Telegram ID пользователя
             practice_type: Тип практики (mindfulness/stress/sleep/energy)
+            refresh: Сгенерировать практику заново, не используя кэш
             
         Returns:
             Optional[str]: Текст практики или None в случае ошибки
         """
         try:
-            # Проверяем наличие профиля
-            if not await self._check_profile_exists(telegram_id):
-                return "Для получения практик необходимо сначала пройти профайлинг."
-            
             # Получаем профиль пользователя
-            profile = await self.profile_service.get_user_profile(telegram_id)
+            profile = await self._get_prompt_profile(telegram_id)
+            if profile is None:
+                return "Для получения практик необходимо сначала пройти профайлинг."
             
             # Маппинг типов практик к промптам
             practice_prompts = {
@@ -153,23 +193,38 @@ class RecommendationService:
             Опиши практику пошагово, используя простой язык.
             """
             
-            # Генерируем практику через OpenAI
-            response = await self.openai_service.client.chat.completions.create(
+            async def create():
+                # Генерируем практику через OpenAI
+                response = await self.openai_service.client.chat.completions.create(
+                    model=self.openai_service.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=1000,
+                    temperature=0.7
+                )
+                
+                practice = response.choices[0].message.content
+                
+                # Сохраняем практику в базу данных
+                await self.save_practice(telegram_id, practice_type, practice)
+                
+                return practice
+            
+            # Ключ включает пользователя: ответ сохраняется в его историю практик
+            key = make_key(
+                kind="practice",
+                telegram_id=telegram_id,
                 model=self.openai_service.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
+                version=self.PRACTICE_PROMPT_VERSION,
+                profile=profile,
+                practice_type=practice_type
+            )
+            return await self.flights.do(
+                ("refresh", key) if refresh else key,
+                lambda: self.cache.get_or_create(key, create, refresh=refresh)
             )
-            
-            practice = response.choices[0].message.content
-            
-            # Сохраняем практику в базу данных
-            await self.save_practice(telegram_id, practice_type, practice)
-            
-            return practice
             
         except Exception as e:
             logger.error(f"Ошибка при генерации практики: {e}")
@@ -188,14 +243,12 @@ class RecommendationService:
         """
         try:
             # Получаем ID пользователя
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data:
+            if user_id is None:
                 logger.error(f"Пользователь с telegram_id {telegram_id} не найден")
                 return False
             
-            user_id = user_result.data[0]["id"]
-            
             # Сохраняем рекомендацию
             recommendation_data = {
                 "user_id": user_id,
@@ -204,7 +257,7 @@ class RecommendationService:
                 "created_at": datetime.now().isoformat()
             }
             
-            response = supabase.table("recommendations").insert(recommendation_data).execute()
+            response = await execute(supabase.table("recommendations").insert(recommendation_data))
             return bool(response.data)
             
         except Exception as e:
@@ -225,14 +278,12 @@ class RecommendationService:
         """
         try:
             # Получаем ID пользователя
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data:
+            if user_id is None:
                 logger.error(f"Пользователь с telegram_id {telegram_id} не найден")
                 return False
             
-            user_id = user_result.data[0]["id"]
-            
             # Сохраняем практику
             practice_data = {
                 "user_id": user_id,
@@ -241,12 +292,20 @@ class RecommendationService:
                 "created_at": datetime.now().isoformat()
             }
             
-            response = supabase.table("practices").insert(practice_data).execute()
+            response = await execute(supabase.table("practices").insert(practice_data))
             return bool(response.data)
             
         except Exception as e:
             logger.error(f"Ошибка при сохранении практики: {e}")
             return False
 
-# Создание экземпляра сервиса
-recommendation_service = RecommendationService() 
\ No newline at end of file
+def _create_recommendation_service():
+    """
+    Создание сервиса рекомендаций с регистрацией его метрик
+    """
+    service = RecommendationService()
+    metrics_registry.register("recommendation_flights", service.flights.get_stats)
+    return service
+
+# Ленивое создание экземпляра сервиса при первом обращении
+recommendation_service = service_registry.register("recommendation_service", _create_recommendation_service) 
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Хранилище незавершенных регистраций (натальные данные до сохранения в профиль)
+"""
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationSession:
+    """
+    Ответы пользователя в процессе регистрации.
+
+    Фиксированный набор полей в __slots__ занимает в несколько раз меньше
+    памяти, чем словарь на каждого пользователя.
+    """
+    FIELDS = ("birth_date", "birth_time", "birth_place", "age")
+    __slots__ = FIELDS + ("expires_at",)
+
+    def __init__(self, expires_at: float = 0.0, **fields):
+        self.birth_date: Optional[str] = None
+        self.birth_time: Optional[str] = None
+        self.birth_place: Optional[str] = None
+        self.age: Optional[int] = None
+        self.expires_at = expires_at
+        for field, value in fields.items():
+            if field in self.FIELDS:
+                setattr(self, field, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Натальные данные в виде словаря (формат ProfileService.save_natal_data)
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class SupabaseRegistrationSessionBackend:
+    """
+    Хранилище незавершенных регистраций в таблице registration_sessions,
+    чтобы они переживали перезапуск процесса. Сессии, не обновлявшиеся
+    дольше TTL, считаются брошенными и удаляются при загрузке.
+    """
+    def __init__(self, db_client=None, table: str = "registration_sessions", ttl: float = 86400.0):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            table: Имя таблицы сессий
+            ttl: Время жизни неактивной сессии в секундах
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.table = table
+        self.ttl = ttl
+
+    async def load(self, user_id) -> Optional[Dict[str, Any]]:
+        """
+        Загрузка сохраненных ответов пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            Optional[Dict[str, Any]]: Ответы или None, если сессии нет или она истекла
+        """
+        response = await execute(
+            self.db_client.table(self.table).select("data,updated_at").eq("telegram_id", user_id).limit(1)
+        )
+        if not response.data:
+            return None
+
+        row = response.data[0]
+        updated_at = datetime.fromisoformat(str(row["updated_at"])).replace(tzinfo=None)
+        if updated_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+            # Брошенная регистрация: начинается заново
+            await self.delete(user_id)
+            return None
+        return row["data"]
+
+    async def save(self, user_id, data: Dict[str, Any]):
+        """
+        Сохранение ответов пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+            data: Ответы пользователя
+        """
+        await execute(self.db_client.table(self.table).upsert({
+            "telegram_id": user_id,
+            "data": data,
+            "updated_at": datetime.utcnow().isoformat()
+        }, on_conflict="telegram_id"))
+
+    async def delete(self, user_id):
+        """
+        Удаление сессии после завершения регистрации
+
+        Args:
+            user_id: Telegram ID пользователя
+        """
+        await execute(self.db_client.table(self.table).delete().eq("telegram_id", user_id))
+
+
+class RegistrationSessionStore:
+    """
+    Сессии регистрации по user_id с TTL и жестким ограничением количества.
+
+    Брошенные регистрации удаляются по истечении TTL, а при превышении
+    max_sessions вытесняются самые давно обновленные сессии.
+    """
+    def __init__(self, max_sessions: int = 100000, ttl: float = 86400.0, backend=None):
+        """
+        Инициализация хранилища
+
+        Args:
+            max_sessions: Максимальное количество сессий в памяти
+            ttl: Время жизни неактивной сессии в секундах
+            backend: Постоянное хранилище с методами load/save/delete (необязательно)
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.backend = backend
+        # Порядок - по времени последнего обновления, самые старые в начале
+        self._sessions: "OrderedDict[Any, RegistrationSession]" = OrderedDict()
+
+        # Метрики
+        self.created = 0
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.restored = 0
+        self.backend_errors = 0
+
+    def _expire(self, now: float):
+        """
+        Удаление сессий с истекшим TTL (они всегда в начале словаря)
+        """
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.expires_at > now:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def _touch(self, user_id, session: RegistrationSession, now: float):
+        """
+        Продление сессии и перенос ее в конец очереди вытеснения
+        """
+        session.expires_at = now + self.ttl
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    async def get(self, user_id) -> RegistrationSession:
+        """
+        Получение сессии пользователя (создается или восстанавливается из хранилища)
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            RegistrationSession: Сессия регистрации
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        session = self._sessions.get(user_id)
+        if session is not None:
+            return session
+
+        data = None
+        if self.backend is not None:
+            try:
+                data = await self.backend.load(user_id)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Ошибка при загрузке сессии регистрации пользователя {user_id}: {e}")
+
+        session = RegistrationSession(**(data or {}))
+        if data:
+            self.restored += 1
+        else:
+            self.created += 1
+        self._touch(user_id, session, now)
+        return session
+
+    async def update(self, user_id, **fields) -> RegistrationSession:
+        """
+        Сохранение ответов пользователя в сессию
+
+        Args:
+            user_id: Telegram ID пользователя
+            **fields: Поля сессии (birth_date, birth_time, birth_place, age)
+
+        Returns:
+            RegistrationSession: Обновленная сессия
+        """
+        session = await self.get(user_id)
+        for field, value in fields.items():
+            if field not in RegistrationSession.FIELDS:
+                raise ValueError(f"Неизвестное поле сессии регистрации: {field}")
+            setattr(session, field, value)
+        self._touch(user_id, session, time.monotonic())
+
+        if self.backend is not None:
+            try:
+                await self.backend.save(user_id, session.to_dict())
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Ошибка при сохранении сессии регистрации пользователя {user_id}: {e}")
+        return session
+
+    async def discard(self, user_id):
+        """
+        Удаление сессии после завершения регистрации
+
+        Args:
+            user_id: Telegram ID пользователя
+        """
+        if self._sessions.pop(user_id, None) is not None:
+            self.completed += 1
+
+        if self.backend is not None:
+            try:
+                await self.backend.delete(user_id)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Ошибка при удалении сессии регистрации пользователя {user_id}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики хранилища
+
+        Returns:
+            Dict[str, Any]: Количество сессий и счетчики жизненного цикла
+        """
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "created": self.created,
+            "restored": self.restored,
+            "completed": self.completed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "backend_errors": self.backend_errors,
+        }
+
+
+def _create_backend():
+    """
+    Создание постоянного хранилища согласно настройкам
+    """
+    if settings.REGISTRATION_SESSION_BACKEND == "supabase":
+        return SupabaseRegistrationSessionBackend(ttl=settings.REGISTRATION_SESSION_TTL)
+    return None
+
+
+# Создание экземпляра хранилища сессий регистрации
+registration_sessions = RegistrationSessionStore(
+    max_sessions=settings.REGISTRATION_SESSION_MAX,
+    ttl=settings.REGISTRATION_SESSION_TTL,
+    backend=_create_backend()
+)
+metrics_registry.register("registration_sessions", registration_sessions.get_stats)
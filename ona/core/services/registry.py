@@ -0,0 +1,155 @@
+"""
+Реестр сервисов с ленивым созданием экземпляров
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class LazyService:
+    """
+    Заместитель сервиса: экземпляр создается при первом обращении к атрибуту.
+
+    Позволяет оставить привычный импорт модульных экземпляров
+    (from core.services.openai_service import openai_service), не создавая
+    клиентов внешних API при импорте модуля.
+    """
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: "ServiceRegistry", name: str):
+        """
+        Инициализация заместителя
+
+        Args:
+            registry: Реестр, создающий экземпляр
+            name: Имя сервиса в реестре
+        """
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    @property
+    def __class__(self):
+        # isinstance(proxy, Класс) проверяет класс экземпляра (экземпляр создается)
+        return type(self._registry.get(self._name))
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._registry.get(self._name), item)
+
+    def __setattr__(self, key: str, value: Any):
+        setattr(self._registry.get(self._name), key, value)
+
+    def __repr__(self) -> str:
+        state = "создан" if self._registry.is_initialized(self._name) else "не создан"
+        return f"<LazyService {self._name} ({state})>"
+
+
+class ServiceRegistry:
+    """
+    Реестр фабрик сервисов: каждый сервис создается один раз при первом использовании
+    """
+    def __init__(self):
+        """
+        Инициализация реестра
+        """
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._proxies: Dict[str, LazyService] = {}
+        # Время создания каждого сервиса в секундах
+        self.init_times: Dict[str, float] = {}
+        # RLock: фабрика сервиса может обращаться к другим сервисам реестра
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> LazyService:
+        """
+        Регистрация фабрики сервиса
+
+        Args:
+            name: Имя сервиса
+            factory: Функция без аргументов, создающая экземпляр
+
+        Returns:
+            LazyService: Заместитель, создающий сервис при первом обращении
+        """
+        with self._lock:
+            if name not in self._proxies:
+                self._proxies[name] = LazyService(self, name)
+            # Повторная регистрация (например, при импорте модуля под другим именем)
+            # заменяет фабрику, но не пересоздает уже созданный экземпляр
+            self._factories[name] = factory
+            return self._proxies[name]
+
+    def get(self, name: str) -> Any:
+        """
+        Получение экземпляра сервиса с созданием при первом обращении
+
+        Args:
+            name: Имя сервиса
+
+        Returns:
+            Any: Экземпляр сервиса
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            factory = self._factories.get(name)
+            if factory is None:
+                raise KeyError(f"Сервис {name} не зарегистрирован")
+
+            started_at = time.perf_counter()
+            instance = factory()
+            self.init_times[name] = time.perf_counter() - started_at
+            self._instances[name] = instance
+            logger.info(f"Сервис {name} создан за {self.init_times[name] * 1000:.1f} мс")
+            return instance
+
+    def is_initialized(self, name: str) -> bool:
+        """
+        Создан ли уже экземпляр сервиса
+        """
+        return name in self._instances
+
+    def reset(self, name: Optional[str] = None):
+        """
+        Сброс созданных экземпляров (например, в тестах)
+
+        Args:
+            name: Имя сервиса (по умолчанию - все сервисы)
+        """
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self.init_times.clear()
+            else:
+                self._instances.pop(name, None)
+                self.init_times.pop(name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущее состояние реестра
+
+        Returns:
+            Dict[str, Any]: Зарегистрированные и созданные сервисы со временем создания
+        """
+        return {
+            "registered": sorted(self._factories),
+            "initialized": {
+                name: round(seconds * 1000, 2)
+                for name, seconds in self.init_times.items()
+            },
+        }
+
+
+# Создание экземпляра реестра сервисов
+service_registry = ServiceRegistry()
+metrics_registry.register("services", service_registry.get_stats)
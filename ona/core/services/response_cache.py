@@ -0,0 +1,250 @@
+"""
+Кэш ответов модели для детерминированных промптов (рекомендации и практики)
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(**parts) -> str:
+    """
+    Ключ кэша: SHA-256 от всех частей, определяющих промпт
+
+    Args:
+        **parts: Модель, версия шаблона промпта, профиль, тип запроса и т.п.
+
+    Returns:
+        str: Шестнадцатеричный хэш
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SupabaseResponseCacheBackend:
+    """
+    Постоянное хранилище ответов в таблице response_cache, общее для всех
+    воркеров и переживающее перезапуск процесса
+    """
+    # Как часто (в количестве записей) удалять истекшие ответы
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, db_client=None, table: str = "response_cache"):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            table: Имя таблицы кэша
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.table = table
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """
+        Получение неистекшего ответа
+
+        Args:
+            key: Ключ кэша
+
+        Returns:
+            Optional[Tuple[str, float]]: Ответ и оставшееся время жизни в секундах или None
+        """
+        now = datetime.utcnow()
+        response = await execute(
+            self.db_client.table(self.table)
+            .select("value,expires_at")
+            .eq("key", key)
+            .gt("expires_at", now.isoformat())
+            .limit(1)
+        )
+        if not response.data:
+            return None
+        row = response.data[0]
+        expires_at = datetime.fromisoformat(str(row["expires_at"])).replace(tzinfo=None)
+        return row["value"], (expires_at - now).total_seconds()
+
+    async def set(self, key: str, value: str, ttl: float):
+        """
+        Сохранение ответа
+
+        Args:
+            key: Ключ кэша
+            value: Ответ
+            ttl: Время жизни в секундах
+        """
+        now = datetime.utcnow()
+        await execute(self.db_client.table(self.table).upsert({
+            "key": key,
+            "value": value,
+            "expires_at": (now + timedelta(seconds=ttl)).isoformat(),
+            "created_at": now.isoformat()
+        }, on_conflict="key"))
+
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            await execute(self.db_client.table(self.table).delete().lt("expires_at", now.isoformat()))
+
+
+class ResponseCache:
+    """
+    Кэш ответов модели по ключу промпта.
+
+    Ответы хранятся в памяти процесса (LRU, не более max_size) с TTL; при
+    наличии постоянного хранилища промах в памяти проверяется в нем, а новые
+    ответы сохраняются в оба уровня. Недоступность хранилища не мешает
+    генерации ответа.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 86400.0, backend=None):
+        """
+        Инициализация кэша
+
+        Args:
+            max_size: Максимальное количество ответов в памяти
+            ttl: Время жизни ответа в секундах по умолчанию
+            backend: Постоянное хранилище с методами get/set (необязательно)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        # Ключ -> (ответ, момент истечения по time.monotonic)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        # Метрики
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.expired = 0
+        self.backend_errors = 0
+
+    def _remember(self, key: str, value: str, ttl: float):
+        """
+        Сохранение ответа в памяти с вытеснением самых давно использованных
+        """
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        """
+        Поиск ответа в памяти, затем в постоянном хранилище
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expired += 1
+
+        if self.backend is not None:
+            try:
+                stored = await self.backend.get(key)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Ошибка при чтении кэша ответов: {e}")
+                stored = None
+            if stored is not None:
+                value, ttl = stored
+                self._remember(key, value, ttl)
+                self.backend_hits += 1
+                return value
+        return None
+
+    async def get_or_create(
+        self,
+        key: str,
+        create: Callable[[], Awaitable[Optional[str]]],
+        ttl: Optional[float] = None,
+        refresh: bool = False
+    ) -> Optional[str]:
+        """
+        Ответ из кэша или новый ответ, сохраняемый в кэш
+
+        Args:
+            key: Ключ кэша (make_key)
+            create: Генерация ответа при промахе (None - ответ не кэшируется)
+            ttl: Время жизни ответа в секундах (по умолчанию - ttl кэша)
+            refresh: Сгенерировать ответ заново, даже если он есть в кэше
+
+        Returns:
+            Optional[str]: Ответ
+        """
+        if refresh:
+            self.refreshes += 1
+        else:
+            value = await self._lookup(key)
+            if value is not None:
+                return value
+            self.misses += 1
+
+        value = await create()
+        if value is None:
+            return None
+
+        ttl = self.ttl if ttl is None else ttl
+        self._remember(key, value, ttl)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key, value, ttl)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Ошибка при записи в кэш ответов: {e}")
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики кэша
+
+        Returns:
+            Dict[str, Any]: Размер кэша, попадания (в памяти и в хранилище) и промахи
+        """
+        lookups = self.hits + self.backend_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "expired": self.expired,
+            "backend_errors": self.backend_errors,
+            "hit_rate": round((self.hits + self.backend_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _create_backend():
+    """
+    Создание постоянного хранилища согласно настройкам
+    """
+    if settings.RESPONSE_CACHE_BACKEND == "supabase":
+        return SupabaseResponseCacheBackend()
+    return None
+
+
+# Создание экземпляра кэша ответов модели
+response_cache = ResponseCache(
+    max_size=settings.RESPONSE_CACHE_MAX_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    backend=_create_backend()
+)
+metrics_registry.register("response_cache", response_cache.get_stats)
@@ -0,0 +1,343 @@
+"""
+Планировщик исходящих запросов к Telegram Bot API с ограничением частоты
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from ona.config.settings import settings
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# rate_limit_args для sendMessage, чей результат используется дальше (например,
+# сообщение потом редактируется): такой текст не объединяется с другими
+NO_MERGE = {"merge": False}
+
+
+class TokenBucket:
+    """
+    Корзина токенов: не более rate запросов в секунду с допустимым всплеском capacity.
+
+    Токены резервируются в долг, поэтому ожидающие запросы получают слоты
+    строго в порядке обращения.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Инициализация корзины
+
+        Args:
+            rate: Скорость пополнения в токенах в секунду
+            capacity: Максимальное количество накопленных токенов
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """
+        Резервирование одного токена
+
+        Returns:
+            float: Через сколько секунд можно выполнить запрос
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def is_idle(self, now: Optional[float] = None) -> bool:
+        """
+        Полна ли корзина (ее можно удалить без потери информации)
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _PendingText:
+    """
+    Ожидающий отправки sendMessage, к которому можно дописать следующие тексты в тот же чат
+    """
+    __slots__ = ("data", "future", "merged")
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.merged = 0
+
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Ограничитель частоты для ExtBot: общая корзина на бота и корзины для каждого чата.
+
+    Через него проходят все запросы Application.bot, в том числе
+    update.message.reply_text в обработчиках. Учитывает retry_after из ответа 429
+    и объединяет подряд идущие текстовые сообщения в один чат, пока они ждут отправки.
+    """
+    # Параметры sendMessage, при которых сообщения можно объединить
+    MERGEABLE_KEYS = frozenset({
+        "chat_id",
+        "text",
+        "parse_mode",
+        "disable_notification",
+        "disable_web_page_preview",
+        "protect_content",
+    })
+    MAX_TEXT_LENGTH = 4096
+    MERGE_SEPARATOR = "\n\n"
+    # При каком количестве корзин чатов удалять неактивные
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3
+    ):
+        """
+        Инициализация планировщика
+
+        Args:
+            global_rate: Общий лимит запросов в секунду для бота
+            chat_rate: Лимит сообщений в секунду в один личный чат
+            chat_burst: Допустимый всплеск сообщений в один чат
+            group_rate: Лимит сообщений в секунду в одну группу или канал
+            max_retries: Количество повторов после ответа 429
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._pending_texts: Dict[Any, _PendingText] = {}
+        self._paused_until = 0.0
+
+        # Метрики
+        self.waiting = 0
+        self.sent = 0
+        self.merged = 0
+        self.throttled = 0
+        self.retried = 0
+        self.failed = 0
+        self.queue_latency = LatencyStats()
+        self.send_latency = LatencyStats()
+
+    async def initialize(self) -> None:
+        """
+        Инициализация (ресурсов, требующих подготовки, нет)
+        """
+
+    async def shutdown(self) -> None:
+        """
+        Очистка состояния планировщика
+        """
+        self._chat_buckets.clear()
+        self._pending_texts.clear()
+
+    def _chat_bucket(self, chat_id: Any, now: float) -> TokenBucket:
+        """
+        Корзина чата (создается при первом сообщении в чат)
+        """
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is not None:
+            return bucket
+
+        if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+            for idle_chat_id in [key for key, value in self._chat_buckets.items() if value.is_idle(now)]:
+                del self._chat_buckets[idle_chat_id]
+
+        # Отрицательный chat_id или @username - группа или канал
+        is_group = not isinstance(chat_id, int) or chat_id < 0
+        if is_group:
+            bucket = TokenBucket(self.group_rate, 1.0)
+        else:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_for_pause(self):
+        """
+        Ожидание окончания паузы, назначенной Telegram через retry_after
+        """
+        delay = self._paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._paused_until - time.monotonic()
+
+    async def _throttle(self, chat_id: Any):
+        """
+        Ожидание слота в корзине чата, затем в общей корзине
+        """
+        now = time.monotonic()
+        delay = self._chat_bucket(chat_id, now).reserve(now)
+        if delay > 0:
+            self.throttled += 1
+            await asyncio.sleep(delay)
+
+        delay = self.global_bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        await self._wait_for_pause()
+
+    def _can_merge(self, pending: _PendingText, data: Dict[str, Any]) -> bool:
+        """
+        Можно ли дописать текст data к ожидающему сообщению
+        """
+        if data.keys() != pending.data.keys():
+            return False
+        if any(pending.data[key] != value for key, value in data.items() if key != "text"):
+            return False
+        length = len(pending.data["text"]) + len(self.MERGE_SEPARATOR) + len(data["text"])
+        return length <= self.MAX_TEXT_LENGTH
+
+    async def _send(self, callback: Callable[..., Coroutine], args: Any, kwargs: Dict[str, Any], endpoint: str):
+        """
+        Выполнение запроса с повтором после ответа 429
+        """
+        attempt = 0
+        while True:
+            await self._wait_for_pause()
+            started_at = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                # Лимит Telegram действует на весь бот, поэтому пауза общая
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.retried += 1
+                logger.warning(f"Telegram ограничил частоту запросов ({endpoint}), пауза {retry_after} с")
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    raise
+                continue
+
+            self.send_latency.observe(time.perf_counter() - started_at)
+            self.sent += 1
+            return result
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ):
+        """
+        Обработка одного запроса ExtBot с учетом лимитов Telegram
+
+        Args:
+            callback: Корутина, выполняющая запрос
+            args: Позиционные аргументы callback
+            kwargs: Именованные аргументы callback
+            endpoint: Метод Bot API, например sendMessage
+            data: Параметры запроса (тот же словарь, что передается в callback)
+            rate_limit_args: Дополнительные аргументы (NO_MERGE - не объединять сообщение)
+
+        Returns:
+            Результат callback
+        """
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # Запросы без чата (answerCallbackQuery, setWebhook) не ограничиваются,
+            # но соблюдают паузу после ответа 429
+            return await self._send(callback, args, kwargs, endpoint)
+
+        pending = None
+        mergeable = not (isinstance(rate_limit_args, dict) and rate_limit_args.get("merge") is False)
+        if (
+            mergeable
+            and endpoint == "sendMessage"
+            and data.keys() <= self.MERGEABLE_KEYS
+            and isinstance(data.get("text"), str)
+        ):
+            waiting_text = self._pending_texts.get(chat_id)
+            if waiting_text is not None and self._can_merge(waiting_text, data):
+                waiting_text.data["text"] += self.MERGE_SEPARATOR + data["text"]
+                waiting_text.merged += 1
+                self.merged += 1
+                return await asyncio.shield(waiting_text.future)
+            pending = _PendingText(data)
+            self._pending_texts[chat_id] = pending
+        else:
+            # Следующий текст не должен обогнать этот запрос за счет объединения
+            self._pending_texts.pop(chat_id, None)
+
+        enqueued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._throttle(chat_id)
+        finally:
+            self.waiting -= 1
+            if pending is not None and self._pending_texts.get(chat_id) is pending:
+                del self._pending_texts[chat_id]
+        self.queue_latency.observe(time.perf_counter() - enqueued_at)
+
+        try:
+            result = await self._send(callback, args, kwargs, endpoint)
+        except BaseException as e:
+            if pending is not None and pending.merged:
+                if isinstance(e, asyncio.CancelledError):
+                    pending.future.cancel()
+                else:
+                    pending.future.set_exception(e)
+            raise
+
+        if pending is not None and pending.merged:
+            pending.future.set_result(result)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики планировщика
+
+        Returns:
+            Dict[str, Any]: Счетчики запросов и задержки в очереди на отправку
+        """
+        return {
+            "waiting": self.waiting,
+            "chat_buckets": len(self._chat_buckets),
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 3)),
+            "sent": self.sent,
+            "merged": self.merged,
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue_latency": self.queue_latency.snapshot(),
+            "send_latency": self.send_latency.snapshot(),
+        }
+
+
+# Создание экземпляра планировщика исходящих сообщений
+send_scheduler = SendScheduler(
+    global_rate=settings.SEND_GLOBAL_RATE,
+    chat_rate=settings.SEND_CHAT_RATE,
+    chat_burst=settings.SEND_CHAT_BURST,
+    group_rate=settings.SEND_GROUP_RATE_PER_MINUTE / 60,
+    max_retries=settings.SEND_MAX_RETRIES
+)
+metrics_registry.register("send_scheduler", send_scheduler.get_stats)
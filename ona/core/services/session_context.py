@@ -0,0 +1,407 @@
+"""
+Контекст обработки обновления: данные пользователя, загружаемые из базы
+один раз на обновление
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ona.config.settings import settings
+from ona.core.db.call_counter import db_call_counter
+from ona.core.db.projections import CONVERSATION_MESSAGE, PROFILE, SUBSCRIPTION_STATUS, USER
+from ona.core.services.conversation_cache import conversation_cache
+from ona.core.services.conversation_writer import conversation_writer
+from ona.core.services.user_identity import user_identity
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Части контекста, которые возвращает get_session_context
+PARTS = ("user", "profile", "subscription", "history")
+
+
+class SupabaseSessionLoader:
+    """
+    Загрузка данных контекста из Supabase: все части одним вызовом RPC
+    get_session_context или по отдельности, если RPC недоступна
+    """
+    def __init__(self, db_client=None, function: Optional[str] = "get_session_context"):
+        """
+        Инициализация загрузчика
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            function: Имя RPC (None - загружать части отдельными запросами)
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.function = function
+
+    async def fetch(self, telegram_id, history_limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Загрузка всех частей контекста за одно обращение к базе
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            history_limit: Количество последних сообщений диалога
+
+        Returns:
+            Optional[Dict[str, Any]]: Части контекста или None, если RPC отключена
+        """
+        if not self.function:
+            return None
+        from ona.core.db.supabase_client import execute
+        # Незаписанные сообщения пользователя должны попасть в историю
+        await conversation_writer.flush_user(telegram_id)
+        response = await execute(self.db_client.rpc(self.function, {
+            "p_telegram_id": telegram_id,
+            "p_history_limit": history_limit,
+        }))
+        return response.data or {}
+
+    async def fetch_part(self, telegram_id, part: str, history_limit: int) -> Any:
+        """
+        Загрузка одной части контекста отдельным запросом
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            part: Часть контекста из PARTS
+            history_limit: Количество последних сообщений диалога
+
+        Returns:
+            Any: Строка таблицы, список сообщений или None
+        """
+        from ona.core.db.supabase_client import execute
+
+        if part == "user":
+            response = await execute(USER.select(self.db_client).eq("telegram_id", telegram_id).limit(1))
+            return response.data[0] if response.data else None
+
+        if part == "profile":
+            response = await execute(PROFILE.select(self.db_client).eq("user_id", telegram_id).limit(1))
+            return response.data[0] if response.data else None
+
+        if part == "subscription":
+            user_id = await user_identity.resolve(telegram_id)
+            if user_id is None:
+                return None
+            response = await execute(
+                SUBSCRIPTION_STATUS.select(self.db_client)
+                .eq("user_id", user_id)
+                .eq("status", "active")
+                .gte("end_date", datetime.now().isoformat())
+                .order("end_date", desc=True)
+                .limit(1)
+            )
+            return response.data[0] if response.data else None
+
+        if part == "history":
+            await conversation_writer.flush_user(telegram_id)
+            response = await execute(
+                CONVERSATION_MESSAGE.select(self.db_client)
+                .eq("user_id", telegram_id)
+                .order("created_at", desc=True)
+                .limit(history_limit)
+            )
+            return list(reversed(response.data or []))
+
+        raise ValueError(f"Неизвестная часть контекста: {part}")
+
+
+class SessionContext:
+    """
+    Данные пользователя для обработки одного обновления.
+
+    При первом обращении все части загружаются одним запросом; части,
+    которые не удалось получить (или история большей длины), догружаются
+    отдельно. Записи обработчиков применяются к контексту, чтобы
+    последующие чтения в том же обновлении видели актуальные данные.
+    """
+    def __init__(self, telegram_id, loader, history_limit: int = 10, manager=None):
+        """
+        Инициализация контекста
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            loader: Загрузчик с методами fetch/fetch_part
+            history_limit: Количество сообщений диалога, загружаемых сразу
+            manager: SessionContextManager для учета метрик
+        """
+        self.telegram_id = telegram_id
+        self.history_limit = history_limit
+        self._loader = loader
+        self._manager = manager
+        self._data: Dict[str, Any] = {}
+        self._history_loaded_limit = 0
+        self._fetched = False
+        self._lock = asyncio.Lock()
+        # Поля профиля, записанные во время обновления
+        self._profile_fields: Dict[str, Any] = {}
+        # Отложенные действия, выполняемые при завершении обновления
+        self._on_close: Dict[Any, Callable[[], Awaitable[Any]]] = {}
+
+    def _count(self, counter: str):
+        if self._manager is not None:
+            setattr(self._manager, counter, getattr(self._manager, counter) + 1)
+
+    async def _ensure(self, part: str):
+        """
+        Загрузка части контекста, если она еще не загружена
+        """
+        if part in self._data:
+            return
+
+        async with self._lock:
+            if part in self._data:
+                return
+
+            if not self._fetched:
+                self._fetched = True
+                # История активного пользователя уже в кэше, загружать ее не нужно
+                if conversation_cache.covers(self.telegram_id, self.history_limit):
+                    history_limit = 0
+                else:
+                    history_limit = self.history_limit
+                try:
+                    data = await self._loader.fetch(self.telegram_id, history_limit)
+                except Exception as e:
+                    self._count("load_errors")
+                    logger.error(f"Ошибка при загрузке контекста пользователя {self.telegram_id}: {e}")
+                    data = None
+                if data is not None:
+                    self._count("batched_loads")
+                    for name in PARTS:
+                        if name in data:
+                            self._data[name] = data[name]
+                    if data.get("user"):
+                        user_identity.remember(self.telegram_id, data["user"]["id"])
+                    if "history" in data:
+                        self._data["history"] = list(data["history"] or [])
+                        self._history_loaded_limit = history_limit
+                if part in self._data:
+                    return
+
+            self._count("part_loads")
+            self._data[part] = await self._loader.fetch_part(self.telegram_id, part, self.history_limit)
+            if part == "history":
+                self._history_loaded_limit = self.history_limit
+
+    async def get_user(self) -> Optional[Dict[str, Any]]:
+        """
+        Строка таблицы users или None
+        """
+        await self._ensure("user")
+        return self._data["user"]
+
+    async def get_profile(self) -> Optional[Dict[str, Any]]:
+        """
+        Строка таблицы profiles или None
+        """
+        await self._ensure("profile")
+        if self._profile_fields:
+            # Записанные поля видны, даже если профиль загружен уже после записи
+            profile = dict(self._data["profile"] or {"user_id": self.telegram_id})
+            profile.update(self._profile_fields)
+            self._data["profile"] = profile
+        return self._data["profile"]
+
+    async def get_subscription(self) -> Optional[Dict[str, Any]]:
+        """
+        Активная неистекшая подписка или None
+        """
+        await self._ensure("subscription")
+        return self._data["subscription"]
+
+    async def get_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Последние сообщения диалога в хронологическом порядке
+
+        Args:
+            limit: Количество сообщений (по умолчанию - history_limit)
+
+        Returns:
+            List[Dict[str, Any]]: Строки conversations (message_text, is_user, created_at)
+        """
+        limit = limit or self.history_limit
+        await self._ensure("history")
+
+        history = self._data["history"]
+        # Загружено меньше, чем нужно, и в базе могут быть более старые сообщения
+        if limit > self._history_loaded_limit and len(history) >= self._history_loaded_limit:
+            async with self._lock:
+                self._count("part_loads")
+                history = await self._loader.fetch_part(self.telegram_id, "history", limit)
+                self._data["history"] = history
+                self._history_loaded_limit = limit
+
+        return history[-limit:]
+
+    def update_profile(self, fields: Dict[str, Any]):
+        """
+        Применение записанных полей профиля к профилю контекста
+
+        Args:
+            fields: Записанные поля
+        """
+        self._profile_fields.update(fields)
+
+    def add_message(self, message_text: str, is_user: bool, created_at: Optional[str] = None):
+        """
+        Добавление сохраненного сообщения к загруженной истории
+
+        Args:
+            message_text: Текст сообщения
+            is_user: Сообщение от пользователя
+            created_at: Время создания в формате ISO
+        """
+        if "history" not in self._data:
+            return
+        self._data["history"].append({"message_text": message_text, "is_user": is_user, "created_at": created_at})
+
+    def on_close(self, key, callback: Callable[[], Awaitable[Any]]):
+        """
+        Регистрация действия, выполняемого при завершении обработки обновления
+        (повторная регистрация с тем же ключом игнорируется)
+
+        Args:
+            key: Ключ действия
+            callback: Асинхронная функция без аргументов
+        """
+        self._on_close.setdefault(key, callback)
+
+    async def close(self):
+        """
+        Выполнение отложенных действий.
+
+        Ошибка действия не прерывает остальные; после выполнения всех действий
+        первая ошибка передается обработчику обновления, чтобы обновление
+        не считалось успешно обработанным (например, при незаписанном профиле)
+        """
+        error = None
+        while self._on_close:
+            key = next(iter(self._on_close))
+            callback = self._on_close.pop(key)
+            try:
+                await callback()
+            except Exception as e:
+                self._count("close_errors")
+                logger.error(f"Ошибка при завершении контекста пользователя {self.telegram_id}: {e}")
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+    def invalidate(self, part: str):
+        """
+        Сброс части контекста (следующее чтение загрузит ее заново)
+        """
+        self._data.pop(part, None)
+
+
+_current_session: ContextVar[Optional[SessionContext]] = ContextVar("session_context", default=None)
+
+
+class SessionContextManager:
+    """
+    Создание SessionContext на время обработки обновления.
+
+    Контекст доступен обработчикам и сервисам через current() без
+    изменения их сигнатур; вместе с ним ведется счетчик обращений к базе.
+    """
+    def __init__(self, loader=None, history_limit: int = 10):
+        """
+        Инициализация менеджера
+
+        Args:
+            loader: Загрузчик данных (по умолчанию создается при первом обновлении)
+            history_limit: Количество сообщений диалога, загружаемых сразу
+        """
+        self._loader = loader
+        self.history_limit = history_limit
+
+        # Метрики
+        self.sessions = 0
+        self.batched_loads = 0
+        self.part_loads = 0
+        self.load_errors = 0
+        self.close_errors = 0
+
+    @property
+    def loader(self):
+        if self._loader is None:
+            self._loader = SupabaseSessionLoader(function=settings.SESSION_CONTEXT_RPC or None)
+        return self._loader
+
+    @asynccontextmanager
+    async def scope(self, telegram_id):
+        """
+        Контекст пользователя на время обработки обновления.
+
+        Вложенные области для того же пользователя используют уже созданный контекст.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Yields:
+            SessionContext: Контекст обновления
+        """
+        current = _current_session.get()
+        if current is not None and current.telegram_id == telegram_id:
+            yield current
+            return
+
+        session = SessionContext(telegram_id, self.loader, self.history_limit, manager=self)
+        self.sessions += 1
+        token = _current_session.set(session)
+        try:
+            with db_call_counter.track():
+                try:
+                    yield session
+                finally:
+                    await session.close()
+        finally:
+            _current_session.reset(token)
+
+    def current(self, telegram_id=None) -> Optional[SessionContext]:
+        """
+        Контекст текущего обновления
+
+        Args:
+            telegram_id: Если указан, контекст возвращается только для этого пользователя
+
+        Returns:
+            Optional[SessionContext]: Контекст или None вне обработки обновления
+        """
+        session = _current_session.get()
+        if session is None or (telegram_id is not None and session.telegram_id != telegram_id):
+            return None
+        return session
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики контекстов
+
+        Returns:
+            Dict[str, Any]: Количество контекстов и загрузок
+        """
+        return {
+            "sessions": self.sessions,
+            "batched_loads": self.batched_loads,
+            "part_loads": self.part_loads,
+            "load_errors": self.load_errors,
+            "close_errors": self.close_errors,
+        }
+
+
+# Создание экземпляра менеджера контекстов обновлений
+# История загружается сразу в объеме, нужном для промпта чата, чтобы чат не догружал ее
+# отдельным запросом
+session_contexts = SessionContextManager(
+    history_limit=max(settings.SESSION_HISTORY_LIMIT, settings.CHAT_HISTORY_LIMIT)
+)
+metrics_registry.register("session_contexts", session_contexts.get_stats)
@@ -0,0 +1,351 @@
+"""
+Хранилище состояний FSM пользователей с кэшем в памяти процесса
+"""
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class StateConflictError(Exception):
+    """
+    Состояние пользователя изменилось с момента чтения (версия не совпала)
+    """
+    def __init__(self, user_id, expected_version: Optional[int]):
+        self.user_id = user_id
+        self.expected_version = expected_version
+        super().__init__(
+            f"Состояние пользователя {user_id} изменено другим обработчиком "
+            f"(ожидалась версия {expected_version})"
+        )
+
+
+class MemoryStateBackend:
+    """
+    Хранилище состояний в памяти процесса (для разработки и тестов)
+    """
+    def __init__(self):
+        self._states: Dict[Any, Tuple[str, int]] = {}
+
+    async def load(self, user_id) -> Optional[Tuple[str, int]]:
+        """
+        Загрузка состояния пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            Optional[Tuple[str, int]]: Состояние и его версия или None, если оно не сохранялось
+        """
+        return self._states.get(user_id)
+
+    async def compare_and_set(self, user_id, state: str, expected_version: int) -> bool:
+        """
+        Сохранение состояния, если его версия не изменилась
+
+        Args:
+            user_id: Telegram ID пользователя
+            state: Новое состояние
+            expected_version: Версия, прочитанная перед переходом (0 - состояния еще нет)
+
+        Returns:
+            bool: True если состояние записано с версией expected_version + 1
+        """
+        current = self._states.get(user_id)
+        current_version = current[1] if current is not None else 0
+        if current_version != expected_version:
+            return False
+        self._states[user_id] = (state, expected_version + 1)
+        return True
+
+
+class SupabaseStateBackend:
+    """
+    Хранилище состояний в таблице user_states (одна строка на пользователя)
+    """
+    def __init__(self, db_client=None, table: str = "user_states"):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            table: Имя таблицы состояний
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.table = table
+
+    async def load(self, user_id) -> Optional[Tuple[str, int]]:
+        """
+        Загрузка состояния пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            Optional[Tuple[str, int]]: Состояние и его версия или None, если строки нет
+        """
+        response = await execute(
+            self.db_client.table(self.table).select("state, version").eq("telegram_id", user_id).limit(1)
+        )
+        if response.data:
+            row = response.data[0]
+            return row["state"], row.get("version") or 0
+        return None
+
+    async def compare_and_set(self, user_id, state: str, expected_version: int) -> bool:
+        """
+        Условное сохранение состояния: UPDATE ... WHERE version = expected_version
+        (или INSERT, если строки еще нет)
+
+        Args:
+            user_id: Telegram ID пользователя
+            state: Новое состояние
+            expected_version: Версия, прочитанная перед переходом (0 - строки еще нет)
+
+        Returns:
+            bool: True если состояние записано с версией expected_version + 1
+        """
+        values = {
+            "state": state,
+            "version": expected_version + 1,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+
+        if expected_version == 0:
+            try:
+                await execute(self.db_client.table(self.table).insert({"telegram_id": user_id, **values}))
+            except Exception as e:
+                # 23505 - строку уже создал другой обработчик
+                if "23505" in str(e) or "duplicate key" in str(e):
+                    return False
+                raise
+            return True
+
+        response = await execute(
+            self.db_client.table(self.table)
+            .update(values)
+            .eq("telegram_id", user_id)
+            .eq("version", expected_version)
+        )
+        return bool(response.data)
+
+
+class UserStateStore:
+    """
+    Состояния пользователей: LRU-кэш с TTL перед постоянным хранилищем.
+
+    Чтение для активных пользователей обходится без запросов к базе,
+    переходы записываются в хранилище и сразу в кэш (write-through).
+    Каждое состояние имеет версию; запись выполняется только если версия
+    не изменилась с момента чтения (compare-and-set).
+    """
+    def __init__(
+        self,
+        backend=None,
+        max_size: int = 10000,
+        ttl: float = 300.0,
+        default_state: str = "initial",
+        max_retries: int = 5
+    ):
+        """
+        Инициализация хранилища
+
+        Args:
+            backend: Постоянное хранилище с методами load/compare_and_set (по умолчанию - в памяти)
+            max_size: Максимальное количество пользователей в кэше
+            ttl: Время жизни записи кэша в секундах
+            default_state: Состояние пользователя, для которого ничего не сохранено
+            max_retries: Количество повторов записи без указанной версии при конфликте
+        """
+        self.backend = backend if backend is not None else MemoryStateBackend()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.default_state = default_state
+        self.max_retries = max_retries
+        self._cache: "OrderedDict[Any, Tuple[str, int, float]]" = OrderedDict()
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.backend_errors = 0
+        self.load_latency = LatencyStats()
+
+    def _remember(self, user_id, state: str, version: int, now: float):
+        """
+        Запись состояния в кэш с вытеснением самых давно использованных записей
+        """
+        self._cache[user_id] = (state, version, now + self.ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def get_versioned(self, user_id) -> Tuple[str, int]:
+        """
+        Получение состояния пользователя вместе с версией
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            Tuple[str, int]: Текущее состояние и его версия (0 - состояние не сохранялось)
+        """
+        now = time.monotonic()
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[2] > now:
+            self._cache.move_to_end(user_id)
+            self.hits += 1
+            return cached[0], cached[1]
+
+        self.misses += 1
+        started_at = time.perf_counter()
+        try:
+            loaded = await self.backend.load(user_id)
+        except Exception as e:
+            # При недоступности хранилища используем последнее известное состояние
+            self.backend_errors += 1
+            logger.error(f"Ошибка при загрузке состояния пользователя {user_id}: {e}")
+            return (cached[0], cached[1]) if cached is not None else (self.default_state, 0)
+        finally:
+            self.load_latency.observe(time.perf_counter() - started_at)
+
+        state, version = loaded if loaded is not None else (self.default_state, 0)
+        self._remember(user_id, state, version, now)
+        return state, version
+
+    async def get(self, user_id) -> str:
+        """
+        Получение состояния пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            str: Текущее состояние (default_state, если оно не сохранялось)
+        """
+        state, _ = await self.get_versioned(user_id)
+        return state
+
+    def peek(self, user_id) -> Optional[str]:
+        """
+        Последнее известное состояние пользователя из кэша, без обращения к хранилищу
+        (например, для выбора приоритета обновления до его обработки)
+
+        Args:
+            user_id: Telegram ID пользователя
+
+        Returns:
+            Optional[str]: Состояние или None, если его нет в кэше
+        """
+        cached = self._cache.get(user_id)
+        return cached[0] if cached is not None else None
+
+    async def set(self, user_id, state: str, expected_version: Optional[int] = None) -> int:
+        """
+        Установка состояния пользователя с записью в хранилище и кэш
+
+        Args:
+            user_id: Telegram ID пользователя
+            state: Новое состояние
+            expected_version: Версия, на основе которой выполняется переход. Если версия
+                изменилась, выбрасывается StateConflictError. Без версии запись повторяется
+                поверх актуальной версии до max_retries раз.
+
+        Returns:
+            int: Новая версия состояния
+
+        Raises:
+            StateConflictError: Состояние изменилось с версии expected_version
+            Exception: Ошибка хранилища (переход не записан)
+        """
+        version = expected_version
+        attempts = 1 if expected_version is not None else self.max_retries + 1
+
+        for _ in range(attempts):
+            if version is None:
+                _, version = await self.get_versioned(user_id)
+
+            try:
+                written = await self.backend.compare_and_set(user_id, state, version)
+            except Exception as e:
+                # Кэш не меняется: в нем остается последняя записанная версия,
+                # иначе следующий переход ожидал бы версию, которой нет в хранилище
+                self.backend_errors += 1
+                logger.error(f"Ошибка при сохранении состояния {state} пользователя {user_id}: {e}")
+                raise
+
+            if written:
+                self.writes += 1
+                self._remember(user_id, state, version + 1, time.monotonic())
+                return version + 1
+
+            # Версия изменилась: следующее чтение должно идти в хранилище
+            self.conflicts += 1
+            self.invalidate(user_id)
+            version = None
+
+        raise StateConflictError(user_id, expected_version)
+
+    def invalidate(self, user_id=None):
+        """
+        Удаление записи (или всего кэша) для повторной загрузки из хранилища
+
+        Args:
+            user_id: Telegram ID пользователя (по умолчанию - все пользователи)
+        """
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики хранилища
+
+        Returns:
+            Dict[str, Any]: Размер кэша, попадания, промахи, конфликты и задержка загрузки
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "backend_errors": self.backend_errors,
+            "load_latency": self.load_latency.snapshot(),
+        }
+
+
+def _create_backend():
+    """
+    Создание постоянного хранилища согласно настройкам
+    """
+    if settings.STATE_BACKEND == "supabase":
+        return SupabaseStateBackend()
+    return MemoryStateBackend()
+
+
+# Создание экземпляра хранилища состояний
+user_state_store = UserStateStore(
+    backend=_create_backend(),
+    max_size=settings.STATE_CACHE_MAX_SIZE,
+    ttl=settings.STATE_CACHE_TTL,
+    max_retries=settings.STATE_CAS_MAX_RETRIES
+)
+metrics_registry.register("user_state_store", user_state_store.get_stats)
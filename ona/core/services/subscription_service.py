@@ -6,7 +6,11 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 from config.settings import settings
 from core.services.payment_service import payment_service
-from core.db.supabase_client import supabase
+from core.db.supabase_client import execute, supabase
+from ona.core.db.projections import SUBSCRIPTION, SUBSCRIPTION_PLAN, SUBSCRIPTION_STATUS, Projection
+from ona.core.services.registry import service_registry
+from ona.core.services.user_identity import user_identity
+from ona.core.services.session_context import session_contexts
 
 logger = logging.getLogger(__name__)
 
@@ -52,13 +56,11 @@ class SubscriptionService:
                 return None
 
             # Находим пользователя по telegram_id
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data or len(user_result.data) == 0:
+            if user_id is None:
                 logger.error(f"Пользователь с telegram_id {telegram_id} не найден")
                 return None
-                
-            user_id = user_result.data[0]["id"]
             
             # Сохраняем информацию о подписке
             subscription_data = {
@@ -73,7 +75,7 @@ class SubscriptionService:
             }
             
             # Сохраняем в базу данных
-            subscription_result = supabase.table("subscriptions").insert(subscription_data).execute()
+            subscription_result = await execute(supabase.table("subscriptions").insert(subscription_data))
             
             if not subscription_result.data or len(subscription_result.data) == 0:
                 logger.error(f"Ошибка при сохранении подписки для пользователя {telegram_id}")
@@ -110,7 +112,7 @@ class SubscriptionService:
             # TODO: Получить данные подписки из базы по payment_id
 
             # Получаем данные подписки из базы по payment_id
-            subscription_result = supabase.table("subscriptions").select("*").eq("payment_id", payment_id).execute()
+            subscription_result = await execute(SUBSCRIPTION_PLAN.select(supabase).eq("payment_id", payment_id))
             
             if not subscription_result.data or len(subscription_result.data) == 0:
                 logger.error(f"Подписка с payment_id {payment_id} не найдена")
@@ -132,7 +134,7 @@ class SubscriptionService:
             }
             
             # Обновляем данные в базе
-            update_result = supabase.table("subscriptions").update(subscription_data).eq("payment_id", payment_id).execute()
+            update_result = await execute(supabase.table("subscriptions").update(subscription_data).eq("payment_id", payment_id))
             
             return update_result.data and len(update_result.data) > 0
             
@@ -153,22 +155,20 @@ class SubscriptionService:
         try:
             # TODO: Получить данные подписки из базы
             # Находим пользователя по telegram_id
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data or len(user_result.data) == 0:
+            if user_id is None:
                 logger.error(f"Пользователь с telegram_id {telegram_id} не найден")
                 return None
-                
-            user_id = user_result.data[0]["id"]
             
             # Получаем данные подписки из базы
-            subscription_result = supabase.table("subscriptions")\
-                .select("*")\
-                .eq("user_id", user_id)\
-                .eq("status", "active")\
-                .order("end_date", desc=True)\
-                .limit(1)\
-                .execute()
+            subscription_result = await execute(
+                SUBSCRIPTION.select(supabase)
+                .eq("user_id", user_id)
+                .eq("status", "active")
+                .order("end_date", desc=True)
+                .limit(1)
+            )
             
             if not subscription_result.data or len(subscription_result.data) == 0:
                 return None
@@ -179,7 +179,7 @@ class SubscriptionService:
             if subscription_data["end_date"] and datetime.fromisoformat(subscription_data["end_date"]) < datetime.utcnow():
                 subscription_data["status"] = "expired"
              # Обновляем статус в базе
-                supabase.table("subscriptions").update({"status": "expired"}).eq("id", subscription_data["id"]).execute()
+                await execute(supabase.table("subscriptions").update({"status": "expired"}).eq("id", subscription_data["id"]))
                 
             return subscription_data
             
@@ -213,7 +213,7 @@ class SubscriptionService:
             }
             
             # Обновляем данные в базе
-            update_result = supabase.table("subscriptions").update(update_data).eq("id", subscription_data["id"]).execute()
+            update_result = await execute(supabase.table("subscriptions").update(update_data).eq("id", subscription_data["id"]))
             
             return update_result.data and len(update_result.data) > 0
             
@@ -255,35 +255,40 @@ class SubscriptionService:
             logger.error(f"Ошибка при получении информации о подписке: {e}")
             return None
     
-    async def get_user_subscription(self, telegram_id):
+    async def get_user_subscription(self, telegram_id, projection: Projection = SUBSCRIPTION_STATUS):
         """
         Получает активную подписку пользователя
         
         Args:
             telegram_id: Telegram ID пользователя
+            projection: Выбираемые столбцы subscriptions (вне обработки обновления)
             
         Returns:
             dict: Информация о подписке или None если подписка не найдена
         """
         try:
+            # Во время обработки обновления подписка берется из контекста, загруженного один раз
+            session = session_contexts.current(telegram_id)
+            if session is not None:
+                return await session.get_subscription()
+            
             # Получение пользователя
-            user_result = supabase.table("users").select("id").eq("telegram_id", telegram_id).execute()
+            user_id = await user_identity.resolve(telegram_id)
             
-            if not user_result.data:
+            if user_id is None:
                 logger.warning(f"Пользователь с telegram_id {telegram_id} не найден")
                 return None
             
-            user_id = user_result.data[0]["id"]
-            
             # Получение активной подписки
             now = datetime.now().isoformat()
-            subscription_result = supabase.table("subscriptions").select("*") \
-                .eq("user_id", user_id) \
-                .eq("status", "active") \
-                .gte("end_date", now) \
-                .order("end_date", desc=True) \
-                .limit(1) \
-                .execute()
+            subscription_result = await execute(
+                projection.select(supabase)
+                .eq("user_id", user_id)
+                .eq("status", "active")
+                .gte("end_date", now)
+                .order("end_date", desc=True)
+                .limit(1)
+            )
             
             if not subscription_result.data:
                 logger.info(f"Активная подписка для пользователя {telegram_id} не найдена")
@@ -325,5 +330,5 @@ class SubscriptionService:
         
         return subscription["end_date"]
 
-# Создание экземпляра сервиса
-subscription_service = SubscriptionService() 
+# Ленивое создание экземпляра сервиса при первом обращении
+subscription_service = service_registry.register("subscription_service", SubscriptionService) 
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from telegram import Bot, Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
@@ -9,6 +10,13 @@ from telegram.ext import (
     filters,
 )
 from ona.config.settings import TELEGRAM_BOT_TOKEN
+from ona.core.services.update_dispatcher import update_dispatcher, UserLaneUpdateProcessor
+from ona.core.services.update_deduplicator import update_deduplicator
+from ona.core.services.send_scheduler import send_scheduler
+from ona.core.services.session_context import session_contexts
+from ona.core.services.state_store import user_state_store
+from ona.core.services.update_queue import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from ona.utils.update_decoder import RawUpdate
 from ona.utils.state_router import state_router
 from ona.core.fsm.handlers.registration_handler import STATES as REGISTRATION_STATES
 from ona.core.fsm.handlers.profiling_psychology_handler import STATE as PSYCHOLOGY_STATE
@@ -24,9 +32,44 @@ class TelegramService:
     """
     Класс для работы с Telegram Bot API
     """
+    # Типы обновлений, для которых зарегистрированы обработчики;
+    # для остальных объект Update не строится
+    HANDLED_UPDATE_TYPES = frozenset({
+        "message",
+        "edited_message",
+        "channel_post",
+        "edited_channel_post",
+        "callback_query",
+    })
+    # Типы обновлений платежного сценария, которые обрабатываются в первую очередь
+    PAYMENT_UPDATE_TYPES = frozenset({
+        "callback_query",
+        "pre_checkout_query",
+        "shipping_query",
+    })
+    # Состояния регистрации и профайлинга: ответы в них обрабатываются наравне с командами
+    ONBOARDING_STATES = frozenset(REGISTRATION_STATES.values()) | {PSYCHOLOGY_STATE}
+    # Ответ пользователю, сообщение которого сброшено из-за перегрузки
+    OVERLOAD_REPLY_TEXT = (
+        "Сейчас мне пишет очень много людей, и я не успеваю ответить всем сразу 🙏\n\n"
+        "Пожалуйста, повтори своё сообщение через пару минут."
+    )
+
     def __init__(self):
         self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.dispatcher = update_dispatcher
+        self.deduplicator = update_deduplicator
+        # Обновления одного пользователя обрабатываются по порядку, разных - параллельно;
+        # все ответы бота проходят через общий планировщик с лимитами Telegram
+        self.app = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .concurrent_updates(UserLaneUpdateProcessor(self.dispatcher))
+            .rate_limiter(send_scheduler)
+            .build()
+        )
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
 
     async def setup_handlers(self):
         self.app.add_handler(CommandHandler("start", self.start_command))
@@ -72,13 +115,125 @@ class TelegramService:
         logger.error(f"Ошибка при обработке запроса: {context.error}")
 
     def start_polling(self):
-    import asyncio
-    asyncio.run(self._start_polling())
-
-async def _start_polling(self):
-    await self.setup_handlers()
-    await self.app.run_polling()
-
-
-
-
+        asyncio.run(self._start_polling())
+
+    async def _start_polling(self):
+        await self.setup_handlers()
+        await self.app.run_polling()
+
+    async def initialize(self):
+        """
+        Однократная регистрация обработчиков и инициализация Application
+        для режима вебхука
+        """
+        if self._initialized:
+            return
+
+        async with self._init_lock:
+            if self._initialized:
+                return
+            await self.setup_handlers()
+            await self.app.initialize()
+            self._initialized = True
+
+    async def process_update(self, update_data):
+        """
+        Обработка одного обновления, полученного через вебхук
+
+        Args:
+            update_data: RawUpdate или JSON-данные обновления от Telegram
+        """
+        raw_update = RawUpdate.coerce(update_data)
+        if raw_update.update_type not in self.HANDLED_UPDATE_TYPES:
+            logger.debug("Обновление %s типа %s не обрабатывается", raw_update.update_id, raw_update.update_type)
+            return
+
+        await self.initialize()
+        if raw_update.user_id is None:
+            await self.app.process_update(raw_update.to_update(self.app.bot))
+            return
+
+        # Данные пользователя загружаются один раз на обновление и доступны всем обработчикам
+        async with session_contexts.scope(raw_update.user_id):
+            await self.app.process_update(raw_update.to_update(self.app.bot))
+
+    async def dispatch_update(self, update_data):
+        """
+        Обработка обновления через диспетчер: по порядку для одного пользователя,
+        параллельно для разных
+
+        Args:
+            update_data: RawUpdate или JSON-данные обновления от Telegram
+
+        Returns:
+            Optional[asyncio.Future]: Завершается после обработки обновления
+                (None, если обновление пропущено)
+        """
+        raw_update = RawUpdate.coerce(update_data)
+
+        # Telegram повторно доставляет обновление, если вебхук ответил слишком поздно
+        if await self.deduplicator.is_duplicate(raw_update.update_id):
+            logger.info(f"Обновление {raw_update.update_id} уже обработано, пропускаем")
+            return None
+
+        return await self.dispatcher.dispatch(raw_update.user_id, self.process_update(raw_update))
+
+    @classmethod
+    def get_update_priority(cls, update_data) -> int:
+        """
+        Определение приоритета обновления без построения объекта Update
+
+        Нажатия кнопок (в том числе выбор тарифа) и платежи обрабатываются
+        первыми, команды (/start и другие) и ответы на вопросы регистрации
+        и профайлинга - следом, обычные сообщения для AI-диалога - в последнюю
+        очередь. Состояние пользователя берется из кэша хранилища состояний.
+
+        Args:
+            update_data: RawUpdate или JSON-данные обновления от Telegram
+
+        Returns:
+            int: Приоритет обновления для очереди
+        """
+        raw_update = RawUpdate.coerce(update_data)
+        if raw_update.update_type in cls.PAYMENT_UPDATE_TYPES:
+            return PRIORITY_HIGH
+
+        if raw_update.update_type == "message":
+            if "successful_payment" in raw_update.payload:
+                return PRIORITY_HIGH
+            text = raw_update.payload.get("text")
+            if isinstance(text, str) and text.startswith("/"):
+                return PRIORITY_NORMAL
+            if raw_update.user_id is not None and user_state_store.peek(raw_update.user_id) in cls.ONBOARDING_STATES:
+                return PRIORITY_NORMAL
+
+        return PRIORITY_LOW
+
+    async def send_overload_reply(self, update_data):
+        """
+        Вежливый ответ пользователю, чье сообщение сброшено из-за перегрузки
+
+        Args:
+            update_data: RawUpdate или JSON-данные обновления от Telegram
+        """
+        raw_update = RawUpdate.coerce(update_data)
+        if raw_update.update_type != "message":
+            return
+
+        chat = raw_update.payload.get("chat")
+        chat_id = chat.get("id") if isinstance(chat, dict) else raw_update.user_id
+        if chat_id is None:
+            return
+
+        await self.initialize()
+        await self.app.bot.send_message(chat_id=chat_id, text=self.OVERLOAD_REPLY_TEXT)
+
+    async def setup_webhook(self, webhook_url: str, secret_token: str = None):
+        """
+        Регистрация вебхука в Telegram Bot API
+
+        Args:
+            webhook_url: URL, на который Telegram будет отправлять обновления
+            secret_token: Секретный токен для заголовка X-Telegram-Bot-Api-Secret-Token
+        """
+        await self.bot.set_webhook(url=webhook_url, secret_token=secret_token)
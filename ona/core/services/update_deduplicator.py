@@ -0,0 +1,178 @@
+"""
+Отбрасывание повторно доставленных обновлений Telegram по update_id
+"""
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseSeenUpdatesBackend:
+    """
+    Общее для всех воркеров uvicorn хранилище обработанных update_id
+    на основе таблицы processed_updates с первичным ключом update_id
+    """
+    # Как часто (в количестве вставок) удалять устаревшие записи
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, db_client=None, table: str = "processed_updates"):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            table: Имя таблицы с обработанными update_id
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.table = table
+        self._inserts = 0
+
+    async def mark_seen(self, update_id: int, ttl: float) -> bool:
+        """
+        Атомарная отметка update_id как обработанного
+
+        Args:
+            update_id: ID обновления
+            ttl: Время хранения отметки в секундах
+
+        Returns:
+            bool: True если update_id встретился впервые, False если он уже был отмечен
+        """
+        try:
+            await execute(self.db_client.table(self.table).insert({
+                "update_id": update_id,
+                "created_at": datetime.utcnow().isoformat()
+            }))
+        except Exception as e:
+            # 23505 - нарушение уникальности: другой воркер уже принял это обновление
+            if "23505" in str(e) or "duplicate key" in str(e):
+                return False
+            raise
+
+        self._inserts += 1
+        if self._inserts % self.CLEANUP_EVERY == 0:
+            cutoff = (datetime.utcnow() - timedelta(seconds=ttl)).isoformat()
+            await execute(self.db_client.table(self.table).delete().lt("created_at", cutoff))
+        return True
+
+
+class UpdateDeduplicator:
+    """
+    Ограниченное по размеру и времени множество недавно виденных update_id.
+
+    Локальная проверка выполняется в памяти; при наличии общего хранилища
+    дубликаты отбрасываются и между разными процессами.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 600.0, backend=None):
+        """
+        Инициализация дедупликатора
+
+        Args:
+            max_size: Максимальное количество хранимых update_id
+            ttl: Окно дедупликации в секундах
+            backend: Общее хранилище с методом mark_seen (необязательно)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+        # Метрики
+        self.checked = 0
+        self.dropped = 0
+        self.dropped_shared = 0
+        self.backend_errors = 0
+
+    def _expire(self, now: float):
+        """
+        Удаление записей, вышедших за окно дедупликации
+        """
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if now - seen_at <= self.ttl:
+                break
+            self._seen.popitem(last=False)
+
+    async def is_duplicate(self, update_id: Optional[int]) -> bool:
+        """
+        Проверка, обрабатывалось ли уже обновление, с отметкой нового update_id
+
+        Args:
+            update_id: ID обновления от Telegram
+
+        Returns:
+            bool: True если обновление уже встречалось и его нужно отбросить
+        """
+        if update_id is None:
+            return False
+
+        self.checked += 1
+        now = time.monotonic()
+        self._expire(now)
+
+        if update_id in self._seen:
+            self.dropped += 1
+            return True
+
+        self._seen[update_id] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+        if self.backend is not None:
+            try:
+                if not await self.backend.mark_seen(update_id, self.ttl):
+                    self.dropped_shared += 1
+                    return True
+            except Exception as e:
+                # Недоступность хранилища не должна останавливать обработку
+                self.backend_errors += 1
+                logger.error(f"Ошибка при проверке update_id {update_id} в общем хранилище: {e}")
+
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики дедупликатора
+
+        Returns:
+            Dict[str, Any]: Размер окна и счетчики отброшенных обновлений
+        """
+        return {
+            "size": len(self._seen),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "shared_backend": type(self.backend).__name__ if self.backend else None,
+            "checked": self.checked,
+            "dropped": self.dropped + self.dropped_shared,
+            "dropped_local": self.dropped,
+            "dropped_shared": self.dropped_shared,
+            "backend_errors": self.backend_errors,
+        }
+
+
+def _create_backend():
+    """
+    Создание общего хранилища согласно настройкам
+    """
+    if settings.UPDATE_DEDUP_BACKEND == "supabase":
+        return SupabaseSeenUpdatesBackend()
+    return None
+
+
+# Создание экземпляра дедупликатора
+update_deduplicator = UpdateDeduplicator(
+    max_size=settings.UPDATE_DEDUP_MAX_SIZE,
+    ttl=settings.UPDATE_DEDUP_TTL,
+    backend=_create_backend()
+)
+metrics_registry.register("update_deduplicator", update_deduplicator.get_stats)
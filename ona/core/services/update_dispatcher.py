@@ -0,0 +1,188 @@
+"""
+Диспетчер обновлений: последовательная обработка в рамках одного пользователя
+и параллельная между разными пользователями
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Coroutine, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from ona.config.settings import settings
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+class UpdateDispatcher:
+    """
+    Распределение обновлений по очередям пользователей (lanes).
+
+    Обновления одного пользователя выполняются строго по порядку поступления,
+    обновления разных пользователей - параллельно в пределах общего лимита.
+    """
+    def __init__(self, max_concurrency: int = 8):
+        """
+        Инициализация диспетчера
+
+        Args:
+            max_concurrency: Максимальное количество одновременно обрабатываемых обновлений
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._lanes: Dict[Hashable, deque] = {}
+        self._queued = 0
+
+        # Метрики
+        self.dispatched = 0
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.peak_lanes = 0
+        self.peak_lane_depth = 0
+        self.wait_latency = LatencyStats()
+
+    @property
+    def active_lanes(self) -> int:
+        """
+        Количество пользователей, у которых сейчас обрабатываются обновления
+        """
+        return len(self._lanes)
+
+    @property
+    def queued(self) -> int:
+        """
+        Количество обновлений, ожидающих своей очереди внутри lanes
+        """
+        return self._queued
+
+    async def dispatch(self, key: Optional[Hashable], coroutine: Coroutine) -> asyncio.Future:
+        """
+        Выполнение корутины в очереди пользователя.
+
+        Если у пользователя уже обрабатывается обновление, корутина ставится
+        в его очередь и метод сразу возвращается: ее выполнит тот, кто
+        обрабатывает текущее обновление этого пользователя.
+
+        Args:
+            key: Ключ очереди (ID пользователя); None - без упорядочивания
+            coroutine: Корутина обработки обновления
+
+        Returns:
+            asyncio.Future: Завершается после обработки обновления (для обновления,
+                поставленного в очередь пользователя, - позже возврата из метода);
+                результат - True, если обновление обработано без ошибок
+        """
+        self.dispatched += 1
+        enqueued_at = time.perf_counter()
+        done = asyncio.get_running_loop().create_future()
+
+        if key is None:
+            await self._run(coroutine, enqueued_at, done)
+            return done
+
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append((coroutine, enqueued_at, done))
+            self._queued += 1
+            self.peak_lane_depth = max(self.peak_lane_depth, len(lane))
+            return done
+
+        lane = self._lanes[key] = deque()
+        self.peak_lanes = max(self.peak_lanes, len(self._lanes))
+        try:
+            await self._run(coroutine, enqueued_at, done)
+            while lane:
+                next_coroutine, next_enqueued_at, next_done = lane.popleft()
+                self._queued -= 1
+                await self._run(next_coroutine, next_enqueued_at, next_done)
+        finally:
+            # При отмене закрываем необработанные корутины, чтобы не было утечек
+            for pending, _, pending_done in lane:
+                pending.close()
+                pending_done.cancel()
+            self._queued -= len(lane)
+            del self._lanes[key]
+        return done
+
+    async def _run(self, coroutine: Coroutine, enqueued_at: float, done: asyncio.Future):
+        """
+        Выполнение одной корутины в пределах общего лимита параллельности
+        """
+        try:
+            succeeded = await self._execute(coroutine, enqueued_at)
+        except asyncio.CancelledError:
+            done.cancel()
+            raise
+        if not done.done():
+            done.set_result(succeeded)
+
+    async def _execute(self, coroutine: Coroutine, enqueued_at: float) -> bool:
+        """
+        Выполнение корутины с учетом времени ожидания и ошибок
+
+        Returns:
+            bool: True, если корутина завершилась без ошибки
+        """
+        async with self._semaphore:
+            self.wait_latency.observe(time.perf_counter() - enqueued_at)
+            self.in_flight += 1
+            try:
+                await coroutine
+                self.processed += 1
+                return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка при обработке обновления: {e}")
+                return False
+            finally:
+                self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики диспетчера
+
+        Returns:
+            Dict[str, Any]: Количество lanes, очереди и время ожидания
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "active_lanes": self.active_lanes,
+            "peak_lanes": self.peak_lanes,
+            "queued": self.queued,
+            "peak_lane_depth": self.peak_lane_depth,
+            "dispatched": self.dispatched,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_latency": self.wait_latency.snapshot(),
+        }
+
+
+class UserLaneUpdateProcessor(BaseUpdateProcessor):
+    """
+    Процессор обновлений python-telegram-bot, направляющий обновления
+    в UpdateDispatcher (используется в режиме polling)
+    """
+    def __init__(self, dispatcher: UpdateDispatcher):
+        super().__init__(max_concurrent_updates=dispatcher.max_concurrency)
+        self.dispatcher = dispatcher
+
+    async def do_process_update(self, update: object, coroutine: Coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        await self.dispatcher.dispatch(user.id if user else None, coroutine)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+# Создание экземпляра диспетчера
+update_dispatcher = UpdateDispatcher(max_concurrency=settings.UPDATE_MAX_CONCURRENCY)
+metrics_registry.register("update_dispatcher", update_dispatcher.get_stats)
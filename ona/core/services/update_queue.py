@@ -0,0 +1,349 @@
+"""
+Очередь входящих обновлений Telegram с пулом асинхронных обработчиков
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from ona.utils.metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета: меньшее значение обрабатывается раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_HIGH: "high",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low",
+}
+
+
+class UpdateQueue:
+    """
+    Внутрипроцессная очередь обновлений с приоритетами.
+
+    Вебхук только кладет обновление в очередь и сразу отвечает Telegram,
+    а обработку выполняют фоновые воркеры. Обновления с более высоким
+    приоритетом забираются раньше; при переполнении очереди обновления
+    низкого приоритета сбрасываются.
+    """
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int = 4,
+        maxsize: int = 1000,
+        classifier: Optional[Callable[[Any], int]] = None,
+        key: Optional[Callable[[Any], Optional[Hashable]]] = None,
+        shed_thresholds: Optional[Dict[int, int]] = None,
+        on_shed: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        backlog: Optional[Callable[[], int]] = None
+    ):
+        """
+        Инициализация очереди
+
+        Args:
+            handler: Корутина, обрабатывающая одно обновление; если она возвращает
+                asyncio.Future (обработка отложена), обновление считается
+                обработанным после его завершения. Результат False (или ошибка
+                future) означает, что обработка завершилась ошибкой
+            workers: Количество фоновых воркеров
+            maxsize: Максимальное количество обновлений в очереди (0 - без ограничения)
+            classifier: Функция, возвращающая приоритет обновления (по умолчанию PRIORITY_NORMAL)
+            key: Функция, возвращающая ключ пользователя; обновление пользователя
+                не обгоняет его же обновления, уже стоящие в очереди
+            shed_thresholds: Глубина очереди, начиная с которой сбрасываются
+                обновления данного приоритета ({приоритет: глубина})
+            on_shed: Корутина, вызываемая для сброшенного обновления (например, вежливый ответ)
+            backlog: Функция, возвращающая количество принятых обновлений, которые
+                обработчик отложил у себя (например, в очередях пользователей
+                диспетчера); они учитываются в лимите очереди и порогах сброса
+        """
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.classifier = classifier
+        self.key = key
+        self.shed_thresholds = {
+            priority: threshold
+            for priority, threshold in (shed_thresholds or {}).items()
+            if threshold
+        }
+        self.on_shed = on_shed
+        self.backlog = backlog
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._shed_tasks: Set[asyncio.Task] = set()
+        # Отложенные обработчиком обновления, которые еще не обработаны
+        self._completions: Set[asyncio.Future] = set()
+        self._sequence = itertools.count()
+        # Количество ожидающих обновлений каждого пользователя по приоритетам
+        self._pending_by_key: Dict[Hashable, List[int]] = {}
+
+        # Метрики
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.enqueued_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.shed_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.depth_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_latency = LatencyStats()
+        self.wait_latency_by_priority = {priority: LatencyStats() for priority in PRIORITY_NAMES}
+        self.processing_latency = LatencyStats()
+        # От постановки в очередь до завершения обработки
+        self.total_latency = LatencyStats()
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Запущены ли воркеры
+        """
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """
+        Текущее количество обновлений, ожидающих обработки
+        """
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def load(self) -> int:
+        """
+        Количество принятых, но еще не обработанных обновлений: очередь
+        и отложенные обработчиком обновления
+        """
+        return self.depth + (self.backlog() if self.backlog else 0)
+
+    async def start(self):
+        """
+        Запуск фоновых воркеров (повторный вызов ничего не делает)
+        """
+        if self.is_running:
+            return
+
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(maxsize=self.maxsize)
+
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"update-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Запущено {self.workers} воркеров очереди обновлений")
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Остановка воркеров с ожиданием обработки уже принятых обновлений
+
+        Args:
+            timeout: Максимальное время ожидания опустошения очереди в секундах
+        """
+        if not self.is_running:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь обновлений не опустела за {timeout} с, осталось {self.load}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._shed_tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Воркеры очереди обновлений остановлены")
+
+    async def _drain(self):
+        """
+        Ожидание обработки обновлений из очереди и отложенных обработчиком
+        """
+        await self._queue.join()
+        while self._completions:
+            await asyncio.wait(list(self._completions))
+
+    def _should_shed(self, priority: int) -> bool:
+        """
+        Нужно ли сбросить обновление данного приоритета при текущей глубине очереди
+        """
+        threshold = self.shed_thresholds.get(priority)
+        return threshold is not None and self.load >= threshold
+
+    async def enqueue(self, update: Any) -> bool:
+        """
+        Постановка обновления в очередь без ожидания обработки
+
+        Args:
+            update: Обновление от Telegram
+
+        Returns:
+            bool: True если обновление принято (поставлено в очередь или сброшено
+                с ответом пользователю), False если очередь переполнена
+        """
+        if not self.is_running:
+            await self.start()
+
+        priority = self.classifier(update) if self.classifier else PRIORITY_NORMAL
+
+        if self._should_shed(priority):
+            self.shed_by_priority[priority] += 1
+            logger.warning(
+                f"Очередь обновлений перегружена ({self.load}), "
+                f"обновление с приоритетом {PRIORITY_NAMES[priority]} сброшено"
+            )
+            if self.on_shed is not None:
+                task = asyncio.create_task(self._notify_shed(update))
+                self._shed_tasks.add(task)
+                task.add_done_callback(self._shed_tasks.discard)
+            return True
+
+        # Обновление не должно обогнать уже ожидающие обновления того же пользователя
+        key = self.key(update) if self.key else None
+        queue_priority = priority
+        pending = self._pending_by_key.get(key) if key is not None else None
+        if pending:
+            queue_priority = max(
+                priority,
+                max(p for p, count in enumerate(pending) if count)
+            )
+
+        try:
+            if self.maxsize and self.load >= self.maxsize:
+                raise asyncio.QueueFull
+            self._queue.put_nowait((queue_priority, next(self._sequence), update, key, priority, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Очередь обновлений переполнена ({self.maxsize}), обновление отклонено")
+            return False
+
+        if key is not None:
+            pending = self._pending_by_key.setdefault(key, [0] * len(PRIORITY_NAMES))
+            pending[queue_priority] += 1
+
+        self.enqueued += 1
+        self.enqueued_by_priority[priority] += 1
+        self.depth_by_priority[priority] += 1
+        return True
+
+    async def _notify_shed(self, update: Any):
+        """
+        Вызов обработчика сброшенного обновления
+        """
+        try:
+            await self.on_shed(update)
+        except Exception as e:
+            logger.error(f"Ошибка при ответе на сброшенное обновление: {e}")
+
+    def _release_key(self, key: Optional[Hashable], queue_priority: int):
+        """
+        Учет того, что обновление пользователя покинуло очередь
+        """
+        if key is None:
+            return
+        pending = self._pending_by_key.get(key)
+        if pending is None:
+            return
+        pending[queue_priority] -= 1
+        if not any(pending):
+            del self._pending_by_key[key]
+
+    async def _worker(self, index: int):
+        """
+        Цикл воркера: получение обновления из очереди и его обработка
+
+        Args:
+            index: Номер воркера
+        """
+        while True:
+            queue_priority, _, update, key, priority, enqueued_at = await self._queue.get()
+            self._release_key(key, queue_priority)
+            self.depth_by_priority[priority] -= 1
+
+            started_at = time.perf_counter()
+            self.wait_latency.observe(started_at - enqueued_at)
+            self.wait_latency_by_priority[priority].observe(started_at - enqueued_at)
+
+            try:
+                completion = await self.handler(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при обработке обновления в воркере {index}: {e}")
+                completion = False
+            finally:
+                self._queue.task_done()
+            self._track_completion(completion, enqueued_at, started_at)
+
+    def _track_completion(self, completion: Any, enqueued_at: float, started_at: float):
+        """
+        Учет результата и задержки обработки после фактического завершения обновления
+        """
+        if not asyncio.isfuture(completion):
+            self._complete(completion is not False, enqueued_at, started_at)
+            return
+
+        def on_done(future: asyncio.Future):
+            self._completions.discard(future)
+            succeeded = (
+                not future.cancelled()
+                and future.exception() is None
+                and future.result() is not False
+            )
+            self._complete(succeeded, enqueued_at, started_at)
+
+        if completion.done():
+            on_done(completion)
+            return
+
+        self._completions.add(completion)
+        completion.add_done_callback(on_done)
+
+    def _complete(self, succeeded: bool, enqueued_at: float, started_at: float):
+        """
+        Учет завершенного обновления: результат и задержки
+        """
+        if succeeded:
+            self.processed += 1
+        else:
+            self.failed += 1
+        finished_at = time.perf_counter()
+        self.processing_latency.observe(finished_at - started_at)
+        self.total_latency.observe(finished_at - enqueued_at)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики очереди
+
+        Returns:
+            Dict[str, Any]: Глубина очереди, счетчики и задержки
+        """
+        return {
+            "depth": self.depth,
+            "backlog": self.load - self.depth,
+            "maxsize": self.maxsize,
+            "workers": self.workers if self.is_running else 0,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "shed": sum(self.shed_by_priority.values()),
+            "processed": self.processed,
+            "failed": self.failed,
+            "shed_thresholds": {
+                PRIORITY_NAMES[priority]: threshold
+                for priority, threshold in self.shed_thresholds.items()
+            },
+            "priorities": {
+                name: {
+                    "depth": self.depth_by_priority[priority],
+                    "enqueued": self.enqueued_by_priority[priority],
+                    "shed": self.shed_by_priority[priority],
+                    "wait_latency": self.wait_latency_by_priority[priority].snapshot(),
+                }
+                for priority, name in PRIORITY_NAMES.items()
+            },
+            "wait_latency": self.wait_latency.snapshot(),
+            "processing_latency": self.processing_latency.snapshot(),
+            "total_latency": self.total_latency.snapshot(),
+        }
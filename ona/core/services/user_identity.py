@@ -0,0 +1,146 @@
+"""
+Соответствие Telegram ID пользователя и users.id с кэшем в памяти процесса
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from ona.config.settings import settings
+from ona.core.db.supabase_client import execute
+from ona.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class UserIdentityMap:
+    """
+    Кэш telegram_id -> users.id.
+
+    Соответствие не меняется, поэтому найденные ID хранятся без TTL
+    (с вытеснением самых давно использованных). Отсутствующие пользователи
+    запоминаются на negative_ttl секунд, чтобы повторные запросы до
+    регистрации не ходили в базу.
+    """
+    def __init__(self, db_client=None, max_size: int = 100000, negative_ttl: float = 60.0):
+        """
+        Инициализация кэша
+
+        Args:
+            db_client: Клиент Supabase (по умолчанию - общий клиент приложения)
+            max_size: Максимальное количество пользователей в кэше
+            negative_ttl: Время хранения отметки "пользователь не найден" в секундах
+        """
+        if db_client is None:
+            from ona.core.db.supabase_client import supabase
+            db_client = supabase
+        self.db_client = db_client
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self._ids: "OrderedDict[Any, int]" = OrderedDict()
+        self._missing: "OrderedDict[Any, float]" = OrderedDict()
+
+        # Метрики
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _expire_missing(self, now: float):
+        """
+        Удаление истекших отметок об отсутствии (они всегда в начале словаря)
+        """
+        while self._missing:
+            telegram_id, expires_at = next(iter(self._missing.items()))
+            if expires_at > now:
+                break
+            self._missing.popitem(last=False)
+
+    def remember(self, telegram_id, user_id: int):
+        """
+        Сохранение известного соответствия (например, после создания пользователя)
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            user_id: users.id
+        """
+        self._missing.pop(telegram_id, None)
+        self._ids[telegram_id] = user_id
+        self._ids.move_to_end(telegram_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    async def resolve(self, telegram_id) -> Optional[int]:
+        """
+        Получение users.id по Telegram ID
+
+        Args:
+            telegram_id: Telegram ID пользователя
+
+        Returns:
+            Optional[int]: users.id или None, если пользователь не зарегистрирован
+        """
+        user_id = self._ids.get(telegram_id)
+        if user_id is not None:
+            self._ids.move_to_end(telegram_id)
+            self.hits += 1
+            return user_id
+
+        now = time.monotonic()
+        self._expire_missing(now)
+        if telegram_id in self._missing:
+            self.negative_hits += 1
+            return None
+
+        self.misses += 1
+        response = await execute(self.db_client.table("users").select("id").eq("telegram_id", telegram_id).limit(1))
+        if not response.data:
+            self._missing[telegram_id] = now + self.negative_ttl
+            self._missing.move_to_end(telegram_id)
+            while len(self._missing) > self.max_size:
+                self._missing.popitem(last=False)
+            return None
+
+        user_id = response.data[0]["id"]
+        self.remember(telegram_id, user_id)
+        return user_id
+
+    def invalidate(self, telegram_id=None):
+        """
+        Удаление записи (или всего кэша)
+
+        Args:
+            telegram_id: Telegram ID пользователя (по умолчанию - все пользователи)
+        """
+        if telegram_id is None:
+            self._ids.clear()
+            self._missing.clear()
+        else:
+            self._ids.pop(telegram_id, None)
+            self._missing.pop(telegram_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики кэша
+
+        Returns:
+            Dict[str, Any]: Размер кэша, попадания и промахи
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._ids),
+            "missing": len(self._missing),
+            "max_size": self.max_size,
+            "negative_ttl": self.negative_ttl,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Создание экземпляра кэша идентификаторов пользователей
+user_identity = UserIdentityMap(
+    max_size=settings.USER_ID_CACHE_MAX_SIZE,
+    negative_ttl=settings.USER_ID_NEGATIVE_TTL
+)
+metrics_registry.register("user_identity", user_identity.get_stats)
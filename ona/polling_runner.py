@@ -1,6 +1,7 @@
 import asyncio
 import logging
 from ona.core.services.telegram_service import TelegramService
+from ona.core.services.conversation_writer import conversation_writer
 
 logging.basicConfig(level=logging.INFO)
 
@@ -18,6 +19,8 @@ async def main():
 
     await service.app.stop()
     await service.app.shutdown()
+    # Запись сообщений диалога, оставшихся в буфере
+    await conversation_writer.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
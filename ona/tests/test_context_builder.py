@@ -0,0 +1,145 @@
+"""
+Тесты для сборки промпта чата по бюджету токенов
+"""
+import pytest
+from unittest import mock
+from ona.core.services.context_builder import SUMMARY_PREFIX, ContextBuilder, parse_created_at
+from ona.utils import tokens
+from ona.utils.tokens import count_message_tokens, count_tokens
+
+def row(index, text, is_user):
+    return {"message_text": text, "is_user": is_user, "created_at": f"2026-10-18T10:00:{index:02d}"}
+
+SYSTEM = "Ты - ONA, AI-наставник."
+
+def make_history():
+    # Старые длинные ответы и короткий последний обмен сообщениями
+    history = []
+    for index in range(0, 8, 2):
+        history.append(row(index, f"Вопрос {index}", True))
+        history.append(row(index + 1, "Длинный ответ наставника. " * 60, False))
+    history.append(row(8, "Как мне начать медитировать?", True))
+    history.append(row(9, "Начните с пяти минут утром.", False))
+    return history
+
+def test_history_fills_budget_newest_first():
+    """
+    Тест заполнения бюджета от новых сообщений к старым и расчета max_tokens
+    """
+    history = make_history()
+    builder = ContextBuilder(model="gpt-4", token_budget=2000, reply_min_tokens=300, reply_max_tokens=1000)
+    context = builder.build(42, SYSTEM, history, "Спасибо!")
+
+    assert context.prompt_tokens == count_message_tokens(context.messages, "gpt-4")
+    assert context.prompt_tokens <= 2000 - 300
+    # Вошли только последние сообщения, в хронологическом порядке
+    contents = [message["content"] for message in context.messages]
+    assert contents[0] == SYSTEM and contents[-1] == "Спасибо!"
+    assert contents[1:-1] == [r["message_text"] for r in history[-context.history_messages:]]
+    assert 2 <= context.history_messages < len(history)
+    # Следующее по старшинству сообщение не помещалось
+    skipped = history[-context.history_messages - 1]["message_text"]
+    assert context.prompt_tokens + count_tokens(skipped, "gpt-4") > 2000 - 300
+
+    assert context.max_tokens == min(1000, 2000 - context.prompt_tokens)
+    assert context.baseline_tokens > context.prompt_tokens
+    stats = builder.get_stats()
+    assert stats["last_prompt_tokens"] == context.prompt_tokens
+    assert stats["last_baseline_tokens"] == context.baseline_tokens
+
+    # Короткий диалог помещается целиком, ответ ограничен reply_max_tokens
+    context = builder.build(43, SYSTEM, history[-2:], "Спасибо!")
+    assert context.history_messages == 2
+    assert context.max_tokens == 1000
+
+@pytest.mark.asyncio
+async def test_dropped_messages_are_folded_into_summary():
+    """
+    Тест фонового сворачивания не вошедших сообщений в краткое содержание
+    """
+    history = make_history()
+    summarize = mock.AsyncMock(return_value="Пользователь спрашивает о практиках.")
+    builder = ContextBuilder(
+        model="gpt-4", token_budget=2000, reply_min_tokens=300, summarize=summarize, summary_min_messages=4
+    )
+
+    context = builder.build(42, SYSTEM, history, "Спасибо!")
+    dropped = history[:len(history) - context.history_messages]
+    await builder.wait()
+    summarize.assert_awaited_once_with(None, dropped)
+    assert builder.get_summary(42).until == dropped[-1]["created_at"]
+
+    # Краткое содержание входит в промпт, уже учтенные сообщения повторно не сворачиваются
+    context = builder.build(42, SYSTEM, history, "Спасибо!")
+    await builder.wait()
+    assert context.messages[1] == {"role": "system", "content": SUMMARY_PREFIX + "Пользователь спрашивает о практиках."}
+    assert summarize.await_count == 1
+
+    # Новые не вошедшие сообщения добавляются к текущему содержанию
+    history += [row(10 + index, "Еще один длинный ответ. " * 60, index % 2 == 0) for index in range(4)]
+    builder.build(42, SYSTEM, history, "Спасибо!")
+    await builder.wait()
+    previous, rows = summarize.await_args.args
+    assert previous == "Пользователь спрашивает о практиках."
+    assert rows[0] == history[len(dropped)]
+    assert builder.get_stats()["summary_updates"] == 2
+
+    # Ошибка составления содержания не мешает сборке промпта
+    summarize.side_effect = RuntimeError("timeout")
+    builder.build(43, SYSTEM, history, "Спасибо!")
+    await builder.wait()
+    assert builder.get_stats()["summary_errors"] == 1
+    assert builder.get_summary(43) is None
+
+@pytest.mark.asyncio
+async def test_summary_is_not_repeated_when_window_moves():
+    """
+    Тест того, что сообщения до конца краткого содержания не сворачиваются
+    повторно, когда оно вышло за окно истории или время записано в другом формате
+    """
+    summarize = mock.AsyncMock(side_effect=lambda previous, rows: f"содержание до {rows[-1]['created_at']}")
+    builder = ContextBuilder(
+        model="gpt-4", token_budget=2000, reply_min_tokens=300, summarize=summarize, summary_min_messages=4
+    )
+    history = [row(index, "Длинный ответ наставника. " * 60, index % 2 == 0) for index in range(12)]
+    builder.build(42, SYSTEM, history, "Спасибо!")
+    await builder.wait()
+    until = builder.get_summary(42).until
+
+    # Из базы время приходит с часовым поясом, а строки until в окне истории уже нет
+    reloaded = [dict(r, created_at=r["created_at"] + "+00:00") for r in history if r["created_at"] != until]
+    reloaded += [row(20 + index, "Новый длинный ответ. " * 60, index % 2 == 0) for index in range(6)]
+    context = builder.build(42, SYSTEM, reloaded, "Спасибо!")
+    await builder.wait()
+
+    previous, rows = summarize.await_args.args
+    assert previous == f"содержание до {until}"
+    dropped = reloaded[:len(reloaded) - context.history_messages]
+    assert rows and rows == [r for r in dropped if parse_created_at(r["created_at"]) > parse_created_at(until)]
+    assert len(rows) < len(dropped)
+    assert summarize.await_count == 2
+
+def test_token_count_without_tiktoken():
+    """
+    Тест приближенного подсчета токенов без tiktoken
+    """
+    with mock.patch.object(tokens, "tiktoken", None):
+        assert count_tokens("") == 0
+        assert count_tokens("abcd") == 1
+        assert count_tokens("привет") == 3
+        assert count_message_tokens([{"role": "user", "content": "abcd"}]) == tokens.REPLY_OVERHEAD + tokens.MESSAGE_OVERHEAD + 1 + 1
+
+def test_encoding_load_failure_falls_back_to_estimate():
+    """
+    Тест приближенного подсчета, если кодировку tiktoken не удалось загрузить
+    (например, без сети), без повторной загрузки на каждом вызове
+    """
+    broken = mock.Mock()
+    broken.encoding_for_model.side_effect = OSError("network is unreachable")
+    tokens._load_encoding.cache_clear()
+    with mock.patch.object(tokens, "tiktoken", broken), mock.patch.object(tokens, "_encoding_failed", False):
+        assert tokens.preload_encoding("gpt-4") is False
+        assert count_tokens("abcd") == 1
+        assert count_tokens("привет", "gpt-4o") == 3
+        assert broken.encoding_for_model.call_count == 1
+    tokens._load_encoding.cache_clear()
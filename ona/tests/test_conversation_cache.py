@@ -0,0 +1,107 @@
+"""
+Тесты для кэша последних сообщений диалога
+"""
+import asyncio
+import pytest
+from unittest import mock
+from ona.core.services.conversation_cache import ROW_OVERHEAD, ConversationCache
+from ona.core.services.session_context import SessionContextManager
+
+def rows(count, start=0):
+    return [{"message_text": f"m{i}", "is_user": i % 2 == 0, "created_at": str(i)} for i in range(start, start + count)]
+
+@pytest.mark.asyncio
+async def test_active_users_read_history_from_memory():
+    """
+    Тест загрузки истории при промахе и дальнейшей работы без запросов к базе
+    """
+    cache = ConversationCache(max_messages=4)
+    load = mock.AsyncMock(return_value=rows(3))
+
+    assert [row["message_text"] for row in await cache.get(42, 3, load)] == ["m0", "m1", "m2"]
+    load.assert_awaited_once_with(3)
+
+    # Сохраненные сообщения добавляются в буфер, старые вытесняются
+    for index in range(3, 6):
+        cache.append(42, f"m{index}", is_user=index % 2 == 0, created_at=str(index))
+        history = await cache.get(42, 3, load)
+        assert [row["message_text"] for row in history] == [f"m{index - 2}", f"m{index - 1}", f"m{index}"]
+    assert load.await_count == 1
+    assert cache.get_stats()["messages"] == 4
+
+    # Буфер не содержит более старых сообщений - их загружают из базы
+    await cache.get(42, 10, mock.AsyncMock(return_value=rows(6)))
+    assert cache.get_stats()["misses"] == 2
+
+    # У нового пользователя сообщений меньше лимита: история полная
+    empty = mock.AsyncMock(return_value=[])
+    assert await cache.get(43, 10, empty) == []
+    cache.append(43, "привет", is_user=True)
+    assert [row["message_text"] for row in await cache.get(43, 10, empty)] == ["привет"]
+    assert empty.await_count == 1
+
+    # Сообщения пользователей не из кэша не добавляются
+    cache.append(44, "привет", is_user=True)
+    assert cache.get_stats()["users"] == 2
+
+@pytest.mark.asyncio
+async def test_memory_limit_evicts_idle_users():
+    """
+    Тест вытеснения пользователей, которые дольше всех не писали
+    """
+    row_size = len("m0".encode("utf-8")) + ROW_OVERHEAD
+    cache = ConversationCache(max_messages=10, max_bytes=row_size * 5)
+
+    for user_id in (1, 2):
+        await cache.get(user_id, 2, mock.AsyncMock(return_value=rows(2)))
+    cache.append(1, "m2", is_user=True)
+    assert cache.bytes == row_size * 5
+
+    # Пользователь 2 дольше не писал и вытесняется первым
+    await cache.get(3, 1, mock.AsyncMock(return_value=rows(1)))
+    assert not cache.covers(2, 1)
+    assert cache.covers(1, 3) and cache.covers(3, 1)
+    assert cache.bytes == row_size * 4
+    assert cache.get_stats()["evictions"] == 1
+
+@pytest.mark.asyncio
+async def test_message_saved_during_load_is_not_lost():
+    """
+    Тест того, что загрузка, во время которой сохранено сообщение, не попадает в кэш
+    """
+    cache = ConversationCache()
+    loaded = asyncio.Event()
+
+    async def load(limit):
+        await loaded.wait()
+        return rows(2)
+
+    task = asyncio.create_task(cache.get(42, 10, load))
+    await asyncio.sleep(0)
+    cache.append(42, "новое", is_user=True)
+    loaded.set()
+    assert len(await task) == 2
+    assert not cache.covers(42, 1)
+
+    reload = mock.AsyncMock(return_value=rows(2) + [{"message_text": "новое", "is_user": True, "created_at": "2"}])
+    assert (await cache.get(42, 10, reload))[-1]["message_text"] == "новое"
+    reload.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_session_context_skips_cached_history():
+    """
+    Тест того, что контекст обновления не загружает историю, которая уже в кэше
+    """
+    cache = ConversationCache()
+    await cache.get(42, 10, mock.AsyncMock(return_value=rows(10)))
+    loader = mock.Mock()
+    loader.fetch = mock.AsyncMock(return_value={"user": {"id": 7, "telegram_id": 42}, "history": []})
+    manager = SessionContextManager(loader=loader)
+
+    with mock.patch("ona.core.services.session_context.conversation_cache", cache):
+        async with manager.scope(42) as session:
+            await session.get_user()
+        async with manager.scope(43) as session:
+            await session.get_user()
+
+    assert [call.args for call in loader.fetch.await_args_list] == [(42, 0), (43, 10)]
@@ -0,0 +1,74 @@
+"""
+Тесты для пакетной записи сообщений диалога
+"""
+import asyncio
+import pytest
+from ona.core.services.conversation_writer import ConversationWriter
+
+class RecordingBackend:
+    """
+    Хранилище, запоминающее вставленные пакеты
+    """
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def insert(self, rows):
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(rows))
+
+@pytest.mark.asyncio
+async def test_rows_are_flushed_in_batches_preserving_order():
+    """
+    Тест записи пакетом по количеству строк и по таймеру с сохранением порядка
+    """
+    backend = RecordingBackend()
+    writer = ConversationWriter(backend=backend, max_batch=4, flush_interval=0.05)
+
+    # Обмен сообщениями двух пользователей между переключениями цикла событий
+    for index in range(3):
+        writer.add(1, f"вопрос {index}", is_user=True)
+        writer.add(1, f"ответ {index}", is_user=False)
+        writer.add(2, f"вопрос {index}", is_user=True)
+        await asyncio.sleep(0)
+    assert writer.has_pending(1)
+
+    # Пакет из max_batch строк записывается сразу, остаток - по таймеру
+    await asyncio.sleep(0.1)
+    assert [len(batch) for batch in backend.batches] == [6, 3]
+    assert not writer.has_pending(1)
+
+    rows = [row for batch in backend.batches for row in batch]
+    created_at = [row["created_at"] for row in rows]
+    assert created_at == sorted(created_at)
+    assert len(set(created_at)) == len(created_at)
+    assert [row["message_text"] for row in rows if row["user_id"] == 1] == [
+        "вопрос 0", "ответ 0", "вопрос 1", "ответ 1", "вопрос 2", "ответ 2"
+    ]
+
+    stats = writer.get_stats()
+    assert stats["written"] == 9
+    assert stats["flushes"] == 2
+    assert stats["max_flush_size"] == 6
+    assert stats["lag"]["count"] == 9
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_and_close_writes_them():
+    """
+    Тест повторной записи после ошибки базы и записи буфера при остановке
+    """
+    backend = RecordingBackend(failures=1)
+    writer = ConversationWriter(backend=backend, max_batch=100, flush_interval=60)
+
+    writer.add(1, "первое")
+    assert await writer.flush() == 0
+    writer.add(1, "второе")
+    assert writer.get_stats()["buffered"] == 2
+
+    await writer.close()
+    assert [[row["message_text"] for row in batch] for batch in backend.batches] == [["первое", "второе"]]
+    assert writer.get_stats()["failed_flushes"] == 1
+    assert writer.get_stats()["buffered"] == 0
@@ -0,0 +1,76 @@
+"""
+Тесты для выполнения запросов к Supabase в пуле потоков
+"""
+import asyncio
+import threading
+import time
+import pytest
+from unittest import mock
+from ona.core.db.executor import DbExecutor
+from ona.core.db import supabase_client
+
+class BlockingQuery:
+    """
+    Запрос, блокирующий поток на время сетевого обращения
+    """
+    def __init__(self, delay, tracker):
+        self.delay = delay
+        self.tracker = tracker
+
+    def execute(self):
+        with self.tracker["lock"]:
+            self.tracker["active"] += 1
+            self.tracker["peak"] = max(self.tracker["peak"], self.tracker["active"])
+        time.sleep(self.delay)
+        with self.tracker["lock"]:
+            self.tracker["active"] -= 1
+        return mock.Mock(data=[{"id": 1}])
+
+@pytest.mark.asyncio
+async def test_slow_query_does_not_block_event_loop():
+    """
+    Тест того, что медленный запрос не останавливает обработку других пользователей
+    """
+    executor = DbExecutor(max_concurrency=2)
+    tracker = {"lock": threading.Lock(), "active": 0, "peak": 0}
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    beat = asyncio.create_task(heartbeat())
+    with mock.patch.object(supabase_client, "db_executor", executor):
+        response = await supabase_client.execute(BlockingQuery(0.3, tracker))
+    beat.cancel()
+    executor.shutdown()
+
+    assert response.data == [{"id": 1}]
+    # Цикл событий продолжал работать, пока запрос ждал ответа
+    assert ticks >= 10
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_limits_parallel_queries():
+    """
+    Тест ограничения количества одновременных запросов к базе
+    """
+    executor = DbExecutor(max_concurrency=2)
+    tracker = {"lock": threading.Lock(), "active": 0, "peak": 0}
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(executor.run(BlockingQuery(0.05, tracker).execute) for _ in range(6)))
+    elapsed = time.perf_counter() - started_at
+
+    assert tracker["peak"] == 2
+    assert elapsed >= 0.15
+    stats = executor.get_stats()
+    assert stats["calls"] == 6
+    assert stats["pending"] == 0
+    assert stats["in_flight"] == 0
+
+    # После остановки пул создается заново
+    executor.shutdown()
+    await executor.run(BlockingQuery(0, tracker).execute)
+    executor.shutdown()
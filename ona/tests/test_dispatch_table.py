@@ -0,0 +1,83 @@
+"""
+Тесты для формата callback_data и таблицы переходов FSM
+"""
+import pytest
+from unittest import mock
+from ona.utils.callback_data import ANSWER, PRACTICE, CallbackData, decode, encode
+from ona.utils.dispatch_table import CALLBACK_QUERY, MESSAGE, DispatchTable, Route, get_update_route
+from ona.core.fsm.handlers.registration_handler import RegistrationHandler, STATES
+
+def test_callback_data_round_trip_and_legacy_format():
+    """
+    Тест кодирования callback_data и разбора кнопок старого формата
+    """
+    data = encode(ANSWER, 3, "b")
+    assert data == "1:a:3:b"
+    assert decode(data) == CallbackData(ANSWER, ("3", "b"), 1)
+    assert decode(encode(PRACTICE, "sleep")) == CallbackData(PRACTICE, ("sleep",), 1)
+
+    # Кнопки из уже отправленных сообщений
+    assert decode("answer_3_b") == CallbackData(ANSWER, ("3", "b"), 0)
+    assert decode("practice_sleep") == CallbackData(PRACTICE, ("sleep",), 0)
+    assert decode("start_profiling") == CallbackData("start_profiling")
+
+    # Неизвестная версия формата не разбирается
+    assert decode("9:a:3:b").action is None
+
+    with pytest.raises(ValueError):
+        encode(PRACTICE, "a:b")
+    with pytest.raises(ValueError):
+        encode(PRACTICE, "x" * 64)
+
+@pytest.mark.asyncio
+async def test_dispatch_table_prefers_most_specific_route():
+    """
+    Тест выбора обработчика: действие callback, затем тип обновления, затем состояние
+    """
+    handler = mock.Mock()
+    handler.on_answer = mock.AsyncMock()
+    handler.on_callback = mock.AsyncMock()
+    handler.handle = mock.AsyncMock()
+
+    table = DispatchTable()
+    table.compile(handler, [
+        Route("quiz", CALLBACK_QUERY, ANSWER, "on_answer"),
+        Route("quiz", CALLBACK_QUERY, None, "on_callback"),
+        Route("quiz", None, None, "handle"),
+    ])
+
+    answer = mock.Mock(callback_query=mock.Mock(data=encode(ANSWER, 0, "a")))
+    assert get_update_route(answer) == (CALLBACK_QUERY, ANSWER)
+    await table.lookup("quiz", *get_update_route(answer))(answer)
+    handler.on_answer.assert_awaited_once_with(answer)
+
+    other = mock.Mock(callback_query=mock.Mock(data="next_stage"))
+    assert table.lookup("quiz", *get_update_route(other)) is handler.on_callback
+
+    message = mock.Mock(callback_query=None)
+    assert get_update_route(message) == (MESSAGE, None)
+    assert table.lookup("quiz", *get_update_route(message)) is handler.handle
+    assert table.lookup("unknown", MESSAGE) is None
+
+    # Повторное обновление находится по запомненному маршруту, новая строка сбрасывает его
+    assert table.match("quiz", answer) is handler.on_answer
+    assert table.match("quiz", other) is handler.on_callback
+    handler.on_next = mock.AsyncMock()
+    table.add(Route("quiz", CALLBACK_QUERY, "next_stage", "on_next"), handler)
+    assert table.match("quiz", other) is handler.on_next
+
+    with pytest.raises(ValueError):
+        table.add(Route("quiz", None, None, "missing_method"), object())
+
+def test_registration_routes_cover_every_substate():
+    """
+    Тест того, что каждое подсостояние регистрации попадает сразу в свой метод
+    """
+    handler = RegistrationHandler()
+    table = DispatchTable()
+    table.compile(handler)
+
+    assert len(table) == len(STATES)
+    assert table.lookup(STATES["BIRTH_DATE"], MESSAGE) == handler.handle_birth_date
+    assert table.lookup(STATES["AGE"], MESSAGE) == handler.handle_age
+    assert table.lookup(STATES["PROFILING_NATAL"], MESSAGE) == handler.handle_start
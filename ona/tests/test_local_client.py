@@ -0,0 +1,87 @@
+"""
+Тесты для локального клиента базы на SQLite
+"""
+import pytest
+from unittest import mock
+from ona.core.db import supabase_client
+from ona.core.db.local_client import LocalAPIError, LocalClient
+from ona.core.db.projections import PROFILE_PSYCHOLOGY_PROGRESS
+from ona.core.services.conversation_writer import ConversationWriter, SupabaseConversationBackend
+from ona.core.services.session_context import SupabaseSessionLoader
+from ona.core.services.state_store import SupabaseStateBackend
+
+@pytest.mark.asyncio
+async def test_data_access_functions_work_offline():
+    """
+    Тест функций доступа к данным и загрузки контекста без Supabase
+    """
+    client = LocalClient()
+    with mock.patch.object(supabase_client, "supabase", client):
+        user = await supabase_client.create_user(42, first_name="Анна")
+        assert (await supabase_client.get_user_by_telegram_id(42))["id"] == user["id"]
+
+        first = await supabase_client.upsert_profile({"user_id": 42, "birth_place": "Москва"})
+        second = await supabase_client.upsert_profile({
+            "user_id": 42, "psychology_progress": 3, "psychology_answers": {"0": {"option_id": "a"}}
+        })
+        # Upsert меняет только переданные поля и сохраняет время создания
+        assert second["id"] == first["id"]
+        assert second["birth_place"] == "Москва"
+        assert second["created_at"] == first["created_at"]
+        assert await supabase_client.get_profile(42, PROFILE_PSYCHOLOGY_PROGRESS) == {
+            "user_id": 42, "psychology_progress": 3
+        }
+
+        writer = ConversationWriter(backend=SupabaseConversationBackend(db_client=client))
+        for index in range(3):
+            writer.add(42, f"сообщение {index}", is_user=index % 2 == 0)
+        await writer.flush()
+        history = await supabase_client.get_user_conversation_history(42, limit=2)
+        assert [(row["message_text"], row["is_user"]) for row in history] == [
+            ("сообщение 2", True), ("сообщение 1", False)
+        ]
+
+        context = await SupabaseSessionLoader(db_client=client).fetch(42, history_limit=10)
+        assert context["user"]["telegram_id"] == 42
+        assert context["profile"]["psychology_answers"] == {"0": {"option_id": "a"}}
+        assert context["subscription"] is None
+        assert [row["message_text"] for row in context["history"]][0] == "сообщение 0"
+
+    assert client.get_stats()["calls"]["profiles"] == 3
+
+@pytest.mark.asyncio
+async def test_unique_violations_match_postgrest_errors():
+    """
+    Тест того, что конфликт версий состояния обрабатывается так же, как с Supabase
+    """
+    backend = SupabaseStateBackend(db_client=LocalClient())
+
+    assert await backend.compare_and_set(42, "REGISTRATION_START", 0)
+    # Строку уже создал другой обработчик (ошибка 23505)
+    assert not await backend.compare_and_set(42, "CHAT", 0)
+    assert await backend.compare_and_set(42, "REGISTRATION_BIRTH_DATE", 1)
+    assert not await backend.compare_and_set(42, "CHAT", 1)
+    assert await backend.load(42) == ("REGISTRATION_BIRTH_DATE", 2)
+
+@pytest.mark.asyncio
+async def test_fault_injection():
+    """
+    Тест внедрения отказов: запрос завершается ошибкой, буфер сохраняет строки
+    """
+    client = LocalClient()
+    writer = ConversationWriter(backend=SupabaseConversationBackend(db_client=client), flush_interval=60)
+
+    client.fail_next()
+    writer.add(42, "сообщение")
+    assert await writer.flush() == 0
+    assert await writer.flush() == 1
+    assert client.get_stats()["faults"] == 1
+
+    with pytest.raises(LocalAPIError) as error:
+        await supabase_client.execute(client.table("unknown").select("*"))
+    assert error.value.code == "42P01"
+
+    # Все запросы завершаются ошибкой при fault_rate = 1
+    failing = LocalClient(fault_rate=1.0, seed=1)
+    with pytest.raises(LocalAPIError):
+        await supabase_client.execute(failing.table("users").select("id"))
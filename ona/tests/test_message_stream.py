@@ -0,0 +1,88 @@
+"""
+Тесты для постепенного вывода ответа в Telegram
+"""
+import pytest
+from ona.utils.message_stream import MessageStream, StreamStats, split_message, telegram_length
+
+class FakeMessage:
+    """
+    Отправленное сообщение, запоминающее правки
+    """
+    def __init__(self, text):
+        self.text = text
+        self.edits = []
+
+    async def edit_text(self, text):
+        self.text = text
+        self.edits.append(text)
+
+class FakeChat:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, text):
+        message = FakeMessage(text)
+        self.messages.append(message)
+        return message
+
+@pytest.mark.asyncio
+async def test_first_tokens_are_sent_and_edits_are_throttled():
+    """
+    Тест отправки первого сообщения сразу и редкого редактирования
+    """
+    chat = FakeChat()
+    stats = StreamStats()
+    stream = MessageStream(chat.send, edit_interval=60, stats=stats)
+
+    await stream.feed("\n")
+    assert chat.messages == []
+    for delta in ["При", "вет", ", ", "как ", "дела?"]:
+        await stream.feed(delta)
+
+    # Первое сообщение отправлено сразу, правки ждут интервала
+    assert [message.text for message in chat.messages] == ["\nПри"]
+    assert chat.messages[0].edits == []
+
+    assert await stream.finish()
+    assert chat.messages[0].edits == ["\nПривет, как дела?"]
+    assert stats.messages == 1
+    assert stats.edits == 1
+    assert stats.first_visible_text.count == 1
+
+    # Без интервала каждый фрагмент сразу виден
+    chat = FakeChat()
+    stream = MessageStream(chat.send, edit_interval=0, stats=StreamStats())
+    for delta in ["a", "b", "c"]:
+        await stream.feed(delta)
+    assert chat.messages[0].edits == ["ab", "abc"]
+
+    # Пустой ответ не отправляется
+    assert not await MessageStream(FakeChat().send, stats=StreamStats()).finish()
+
+@pytest.mark.asyncio
+async def test_long_answer_is_split_at_message_limit():
+    """
+    Тест переноса текста в новое сообщение на границе длины сообщения
+    """
+    chat = FakeChat()
+    stream = MessageStream(chat.send, edit_interval=60, limit=40, stats=StreamStats())
+    words = [f"слово{index} " for index in range(12)]
+    for word in words:
+        await stream.feed(word)
+    await stream.finish()
+
+    texts = [message.text for message in chat.messages]
+    assert len(texts) > 1
+    assert all(telegram_length(text) <= 40 for text in texts)
+    # Сообщения разрезаны по пробелам, без потери слов
+    assert " ".join(texts).split() == "".join(words).split()
+
+def test_split_counts_utf16_units():
+    """
+    Тест того, что длина считается в единицах UTF-16, как в Telegram
+    """
+    text = "😀" * 10
+    head, tail = split_message(text, limit=5)
+    assert head == "😀" * 2
+    assert tail == "😀" * 8
+    assert split_message("коротко", limit=10) == ("коротко", "")
@@ -0,0 +1,161 @@
+"""
+Тесты индексов для частых запросов: нужные индексы объявлены в миграциях,
+а план выполнения каждого запроса использует индекс (EXPLAIN в Postgres
+и EXPLAIN QUERY PLAN в SQLite)
+"""
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+import pytest
+from ona.core.db.local_client import LocalClient, _encode
+
+DB_DIR = Path(__file__).resolve().parents[1] / "core" / "db"
+MIGRATIONS_DIR = DB_DIR / "migrations"
+
+# Частые запросы сервисов в SQL, который строит PostgREST
+HOT_QUERIES = {
+    "conversation_history": (
+        "SELECT message_text, is_user, created_at FROM conversations "
+        "WHERE user_id = %s ORDER BY created_at DESC LIMIT 10",
+        (42,),
+    ),
+    "active_subscription": (
+        "SELECT id, plan_type, status, start_date, end_date FROM subscriptions "
+        "WHERE user_id = %s AND status = 'active' AND end_date >= %s ORDER BY end_date DESC LIMIT 1",
+        (7, datetime(2026, 10, 18)),
+    ),
+    "subscription_by_payment": (
+        "SELECT id, plan_type FROM subscriptions WHERE payment_id = %s",
+        ("payment-1",),
+    ),
+    "user_by_telegram_id": (
+        "SELECT id FROM users WHERE telegram_id = %s LIMIT 1",
+        (42,),
+    ),
+    "profile_by_user_id": (
+        "SELECT user_id, psychology_progress FROM profiles WHERE user_id = %s LIMIT 1",
+        (42,),
+    ),
+}
+
+# Индексы, которые нужны частым запросам: таблица, первые столбцы индекса
+# и нужна ли уникальность (upsert по столбцу)
+REQUIRED_INDEXES = {
+    "conversation_history": ("conversations", ("user_id", "created_at desc"), False),
+    "active_subscription": ("subscriptions", ("user_id", "status", "end_date desc"), False),
+    "subscription_by_payment": ("subscriptions", ("payment_id",), False),
+    "user_by_telegram_id": ("users", ("telegram_id",), True),
+    "profile_by_user_id": ("profiles", ("user_id",), True),
+}
+
+INDEX_STATEMENT = re.compile(
+    r"CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(?P<name>\w+)\s+"
+    r"ON\s+(?P<table>\w+)\s*\((?P<columns>[^)]*)\)"
+    r"|DROP\s+INDEX\s+(?:IF\s+EXISTS\s+)?(?P<dropped>\w+)",
+    re.IGNORECASE
+)
+
+def migration_indexes():
+    """
+    Индексы, объявленные миграциями после их применения по порядку
+
+    Returns:
+        Dict[str, tuple]: Имя индекса -> (таблица, столбцы, уникальный, файл миграции)
+    """
+    indexes = {}
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        sql = re.sub(r"--[^\n]*", "", path.read_text(encoding="utf-8"))
+        for match in INDEX_STATEMENT.finditer(sql):
+            if match.group("dropped"):
+                indexes.pop(match.group("dropped").lower(), None)
+                continue
+            columns = tuple(" ".join(column.split()).lower() for column in match.group("columns").split(","))
+            indexes[match.group("name").lower()] = (
+                match.group("table").lower(), columns, bool(match.group("unique")), path
+            )
+    return indexes
+
+def find_required_index(name):
+    """
+    Миграции, в которых объявлен индекс, подходящий частому запросу
+
+    Args:
+        name: Имя запроса из REQUIRED_INDEXES
+
+    Returns:
+        List[Path]: Файлы миграций с подходящими индексами
+    """
+    table, columns, unique = REQUIRED_INDEXES[name]
+    return [
+        path
+        for index_table, index_columns, index_unique, path in migration_indexes().values()
+        if index_table == table
+        and index_columns[:len(columns)] == columns
+        and (index_unique or not unique)
+    ]
+
+# Таблица subscriptions из supabase_setup.sql (в schema.sql ее нет)
+SUBSCRIPTIONS_DDL = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    plan_type TEXT,
+    status TEXT,
+    start_date TIMESTAMP,
+    end_date TIMESTAMP,
+    payment_id TEXT
+);
+"""
+
+@pytest.mark.parametrize("name", sorted(REQUIRED_INDEXES))
+def test_migrations_declare_hot_query_indexes(name):
+    """
+    Тест того, что индекс для частого запроса объявлен в файлах миграций
+    (а не только в схеме LocalClient)
+    """
+    table, columns, _ = REQUIRED_INDEXES[name]
+    assert find_required_index(name), f"{name}: в миграциях нет индекса {table}({', '.join(columns)})"
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_local_schema_uses_index(name):
+    """
+    Тест того, что локальная база (LocalClient) выполняет частые запросы по индексам
+    """
+    sql, params = HOT_QUERIES[name]
+    client = LocalClient()
+    plan = [row["detail"] for row in client._connection.execute(
+        "EXPLAIN QUERY PLAN " + sql.replace("%s", "?"), [_encode(value) for value in params]
+    )]
+
+    assert any("USING" in step and "INDEX" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+@pytest.mark.skipif(not os.getenv("ONA_TEST_DATABASE_URL"), reason="ONA_TEST_DATABASE_URL не задан")
+def test_postgres_migration_indexes_cover_hot_queries():
+    """
+    Тест миграции на локальном Postgres: каждый частый запрос выполняется по индексу
+    """
+    psycopg = pytest.importorskip("psycopg")
+    schema = f"ona_explain_{os.getpid()}"
+
+    with psycopg.connect(os.environ["ONA_TEST_DATABASE_URL"], autocommit=True) as connection:
+        connection.execute(f"CREATE SCHEMA {schema}")
+        try:
+            connection.execute(f"SET search_path TO {schema}")
+            connection.execute((DB_DIR / "schema.sql").read_text(encoding="utf-8"))
+            connection.execute(SUBSCRIPTIONS_DDL)
+            # Миграции с индексами частых запросов, в порядке применения
+            for path in sorted({path for name in REQUIRED_INDEXES for path in find_required_index(name)}):
+                connection.execute(path.read_text(encoding="utf-8"))
+            # На пустых таблицах планировщик выбрал бы последовательное чтение
+            connection.execute("SET enable_seqscan = off")
+
+            for name, (sql, params) in HOT_QUERIES.items():
+                plan = "\n".join(row[0] for row in connection.execute("EXPLAIN " + sql, params))
+                assert "Index" in plan, f"{name}:\n{plan}"
+                assert "Seq Scan" not in plan, f"{name}:\n{plan}"
+                assert "Sort" not in plan, f"{name}:\n{plan}"
+        finally:
+            connection.execute(f"DROP SCHEMA {schema} CASCADE")
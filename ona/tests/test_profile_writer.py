@@ -0,0 +1,96 @@
+"""
+Тесты для объединения записей полей профиля
+"""
+import asyncio
+import pytest
+from unittest import mock
+from ona.core.services.profile_service import ProfileService
+from ona.core.services.session_context import SessionContextManager
+
+def make_db_client():
+    db_client = mock.Mock()
+    db_client.upsert_profile = mock.AsyncMock(side_effect=lambda data: dict(data))
+    db_client.get_profile = mock.AsyncMock(return_value=None)
+    return db_client
+
+@pytest.mark.asyncio
+async def test_writes_in_one_update_become_one_upsert():
+    """
+    Тест того, что записи полей во время обновления выполняются одним upsert при его завершении
+    """
+    loader = mock.Mock()
+    loader.fetch = mock.AsyncMock(return_value={"profile": None})
+    manager = SessionContextManager(loader=loader)
+    db_client = make_db_client()
+    service = ProfileService(db_client=db_client)
+
+    with mock.patch("ona.core.services.profile_service.session_contexts", manager), \
+            mock.patch("ona.core.services.profile_writer.session_contexts", manager):
+        async with manager.scope(42):
+            await service.save_natal_data(42, {"birth_date": "01.01.1990", "birth_place": "Москва", "age": 35})
+            await service.update_profile_field(42, "psychology_progress", 1)
+            await service.update_profile_field(42, "psychology_answers", {"0": "a"})
+            await service.update_profile_field(42, "psychology_progress", 2)
+
+            # До записи в базу поля видны в контексте обновления
+            assert await service.is_natal_data_complete(42)
+            assert (await service.get_profile(42))["psychology_progress"] == 2
+            db_client.upsert_profile.assert_not_awaited()
+
+    db_client.upsert_profile.assert_awaited_once()
+    db_client.get_profile.assert_not_awaited()
+    profile_data = db_client.upsert_profile.await_args.args[0]
+    assert profile_data["user_id"] == 42
+    assert profile_data["birth_place"] == "Москва"
+    assert profile_data["psychology_progress"] == 2
+    assert profile_data["psychology_answers"] == {"0": "a"}
+    assert service.writer.get_stats()["coalesced"] == 3
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_outside_update_share_one_upsert():
+    """
+    Тест объединения одновременных записей одного профиля в окне
+    """
+    db_client = make_db_client()
+    service = ProfileService(db_client=db_client, write_window=0.01)
+
+    results = await asyncio.gather(
+        service.update_profile_field(42, "psychology_progress", 1),
+        service.update_profile_field(42, "psychology_profile", "profile"),
+        service.update_profile_field(43, "psychology_progress", 5),
+    )
+
+    assert db_client.upsert_profile.await_count == 2
+    assert results[0] == results[1]
+    assert results[0]["psychology_profile"] == "profile"
+    assert results[2]["user_id"] == 43
+
+    # Запись после окна выполняется отдельно
+    await service.update_profile_field(42, "psychology_progress", 2)
+    assert db_client.upsert_profile.await_count == 3
+
+@pytest.mark.asyncio
+async def test_failed_deferred_write_is_counted_and_fails_the_update():
+    """
+    Тест того, что ошибка отложенной записи профиля не теряется при завершении обновления
+    """
+    loader = mock.Mock()
+    loader.fetch = mock.AsyncMock(return_value={"profile": None})
+    manager = SessionContextManager(loader=loader)
+    db_client = make_db_client()
+    db_client.upsert_profile.side_effect = RuntimeError("there is no unique constraint matching the ON CONFLICT specification")
+    service = ProfileService(db_client=db_client)
+    other = mock.AsyncMock()
+
+    with mock.patch("ona.core.services.profile_service.session_contexts", manager), \
+            mock.patch("ona.core.services.profile_writer.session_contexts", manager):
+        with pytest.raises(RuntimeError):
+            async with manager.scope(42) as session:
+                assert await service.update_profile_field(42, "psychology_progress", 1) is True
+                session.on_close("other", other)
+
+    # Остальные действия при завершении выполняются
+    other.assert_awaited_once()
+    assert service.writer.get_stats()["deferred_errors"] == 1
+    assert service.writer.get_stats()["errors"] == 1
+    assert manager.get_stats()["close_errors"] == 1
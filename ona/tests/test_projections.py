@@ -0,0 +1,40 @@
+"""
+Тесты для проекций столбцов
+"""
+import pytest
+from unittest import mock
+from ona.core.db import supabase_client
+from ona.core.db.projections import PROFILE_NATAL, PROFILE_PSYCHOLOGY_PROGRESS, Projection
+from ona.core.services.profile_service import ProfileService
+
+def test_projection_validates_columns():
+    """
+    Тест проверки имен таблиц и столбцов при создании проекции
+    """
+    projection = Projection("profiles", "user_id", "psychology_progress", "user_id")
+    assert projection.clause == "user_id,psychology_progress"
+    assert "psychology_progress" in projection
+    assert (PROFILE_PSYCHOLOGY_PROGRESS + PROFILE_NATAL).clause == \
+        "user_id,psychology_progress,birth_date,birth_time,birth_place,age"
+
+    with pytest.raises(ValueError):
+        Projection("profiles", "psychology_progres")
+    with pytest.raises(ValueError):
+        Projection("profile", "user_id")
+
+@pytest.mark.asyncio
+async def test_profile_reads_select_only_projected_columns():
+    """
+    Тест того, что чтение профиля вне обновления выбирает только нужные столбцы
+    """
+    db_client = mock.MagicMock()
+    query = db_client.table.return_value.select.return_value.eq.return_value.limit.return_value
+    query.execute.return_value = mock.Mock(data=[{"user_id": 42, "psychology_progress": 3}])
+
+    with mock.patch.object(supabase_client, "supabase", db_client):
+        service = ProfileService(db_client=supabase_client)
+        profile = await service.get_profile(42, PROFILE_PSYCHOLOGY_PROGRESS)
+
+    assert profile == {"user_id": 42, "psychology_progress": 3}
+    db_client.table.assert_called_once_with("profiles")
+    db_client.table.return_value.select.assert_called_once_with("user_id,psychology_progress")
@@ -0,0 +1,92 @@
+"""
+Тесты для хранилища сессий регистрации
+"""
+import asyncio
+import pytest
+from unittest import mock
+from ona.core.db.local_client import LocalClient
+from ona.core.services.registration_sessions import RegistrationSessionStore, SupabaseRegistrationSessionBackend
+
+@pytest.mark.asyncio
+async def test_sessions_are_isolated_between_users():
+    """
+    Тест того, что одновременные регистрации не перезаписывают данные друг друга
+    """
+    store = RegistrationSessionStore()
+
+    await asyncio.gather(*[
+        store.update(user_id, birth_date=f"0{user_id}.01.1990", age=20 + user_id)
+        for user_id in range(1, 6)
+    ])
+
+    for user_id in range(1, 6):
+        session = await store.get(user_id)
+        assert session.birth_date == f"0{user_id}.01.1990"
+        assert session.age == 20 + user_id
+
+    await store.discard(3)
+    assert (await store.get(3)).birth_date is None
+    assert store.get_stats()["completed"] == 1
+
+@pytest.mark.asyncio
+async def test_abandoned_sessions_expire_and_count_is_capped():
+    """
+    Тест удаления брошенных сессий по TTL и вытеснения при превышении лимита
+    """
+    store = RegistrationSessionStore(max_sessions=2, ttl=60)
+    for user_id in (1, 2, 3):
+        await store.update(user_id, birth_place="Москва")
+
+    assert len(store) == 2
+    assert store.get_stats()["evicted"] == 1
+
+    with mock.patch("ona.core.services.registration_sessions.time.monotonic", return_value=10 ** 9):
+        await store.get(4)
+    assert len(store) == 1
+    assert store.get_stats()["expired"] == 2
+
+@pytest.mark.asyncio
+async def test_session_is_restored_from_backend_after_restart():
+    """
+    Тест восстановления незавершенной регистрации из постоянного хранилища
+    """
+    saved = {}
+    backend = mock.AsyncMock()
+    backend.save.side_effect = lambda user_id, data: saved.__setitem__(user_id, data)
+    backend.load.side_effect = lambda user_id: saved.get(user_id)
+
+    await RegistrationSessionStore(backend=backend).update(7, birth_date="15.03.1990", birth_time="14:30")
+
+    # Новый процесс: памяти нет, данные берутся из хранилища
+    restarted = RegistrationSessionStore(backend=backend)
+    session = await restarted.get(7)
+    assert session.to_dict() == {
+        "birth_date": "15.03.1990",
+        "birth_time": "14:30",
+        "birth_place": None,
+        "age": None,
+    }
+    assert restarted.get_stats()["restored"] == 1
+
+    await restarted.discard(7)
+    backend.delete.assert_awaited_once_with(7)
+
+@pytest.mark.asyncio
+async def test_expired_session_is_not_restored_from_backend():
+    """
+    Тест того, что брошенная регистрация старше TTL не восстанавливается из хранилища
+    """
+    db_client = LocalClient()
+    backend = SupabaseRegistrationSessionBackend(db_client=db_client, ttl=60)
+    await RegistrationSessionStore(backend=backend).update(7, birth_date="15.03.1990")
+    await RegistrationSessionStore(backend=backend).update(8, birth_date="01.01.2000")
+    db_client.table("registration_sessions").update({"updated_at": "2020-01-01T00:00:00+00:00"}).eq("telegram_id", 7).execute()
+
+    restarted = RegistrationSessionStore(backend=backend)
+    assert (await restarted.get(7)).birth_date is None
+    assert (await restarted.get(8)).birth_date == "01.01.2000"
+    assert restarted.get_stats()["restored"] == 1
+
+    # Истекшая строка удалена из хранилища
+    rows = db_client.table("registration_sessions").select("telegram_id").execute().data
+    assert rows == [{"telegram_id": 8}]
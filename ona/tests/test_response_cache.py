@@ -0,0 +1,137 @@
+"""
+Тесты для кэша ответов модели (рекомендации и практики)
+"""
+import os
+import sys
+from datetime import date
+import pytest
+from unittest import mock
+
+# Сервисы импортируют модули как core.*
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ona.core.db.local_client import LocalClient
+from ona.core.services import recommendation_service as recommendation_module
+from ona.core.services.recommendation_service import RecommendationService
+from ona.core.services.response_cache import ResponseCache, SupabaseResponseCacheBackend, make_key
+
+PROFILE = {
+    "user_id": 42, "age": 30, "psychology_profile": "Открытый новому опыту",
+    "psychology_answers": {"0": {"option_id": "a"}}, "updated_at": "2026-10-18T10:00:00",
+}
+
+def make_service(cache, profile=PROFILE):
+    """
+    Сервис рекомендаций с подмененными OpenAI и профилем
+    """
+    service = RecommendationService(cache=cache)
+    service.openai_service = mock.Mock(model="gpt-4")
+    service.openai_service.client.chat.completions.create = mock.AsyncMock(side_effect=lambda **kwargs: mock.Mock(
+        choices=[mock.Mock(message=mock.Mock(content=f"ответ {service.openai_service.client.chat.completions.create.await_count}"))]
+    ))
+    service.profile_service = mock.Mock()
+    service.profile_service.get_profile = mock.AsyncMock(return_value=dict(profile))
+    service.save_recommendation = mock.AsyncMock(return_value=True)
+    service.save_practice = mock.AsyncMock(return_value=True)
+    return service
+
+@pytest.mark.asyncio
+async def test_repeated_requests_are_served_from_cache():
+    """
+    Тест того, что повторный запрос с тем же профилем не обращается к OpenAI
+    """
+    cache = ResponseCache()
+    service = make_service(cache)
+    create = service.openai_service.client.chat.completions.create
+
+    first = await service.generate_daily_recommendation(42)
+    assert await service.generate_daily_recommendation(42) == first
+    assert create.await_count == 1
+    service.save_recommendation.assert_awaited_once_with(42, first)
+
+    # Новый день - новая рекомендация
+    with mock.patch.object(recommendation_module, "date", mock.Mock(today=lambda: date(2099, 1, 1))):
+        assert await service.generate_daily_recommendation(42) != first
+    assert create.await_count == 2
+
+    # Принудительное обновление
+    refreshed = await service.generate_daily_recommendation(42, refresh=True)
+    assert refreshed != first
+    assert await service.generate_daily_recommendation(42) == refreshed
+    assert create.await_count == 3
+
+    # Практики разных типов кэшируются отдельно
+    for practice_type in ("stress", "sleep", "stress", "sleep"):
+        await service.generate_practice(42, practice_type)
+    assert create.await_count == 5
+
+    # Изменение профиля меняет промпт, служебные поля - нет
+    service.profile_service.get_profile.return_value = dict(PROFILE, updated_at="2026-10-19T10:00:00")
+    await service.generate_practice(42, "stress")
+    assert create.await_count == 5
+    service.profile_service.get_profile.return_value = dict(PROFILE, psychology_profile="Сдержанный")
+    await service.generate_practice(42, "stress")
+    assert create.await_count == 6
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 5
+    assert stats["misses"] == 5
+    assert stats["refreshes"] == 1
+    assert stats["hit_rate"] == 0.5
+
+    # Ошибка генерации не кэшируется
+    service.profile_service.get_profile.return_value = dict(PROFILE, age=31)
+    create.side_effect = RuntimeError("timeout")
+    assert await service.generate_practice(42, "energy") is None
+    assert cache.get_stats()["size"] == stats["size"]
+
+@pytest.mark.asyncio
+async def test_users_with_same_profile_get_their_own_responses():
+    """
+    Тест того, что ответ одного пользователя не отдается другому с тем же профилем
+    """
+    service = make_service(ResponseCache())
+    create = service.openai_service.client.chat.completions.create
+
+    first = await service.generate_practice(42, "sleep")
+    second = await service.generate_practice(43, "sleep")
+
+    assert first != second
+    assert create.await_count == 2
+    assert service.save_practice.await_args_list == [
+        mock.call(42, "sleep", first),
+        mock.call(43, "sleep", second),
+    ]
+
+@pytest.mark.asyncio
+async def test_persistent_backend_and_ttl():
+    """
+    Тест постоянного хранилища (общего для процессов) и истечения ответов
+    """
+    backend = SupabaseResponseCacheBackend(db_client=LocalClient())
+    key = make_key(kind="practice", model="gpt-4", version=1, profile={"age": 30}, practice_type="sleep")
+    create = mock.AsyncMock(return_value="практика")
+
+    assert await ResponseCache(backend=backend).get_or_create(key, create) == "практика"
+
+    # Другой процесс (или перезапуск) получает ответ из хранилища
+    restarted = ResponseCache(backend=backend)
+    assert await restarted.get_or_create(key, create) == "практика"
+    assert await restarted.get_or_create(key, create) == "практика"
+    assert create.await_count == 1
+    assert restarted.get_stats()["backend_hits"] == 1
+    assert restarted.get_stats()["hits"] == 1
+
+    # Истекший ответ генерируется заново
+    expiring = ResponseCache(ttl=-1, backend=SupabaseResponseCacheBackend(db_client=LocalClient()))
+    await expiring.get_or_create(key, create)
+    await expiring.get_or_create(key, create)
+    assert create.await_count == 3
+    assert expiring.get_stats()["expired"] == 1
+
+    # Недоступность хранилища не мешает генерации
+    failing = LocalClient()
+    failing.fail_next(2)
+    cache = ResponseCache(backend=SupabaseResponseCacheBackend(db_client=failing))
+    assert await cache.get_or_create(key, create) == "практика"
+    assert cache.get_stats()["backend_errors"] == 2
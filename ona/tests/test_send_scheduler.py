@@ -0,0 +1,108 @@
+"""
+Тесты для планировщика исходящих сообщений Telegram
+"""
+import asyncio
+import time
+import pytest
+from telegram.error import RetryAfter
+from ona.core.services.send_scheduler import NO_MERGE, SendScheduler
+
+class FakeApi:
+    """
+    Имитация Bot API: запоминает отправленные запросы
+    """
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = list(failures or [])
+
+    async def post(self, endpoint, data):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.calls.append((time.perf_counter(), endpoint, dict(data)))
+        return {"message_id": len(self.calls), "text": data.get("text")}
+
+    async def send(self, scheduler, chat_id, text, rate_limit_args=None, **extra):
+        data = {"chat_id": chat_id, "text": text, **extra}
+        return await scheduler.process_request(
+            callback=self.post, args=("sendMessage", data), kwargs={},
+            endpoint="sendMessage", data=data, rate_limit_args=rate_limit_args
+        )
+
+@pytest.mark.asyncio
+async def test_chat_bucket_spaces_messages_but_not_other_chats():
+    """
+    Тест ограничения частоты в одном чате без задержки для других чатов
+    """
+    api = FakeApi()
+    scheduler = SendScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        api.send(scheduler, 1, "a", parse_mode="HTML"),
+        api.send(scheduler, 1, "b", reply_markup="{}"),
+        api.send(scheduler, 1, "c", reply_markup="{}"),
+        api.send(scheduler, 2, "d"),
+    )
+
+    other_chat = next(sent_at for sent_at, _, data in api.calls if data["chat_id"] == 2)
+    same_chat = [sent_at for sent_at, _, data in api.calls if data["chat_id"] == 1]
+    assert other_chat - started < 0.03
+    assert same_chat[-1] - started >= 0.09
+    assert scheduler.get_stats()["throttled"] == 2
+    assert scheduler.get_stats()["queue_latency"]["count"] == 4
+
+@pytest.mark.asyncio
+async def test_consecutive_texts_to_same_chat_are_merged():
+    """
+    Тест объединения подряд идущих текстов в один чат, пока они ждут отправки
+    """
+    api = FakeApi()
+    scheduler = SendScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+
+    results = await asyncio.gather(
+        api.send(scheduler, 1, "Первое"),
+        api.send(scheduler, 1, "Второе"),
+        api.send(scheduler, 1, "Третье"),
+    )
+
+    assert [data["text"] for _, _, data in api.calls] == ["Первое", "Второе\n\nТретье"]
+    assert results[1] is results[2]
+    assert scheduler.get_stats()["merged"] == 1
+
+@pytest.mark.asyncio
+async def test_edited_messages_are_not_merged():
+    """
+    Тест того, что сообщение, которое потом редактируется (NO_MERGE), не
+    объединяется ни с предыдущими, ни со следующими текстами
+    """
+    api = FakeApi()
+    scheduler = SendScheduler(global_rate=100, chat_rate=20, chat_burst=1)
+
+    results = await asyncio.gather(
+        api.send(scheduler, 1, "Первое"),
+        api.send(scheduler, 1, "Ответ"),
+        api.send(scheduler, 1, "Начало ответа", rate_limit_args=NO_MERGE),
+        api.send(scheduler, 1, "Четвертое"),
+    )
+
+    assert [data["text"] for _, _, data in api.calls] == ["Первое", "Ответ", "Начало ответа", "Четвертое"]
+    # Поток получает свое сообщение, а не сообщение с предыдущим ответом
+    assert results[2]["text"] == "Начало ответа"
+    assert scheduler.get_stats()["merged"] == 0
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_retries():
+    """
+    Тест паузы и повтора запроса после ответа 429 с retry_after
+    """
+    api = FakeApi(failures=[RetryAfter(0.05)])
+    scheduler = SendScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+
+    started = time.perf_counter()
+    result = await api.send(scheduler, 1, "Привет")
+
+    assert result["message_id"] == 1
+    assert time.perf_counter() - started >= 0.05
+    stats = scheduler.get_stats()
+    assert stats["retried"] == 1
+    assert stats["sent"] == 1
@@ -0,0 +1,78 @@
+"""
+Тесты для реестра сервисов с ленивым созданием
+"""
+import threading
+from ona.core.services.registry import ServiceRegistry
+
+class DummyService:
+    """
+    Сервис-заглушка, считающий количество созданных экземпляров
+    """
+    created = 0
+
+    def __init__(self):
+        DummyService.created += 1
+        self.value = 42
+
+    def ping(self):
+        return "pong"
+
+def test_service_is_created_on_first_use():
+    """
+    Тест создания сервиса только при первом обращении
+    """
+    DummyService.created = 0
+    registry = ServiceRegistry()
+    service = registry.register("dummy", DummyService)
+
+    assert DummyService.created == 0
+    assert registry.is_initialized("dummy") is False
+
+    assert service.ping() == "pong"
+    assert service.value == 42
+    assert DummyService.created == 1
+    assert "dummy" in registry.get_stats()["initialized"]
+
+def test_proxy_passes_isinstance_checks():
+    """
+    Тест того, что заместитель проходит isinstance как экземпляр сервиса
+    """
+    registry = ServiceRegistry()
+    service = registry.register("dummy", DummyService)
+
+    assert isinstance(service, DummyService)
+    assert service.__class__ is DummyService
+    assert registry.is_initialized("dummy") is True
+
+def test_service_is_created_once_across_threads():
+    """
+    Тест однократного создания сервиса при одновременных обращениях
+    """
+    DummyService.created = 0
+    registry = ServiceRegistry()
+    service = registry.register("dummy", DummyService)
+
+    threads = [threading.Thread(target=service.ping) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert DummyService.created == 1
+
+def test_reregistration_keeps_single_proxy_and_reset_recreates():
+    """
+    Тест повторной регистрации и сброса созданного экземпляра
+    """
+    DummyService.created = 0
+    registry = ServiceRegistry()
+    first = registry.register("dummy", DummyService)
+    second = registry.register("dummy", DummyService)
+    assert first is second
+
+    first.value = 7
+    assert registry.get("dummy").value == 7
+
+    registry.reset("dummy")
+    assert second.value == 42
+    assert DummyService.created == 2
@@ -0,0 +1,116 @@
+"""
+Тесты для контекста обновления и счетчика обращений к базе
+"""
+import pytest
+from unittest import mock
+from ona.core.db.call_counter import DbCallCounter
+from ona.core.services.profile_service import ProfileService
+from ona.core.services.session_context import SessionContextManager, SupabaseSessionLoader
+
+CONTEXT = {
+    "user": {"id": 7, "telegram_id": 42},
+    "profile": {"user_id": 42, "psychology_progress": 3, "psychology_answers": {"0": {"option_id": "a"}}},
+    "subscription": {"id": 1, "status": "active"},
+    "history": [{"message_text": f"m{i}", "is_user": i % 2 == 0, "created_at": str(i)} for i in range(10)],
+}
+
+def make_loader(data=CONTEXT):
+    loader = mock.Mock()
+    loader.fetch = mock.AsyncMock(return_value=data)
+    loader.fetch_part = mock.AsyncMock(return_value=[])
+    return loader
+
+@pytest.mark.asyncio
+async def test_profile_reads_in_one_update_share_one_load():
+    """
+    Тест того, что прогресс, ответы и натальные данные читаются из одного запроса
+    """
+    loader = make_loader()
+    manager = SessionContextManager(loader=loader)
+    service = ProfileService()
+
+    with mock.patch("ona.core.services.profile_service.session_contexts", manager):
+        async with manager.scope(42) as session:
+            assert (await service.get_profile(42))["psychology_progress"] == 3
+            assert "psychology_answers" in await service.get_profile(42)
+            await service.get_natal_data(42)
+            assert (await session.get_subscription())["status"] == "active"
+            assert len(await session.get_history()) == 10
+
+            # Профиль другого пользователя не берется из контекста
+            assert await service.get_profile(43) is None
+
+            # Запись видна последующим чтениям в том же обновлении
+            session.update_profile({"psychology_progress": 4})
+            assert (await service.get_profile(42))["psychology_progress"] == 4
+
+    assert loader.fetch.await_count == 1
+    assert loader.fetch_part.await_count == 0
+    assert manager.current() is None
+    assert manager.get_stats()["batched_loads"] == 1
+
+@pytest.mark.asyncio
+async def test_history_is_extended_and_parts_fall_back_when_rpc_fails():
+    """
+    Тест догрузки длинной истории и загрузки частей отдельно при ошибке RPC
+    """
+    loader = make_loader()
+    manager = SessionContextManager(loader=loader)
+    async with manager.scope(42) as session:
+        await session.get_history(20)
+    loader.fetch_part.assert_awaited_once_with(42, "history", 20)
+
+    loader = make_loader()
+    loader.fetch.side_effect = RuntimeError("function get_session_context does not exist")
+    loader.fetch_part.return_value = {"user_id": 42}
+    manager = SessionContextManager(loader=loader)
+    async with manager.scope(42) as session:
+        assert await session.get_profile() == {"user_id": 42}
+        assert await session.get_profile() == {"user_id": 42}
+    assert loader.fetch.await_count == 1
+    loader.fetch_part.assert_awaited_once_with(42, "profile", 10)
+    assert manager.get_stats()["load_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_db_calls_are_counted_per_update():
+    """
+    Тест подсчета обращений к базе: контекст обновления - одно обращение
+    """
+    db_client = mock.Mock()
+    db_client.rpc.return_value.execute.return_value = mock.Mock(data=CONTEXT)
+    counter = DbCallCounter()
+    manager = SessionContextManager(loader=SupabaseSessionLoader(db_client=db_client))
+
+    with mock.patch("ona.core.services.session_context.db_call_counter", counter), \
+            mock.patch("ona.core.db.supabase_client.db_call_counter", counter):
+        async with manager.scope(42) as session:
+            await session.get_profile()
+            await session.get_subscription()
+            await session.get_history()
+            assert counter.current().calls == 1
+
+    db_client.rpc.assert_called_once_with("get_session_context", {"p_telegram_id": 42, "p_history_limit": 10})
+    stats = counter.get_stats()
+    assert stats["updates"] == 1
+    assert stats["avg_calls_per_update"] == 1
+
+@pytest.mark.asyncio
+async def test_chat_history_is_loaded_in_the_batched_request():
+    """
+    Тест того, что история в объеме промпта чата загружается тем же запросом,
+    что и остальные данные пользователя
+    """
+    from ona.config.settings import settings
+    from ona.core.services.session_context import session_contexts
+
+    assert session_contexts.history_limit >= settings.CHAT_HISTORY_LIMIT
+
+    history = [{"message_text": f"m{i}", "is_user": i % 2 == 0, "created_at": str(i)} for i in range(50)]
+    loader = make_loader(dict(CONTEXT, history=history[-session_contexts.history_limit:]))
+    manager = SessionContextManager(loader=loader, history_limit=session_contexts.history_limit)
+    async with manager.scope(4242) as session:
+        rows = await session.get_history(settings.CHAT_HISTORY_LIMIT)
+
+    assert rows == history[-settings.CHAT_HISTORY_LIMIT:]
+    loader.fetch.assert_awaited_once_with(4242, session_contexts.history_limit)
+    loader.fetch_part.assert_not_awaited()
@@ -0,0 +1,95 @@
+"""
+Тесты для объединения одновременных одинаковых запросов (single-flight)
+"""
+import asyncio
+import os
+import sys
+import pytest
+from unittest import mock
+
+# Сервисы импортируют модули как core.*
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ona.core.services.meditation_service import MeditationService
+from ona.core.services.response_cache import ResponseCache
+from ona.tests.test_response_cache import make_service
+from ona.utils.single_flight import SingleFlight
+
+BURST = 10
+
+@pytest.mark.asyncio
+async def test_errors_and_cancellation_are_shared_safely():
+    """
+    Тест того, что ошибку получают все ожидающие, а отмена одного не отменяет запрос
+    """
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        raise RuntimeError("timeout")
+
+    waiters = [asyncio.create_task(flights.do("key", fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert all(isinstance(result, RuntimeError) for result in results[1:])
+    assert calls == 1
+
+    # После завершения ключ освобождается
+    release.clear()
+    retry = asyncio.create_task(flights.do("key", fetch))
+    await asyncio.sleep(0)
+    release.set()
+    with pytest.raises(RuntimeError):
+        await retry
+    assert calls == 2
+    assert flights.get_stats() == {"in_flight": 0, "calls": 4, "executed": 2, "coalesced": 2}
+
+@pytest.mark.asyncio
+async def test_burst_of_identical_requests_calls_providers_once(tmp_path, monkeypatch):
+    """
+    Тест количества запросов к OpenAI и 11Labs при серии одинаковых нажатий
+    """
+    service = make_service(ResponseCache())
+    create = service.openai_service.client.chat.completions.create
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.01)
+        return mock.Mock(choices=[mock.Mock(message=mock.Mock(content="рекомендация"))])
+    create.side_effect = slow_create
+
+    # Двойные нажатия кнопки рекомендации
+    results = await asyncio.gather(*(service.generate_daily_recommendation(42) for _ in range(BURST)))
+    assert results == ["рекомендация"] * BURST
+    assert create.await_count == 1
+    assert service.flights.get_stats()["coalesced"] == BURST - 1
+
+    # Принудительное обновление не объединяется с обычными запросами
+    await asyncio.gather(
+        service.generate_practice(42, "sleep"),
+        service.generate_practice(42, "sleep", refresh=True),
+        service.generate_practice(42, "stress")
+    )
+    assert create.await_count == 4
+
+    # Аудиомедитация: один запрос к OpenAI и один к 11Labs на всю серию
+    monkeypatch.chdir(tmp_path)
+    meditation = MeditationService()
+    meditation.recommendation_service = make_service(ResponseCache())
+    meditation.recommendation_service.openai_service.client.chat.completions.create.side_effect = slow_create
+    meditation.elevenlabs_service = mock.Mock()
+    meditation.elevenlabs_service.generate_audio = mock.AsyncMock(return_value=b"mp3")
+    meditation.save_meditation = mock.AsyncMock(return_value=True)
+
+    paths = await asyncio.gather(*(meditation.generate_meditation_audio(42, "sleep") for _ in range(BURST)))
+    assert len(set(paths)) == 1 and os.path.exists(paths[0])
+    assert meditation.recommendation_service.openai_service.client.chat.completions.create.await_count == 1
+    meditation.elevenlabs_service.generate_audio.assert_awaited_once_with("рекомендация")
+    meditation.save_meditation.assert_awaited_once()
@@ -0,0 +1,40 @@
+"""
+Тесты для профилировщика запуска
+"""
+from ona.benchmarks.startup_profiler import parse_importtime, check_thresholds
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2500 |       2620 | fastapi
+Какая-то посторонняя строка
+import time:       800 |        800 |     telegram.constants
+"""
+
+def test_parse_importtime():
+    """
+    Тест разбора вывода -X importtime
+    """
+    modules = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert [module["module"] for module in modules] == ["_io", "fastapi", "telegram.constants"]
+    assert modules[1]["self_ms"] == 2.5
+    assert modules[1]["cumulative_ms"] == 2.62
+    assert [module["depth"] for module in modules] == [1, 0, 2]
+
+def test_check_thresholds_reports_regressions():
+    """
+    Тест обнаружения превышения порогов, в том числе для отдельных сервисов
+    """
+    report = {
+        "target": "main",
+        "import_ms": 900.0,
+        "peak_rss_mb": 80.0,
+        "services_ms": {"openai_service": 400.0, "profile_service": 0.1},
+    }
+
+    assert check_thresholds(report, {"import_ms": 1000, "peak_rss_mb": 100, "services_ms": 500}) == []
+
+    violations = check_thresholds(report, {"import_ms": 500, "services_ms": 300})
+    assert len(violations) == 2
+    assert any("import_ms" in violation for violation in violations)
+    assert any("services_ms.openai_service" in violation for violation in violations)
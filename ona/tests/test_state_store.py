@@ -0,0 +1,209 @@
+"""
+Тесты для хранилища состояний FSM пользователей
+"""
+import asyncio
+import os
+import random
+import sys
+import pytest
+from unittest import mock
+
+# Обработчики состояний импортируют модули как core.*
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ona.core.services.state_store import (
+    UserStateStore,
+    MemoryStateBackend,
+    SupabaseStateBackend,
+    StateConflictError,
+)
+from ona.core.fsm.handlers.registration_handler import STATES
+from ona.utils.state_router import state_router
+
+@pytest.mark.asyncio
+async def test_active_user_reads_do_not_hit_backend():
+    """
+    Тест того, что повторное чтение состояния обходится без обращения к хранилищу
+    """
+    backend = MemoryStateBackend()
+    backend.load = mock.AsyncMock(wraps=backend.load)
+    store = UserStateStore(backend=backend, ttl=60)
+
+    assert await store.get(1) == "initial"
+    await store.set(1, "birth_date")
+    for _ in range(10):
+        assert await store.get(1) == "birth_date"
+
+    assert backend.load.await_count == 1
+    stats = store.get_stats()
+    # Запись без версии берет текущую версию из кэша
+    assert stats["hits"] == 11
+    assert stats["misses"] == 1
+    assert stats["writes"] == 1
+
+@pytest.mark.asyncio
+async def test_state_survives_cache_loss_and_cache_is_bounded():
+    """
+    Тест write-through записи и ограничения размера кэша
+    """
+    backend = MemoryStateBackend()
+    store = UserStateStore(backend=backend, max_size=2, ttl=60)
+
+    for user_id in (1, 2, 3):
+        await store.set(user_id, f"state_{user_id}")
+
+    assert store.get_stats()["size"] == 2
+    # Вытесненный пользователь загружается из хранилища
+    assert await store.get(1) == "state_1"
+
+    # Новый экземпляр (например, после холодного старта) читает то же состояние
+    assert await UserStateStore(backend=backend).get(3) == "state_3"
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_reloaded_and_backend_errors_are_tolerated():
+    """
+    Тест повторной загрузки по истечении TTL и работы при недоступном хранилище
+    """
+    backend = mock.AsyncMock()
+    backend.load.return_value = ("profiling", 3)
+    store = UserStateStore(backend=backend, ttl=10)
+
+    with mock.patch("ona.core.services.state_store.time.monotonic", return_value=100.0):
+        assert await store.get(1) == "profiling"
+    backend.load.side_effect = Exception("connection refused")
+    with mock.patch("ona.core.services.state_store.time.monotonic", return_value=111.0):
+        # Хранилище недоступно - используется последнее известное состояние
+        assert await store.get(1) == "profiling"
+
+    assert backend.load.await_count == 2
+    assert store.get_stats()["backend_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_write_does_not_advance_version():
+    """
+    Тест того, что ошибка записи в хранилище не продвигает версию в кэше
+    и следующий переход выполняется от версии, которая есть в хранилище
+    """
+    backend = MemoryStateBackend()
+    store = UserStateStore(backend=backend)
+    version = await store.set(1, "birth_date")
+
+    with mock.patch.object(backend, "compare_and_set", side_effect=Exception("connection reset")):
+        with pytest.raises(Exception, match="connection reset"):
+            await store.set(1, "birth_time", expected_version=version)
+
+    assert await store.get_versioned(1) == ("birth_date", version)
+    assert await store.set(1, "birth_time", expected_version=version) == version + 1
+    assert await backend.load(1) == ("birth_time", version + 1)
+    stats = store.get_stats()
+    assert stats["backend_errors"] == 1
+    assert stats["conflicts"] == 0
+
+@pytest.mark.asyncio
+async def test_supabase_backend_uses_conditional_writes():
+    """
+    Тест условной записи в таблицу user_states: вставка новой строки и UPDATE по версии
+    """
+    db_client = mock.MagicMock()
+    table = db_client.table.return_value
+    table.select.return_value.eq.return_value.limit.return_value.execute.return_value.data = [
+        {"state": "chat", "version": 4}
+    ]
+    backend = SupabaseStateBackend(db_client=db_client)
+
+    assert await backend.load(42) == ("chat", 4)
+
+    assert await backend.compare_and_set(42, "subscription", 0) is True
+    assert table.insert.call_args.args[0]["version"] == 1
+
+    update_query = table.update.return_value.eq.return_value.eq.return_value
+    update_query.execute.return_value.data = []
+    assert await backend.compare_and_set(42, "subscription", 4) is False
+    table.update.return_value.eq.return_value.eq.assert_called_with("version", 4)
+
+    table.insert.return_value.execute.side_effect = Exception("duplicate key value violates unique constraint")
+    assert await backend.compare_and_set(42, "subscription", 0) is False
+
+class SlowBackend(MemoryStateBackend):
+    """
+    Хранилище со случайными задержками, провоцирующими гонки между переходами
+    """
+    async def load(self, user_id):
+        await asyncio.sleep(random.random() / 500)
+        return await super().load(user_id)
+
+    async def compare_and_set(self, user_id, state, expected_version):
+        await asyncio.sleep(random.random() / 500)
+        return await super().compare_and_set(user_id, state, expected_version)
+
+@pytest.mark.asyncio
+async def test_parallel_transitions_are_not_lost():
+    """
+    Стресс-тест: много параллельных переходов одного пользователя через несколько
+    экземпляров хранилища (как в разных воркерах) - ни один переход не теряется
+    """
+    backend = SlowBackend()
+    stores = [UserStateStore(backend=backend, default_state="0") for _ in range(3)]
+
+    async def increment(store):
+        while True:
+            state, version = await store.get_versioned(1)
+            try:
+                return await store.set(1, str(int(state) + 1), expected_version=version)
+            except StateConflictError:
+                continue
+
+    versions = await asyncio.gather(*[increment(stores[index % 3]) for index in range(60)])
+
+    assert await backend.load(1) == ("60", 60)
+    # Каждый успешный переход получил свою версию
+    assert sorted(versions) == list(range(1, 61))
+    assert sum(store.get_stats()["conflicts"] for store in stores) > 0
+
+@pytest.mark.asyncio
+async def test_unversioned_set_retries_on_stale_cache():
+    """
+    Тест повтора записи без версии, если кэш устарел из-за другого воркера
+    """
+    backend = MemoryStateBackend()
+    first, second = UserStateStore(backend=backend), UserStateStore(backend=backend)
+
+    assert await second.get(1) == "initial"
+    await first.set(1, "birth_date")
+
+    # Кэш второго экземпляра устарел, но переход не теряется и не затирает версию
+    assert await second.set(1, "birth_time") == 2
+    assert second.get_stats()["conflicts"] == 1
+
+    with pytest.raises(StateConflictError):
+        await first.set(1, "age", expected_version=1)
+    assert await first.get(1) == "birth_time"
+
+@pytest.mark.asyncio
+async def test_racing_updates_reject_stale_transition():
+    """
+    Тест того, что из двух одновременных обновлений переход выполняет только
+    первое: второе переходит от уже устаревшей версии состояния
+    """
+    store = UserStateStore(backend=MemoryStateBackend())
+    await store.set(1, STATES["BIRTH_PLACE"])
+
+    async def reply_text(*args, **kwargs):
+        # Ответ пользователю отдает управление, пока второе обновление читает состояние
+        await asyncio.sleep(0.01)
+
+    def make_update(text):
+        update = mock.Mock(callback_query=None)
+        update.effective_user.id = 1
+        update.message.text = text
+        update.message.reply_text = mock.AsyncMock(side_effect=reply_text)
+        return update
+
+    with mock.patch.object(state_router, "state_store", store), \
+            mock.patch("ona.core.fsm.state_handler.logger") as logger:
+        await asyncio.gather(state_router.route(make_update("Москва")), state_router.route(make_update("Казань")))
+
+    assert await store.get_versioned(1) == (STATES["AGE"], 2)
+    assert store.get_stats()["conflicts"] == 1
+    assert logger.warning.call_count == 1
+    assert state_router.current_version(1) is None
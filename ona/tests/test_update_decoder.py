@@ -0,0 +1,55 @@
+"""
+Тесты для быстрого декодирования обновлений Telegram
+"""
+import pytest
+from telegram import Update
+from ona.utils.update_decoder import RawUpdate
+
+def test_peek_without_building_update():
+    """
+    Тест извлечения update_id, типа и отправителя без построения Update
+    """
+    raw_update = RawUpdate.from_bytes(
+        b'{"update_id": 10, "message": {"message_id": 1, "date": 0, '
+        b'"chat": {"id": 8, "type": "private"}, "from": {"id": 7, "is_bot": false, "first_name": "A"}, '
+        b'"text": "/start"}}'
+    )
+
+    assert raw_update.update_id == 10
+    assert raw_update.update_type == "message"
+    assert raw_update.user_id == 7
+    assert raw_update.payload["text"] == "/start"
+    assert raw_update._update is None
+
+def test_user_id_for_other_update_types():
+    """
+    Тест определения пользователя для разных типов обновлений
+    """
+    assert RawUpdate({"update_id": 1, "callback_query": {"from": {"id": 9}}}).user_id == 9
+    assert RawUpdate({"update_id": 1, "poll_answer": {"user": {"id": 5}}}).user_id == 5
+    assert RawUpdate({"update_id": 1, "channel_post": {"chat": {"id": -100}}}).user_id == -100
+    assert RawUpdate({"update_id": 1}).user_id is None
+
+def test_update_is_materialized_once():
+    """
+    Тест однократного построения полного объекта Update
+    """
+    raw_update = RawUpdate({"update_id": 3, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": "subscribe",
+        "from": {"id": 9, "is_bot": False, "first_name": "A"}
+    }})
+
+    update = raw_update.to_update(None)
+
+    assert isinstance(update, Update)
+    assert update.callback_query.data == "subscribe"
+    assert raw_update.to_update(None) is update
+
+def test_invalid_body_is_rejected():
+    """
+    Тест отклонения тела запроса, не являющегося JSON-объектом
+    """
+    with pytest.raises(ValueError):
+        RawUpdate.from_bytes(b"[1, 2]")
+    with pytest.raises(ValueError):
+        RawUpdate.from_bytes(b"not json")
@@ -0,0 +1,79 @@
+"""
+Тесты для дедупликации обновлений Telegram
+"""
+import pytest
+from unittest import mock
+from ona.core.services.update_deduplicator import UpdateDeduplicator, SupabaseSeenUpdatesBackend
+
+@pytest.mark.asyncio
+async def test_redelivered_update_is_dropped():
+    """
+    Тест отбрасывания повторно доставленного обновления
+    """
+    deduplicator = UpdateDeduplicator(max_size=100, ttl=60)
+
+    assert await deduplicator.is_duplicate(1) is False
+    assert await deduplicator.is_duplicate(2) is False
+    assert await deduplicator.is_duplicate(1) is True
+
+    stats = deduplicator.get_stats()
+    assert stats["checked"] == 3
+    assert stats["dropped"] == 1
+
+@pytest.mark.asyncio
+async def test_window_is_bounded_by_size_and_ttl():
+    """
+    Тест ограничения окна по размеру и по времени
+    """
+    deduplicator = UpdateDeduplicator(max_size=2, ttl=60)
+    for update_id in (1, 2, 3):
+        await deduplicator.is_duplicate(update_id)
+
+    # Самый старый update_id вытеснен лимитом размера
+    assert deduplicator.get_stats()["size"] == 2
+    assert await deduplicator.is_duplicate(1) is False
+
+    expiring = UpdateDeduplicator(max_size=100, ttl=10)
+    with mock.patch("ona.core.services.update_deduplicator.time.monotonic", return_value=100.0):
+        await expiring.is_duplicate(5)
+    with mock.patch("ona.core.services.update_deduplicator.time.monotonic", return_value=111.0):
+        assert await expiring.is_duplicate(5) is False
+
+@pytest.mark.asyncio
+async def test_shared_backend_drops_duplicates_from_other_workers():
+    """
+    Тест отбрасывания обновления, уже принятого другим воркером
+    """
+    backend = mock.AsyncMock()
+    backend.mark_seen.return_value = False
+    deduplicator = UpdateDeduplicator(backend=backend)
+
+    assert await deduplicator.is_duplicate(10) is True
+    backend.mark_seen.assert_called_once_with(10, deduplicator.ttl)
+    assert deduplicator.get_stats()["dropped_shared"] == 1
+
+@pytest.mark.asyncio
+async def test_backend_error_does_not_drop_update():
+    """
+    Тест обработки недоступности общего хранилища
+    """
+    backend = mock.AsyncMock()
+    backend.mark_seen.side_effect = Exception("connection refused")
+    deduplicator = UpdateDeduplicator(backend=backend)
+
+    assert await deduplicator.is_duplicate(10) is False
+    assert deduplicator.get_stats()["backend_errors"] == 1
+
+@pytest.mark.asyncio
+async def test_supabase_backend_detects_unique_violation():
+    """
+    Тест распознавания нарушения уникальности в хранилище Supabase
+    """
+    db_client = mock.MagicMock()
+    backend = SupabaseSeenUpdatesBackend(db_client=db_client)
+    assert await backend.mark_seen(1, 60) is True
+
+    db_client.table.return_value.insert.return_value.execute.side_effect = Exception(
+        "{'code': '23505', 'message': 'duplicate key value violates unique constraint'}"
+    )
+    assert await backend.mark_seen(1, 60) is False
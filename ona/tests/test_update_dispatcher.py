@@ -0,0 +1,73 @@
+"""
+Тесты для диспетчера обновлений с очередями пользователей
+"""
+import asyncio
+import random
+import pytest
+from ona.core.services.update_dispatcher import UpdateDispatcher
+
+@pytest.mark.asyncio
+async def test_updates_of_one_user_stay_in_order():
+    """
+    Тест сохранения порядка обновлений одного пользователя при параллельной подаче
+    """
+    dispatcher = UpdateDispatcher(max_concurrency=4)
+    handled = {1: [], 2: []}
+
+    async def handle(user_id, seq):
+        # Случайная задержка провоцирует гонки, если порядок не гарантирован
+        await asyncio.sleep(random.random() / 200)
+        handled[user_id].append(seq)
+
+    await asyncio.gather(*[
+        dispatcher.dispatch(user_id, handle(user_id, seq))
+        for seq in range(20)
+        for user_id in (1, 2)
+    ])
+
+    assert handled[1] == list(range(20))
+    assert handled[2] == list(range(20))
+    assert dispatcher.get_stats()["processed"] == 40
+    assert dispatcher.active_lanes == 0
+
+@pytest.mark.asyncio
+async def test_different_users_run_in_parallel_within_budget():
+    """
+    Тест параллельной обработки разных пользователей в пределах общего лимита
+    """
+    dispatcher = UpdateDispatcher(max_concurrency=3)
+    running = 0
+    peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*[dispatcher.dispatch(user_id, handle()) for user_id in range(10)])
+
+    assert peak == 3
+    stats = dispatcher.get_stats()
+    assert stats["peak_lanes"] == 10
+    assert stats["wait_latency"]["count"] == 10
+
+@pytest.mark.asyncio
+async def test_failed_update_does_not_block_lane():
+    """
+    Тест того, что ошибка в обработке не останавливает очередь пользователя
+    """
+    dispatcher = UpdateDispatcher(max_concurrency=2)
+    handled = []
+
+    async def handle(seq):
+        await asyncio.sleep(0)
+        if seq == 0:
+            raise ValueError("boom")
+        handled.append(seq)
+
+    await asyncio.gather(*[dispatcher.dispatch(42, handle(seq)) for seq in range(3)])
+
+    assert handled == [1, 2]
+    assert dispatcher.get_stats()["failed"] == 1
@@ -0,0 +1,314 @@
+"""
+Тесты для очереди обновлений Telegram
+"""
+import asyncio
+import os
+import sys
+import time
+import pytest
+from unittest import mock
+
+# Сервис Telegram импортирует обработчики состояний, которые импортируют модули как core.*
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ona.core.fsm.handlers.registration_handler import STATES as REGISTRATION_STATES
+from ona.core.services.state_store import MemoryStateBackend, UserStateStore
+from ona.core.services.telegram_service import TelegramService
+from ona.core.services.update_dispatcher import UpdateDispatcher
+from ona.core.services.update_queue import UpdateQueue, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+@pytest.mark.asyncio
+async def test_enqueue_returns_before_processing():
+    """
+    Тест того, что постановка в очередь не ждет обработки обновления
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def slow_handler(update):
+        await release.wait()
+        processed.append(update["update_id"])
+
+    queue = UpdateQueue(slow_handler, workers=2, maxsize=10)
+
+    started = time.perf_counter()
+    assert await queue.enqueue({"update_id": 1}) is True
+    assert time.perf_counter() - started < 0.05
+    assert processed == []
+
+    release.set()
+    await queue.stop()
+
+    assert processed == [1]
+    assert queue.get_stats()["processed"] == 1
+
+@pytest.mark.asyncio
+async def test_queue_full_rejects_update():
+    """
+    Тест отклонения обновления при переполненной очереди
+    """
+    release = asyncio.Event()
+
+    async def blocked_handler(update):
+        await release.wait()
+
+    queue = UpdateQueue(blocked_handler, workers=1, maxsize=1)
+    await queue.start()
+
+    assert await queue.enqueue({"update_id": 1}) is True
+    # Даем воркеру забрать первое обновление
+    await asyncio.sleep(0)
+    assert await queue.enqueue({"update_id": 2}) is True
+    assert await queue.enqueue({"update_id": 3}) is False
+
+    stats = queue.get_stats()
+    assert stats["depth"] == 1
+    assert stats["rejected"] == 1
+
+    release.set()
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_stats_track_failures_and_latency():
+    """
+    Тест метрик: ошибки обработчика и задержка обработки
+    """
+    async def handler(update):
+        await asyncio.sleep(0.01)
+        if update["update_id"] == 2:
+            raise ValueError("boom")
+
+    queue = UpdateQueue(handler, workers=2, maxsize=10)
+    await queue.enqueue({"update_id": 1})
+    await queue.enqueue({"update_id": 2})
+    await queue.stop()
+
+    stats = queue.get_stats()
+    assert stats["processed"] == 1
+    assert stats["failed"] == 1
+    assert stats["depth"] == 0
+    assert stats["processing_latency"]["count"] == 2
+    assert stats["processing_latency"]["max_ms"] >= 10
+
+@pytest.mark.asyncio
+async def test_high_priority_updates_are_processed_first():
+    """
+    Тест обработки обновлений с более высоким приоритетом раньше остальных
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def handler(update):
+        await release.wait()
+        processed.append(update["update_id"])
+
+    queue = UpdateQueue(
+        handler, workers=1, maxsize=10,
+        classifier=lambda update: update["priority"]
+    )
+    await queue.start()
+
+    # Первое обновление занимает единственного воркера
+    await queue.enqueue({"update_id": 0, "priority": PRIORITY_LOW})
+    await asyncio.sleep(0)
+    await queue.enqueue({"update_id": 1, "priority": PRIORITY_LOW})
+    await queue.enqueue({"update_id": 2, "priority": PRIORITY_NORMAL})
+    await queue.enqueue({"update_id": 3, "priority": PRIORITY_HIGH})
+    await queue.enqueue({"update_id": 4, "priority": PRIORITY_LOW})
+
+    release.set()
+    await queue.stop()
+
+    assert processed == [0, 3, 2, 1, 4]
+    assert queue.get_stats()["priorities"]["low"]["enqueued"] == 3
+
+@pytest.mark.asyncio
+async def test_update_does_not_overtake_same_user_updates():
+    """
+    Тест сохранения порядка обновлений одного пользователя при разных приоритетах
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def handler(update):
+        await release.wait()
+        processed.append(update["update_id"])
+
+    queue = UpdateQueue(
+        handler, workers=1, maxsize=10,
+        classifier=lambda update: update["priority"],
+        key=lambda update: update["user_id"]
+    )
+    await queue.start()
+
+    await queue.enqueue({"update_id": 0, "user_id": 0, "priority": PRIORITY_LOW})
+    await asyncio.sleep(0)
+    await queue.enqueue({"update_id": 1, "user_id": 1, "priority": PRIORITY_LOW})
+    await queue.enqueue({"update_id": 2, "user_id": 2, "priority": PRIORITY_LOW})
+    # Нажатие кнопки пользователем 1 не обгоняет его же сообщение
+    await queue.enqueue({"update_id": 3, "user_id": 1, "priority": PRIORITY_HIGH})
+    await queue.enqueue({"update_id": 4, "user_id": 3, "priority": PRIORITY_HIGH})
+
+    release.set()
+    await queue.stop()
+
+    assert processed == [0, 4, 1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_low_priority_updates_are_shed_above_threshold():
+    """
+    Тест сброса обновлений низкого приоритета с ответом пользователю при перегрузке
+    """
+    release = asyncio.Event()
+    shed = []
+
+    async def handler(update):
+        await release.wait()
+
+    async def on_shed(update):
+        shed.append(update["update_id"])
+
+    queue = UpdateQueue(
+        handler, workers=1, maxsize=10,
+        classifier=lambda update: update["priority"],
+        shed_thresholds={PRIORITY_LOW: 2, PRIORITY_NORMAL: 3},
+        on_shed=on_shed
+    )
+    await queue.start()
+
+    await queue.enqueue({"update_id": 0, "priority": PRIORITY_LOW})
+    await asyncio.sleep(0)
+    for update_id in (1, 2):
+        assert await queue.enqueue({"update_id": update_id, "priority": PRIORITY_LOW}) is True
+    # Глубина достигла порога для низкого приоритета
+    assert await queue.enqueue({"update_id": 3, "priority": PRIORITY_LOW}) is True
+    assert await queue.enqueue({"update_id": 4, "priority": PRIORITY_NORMAL}) is True
+    assert await queue.enqueue({"update_id": 5, "priority": PRIORITY_NORMAL}) is True
+    assert await queue.enqueue({"update_id": 6, "priority": PRIORITY_HIGH}) is True
+
+    stats = queue.get_stats()
+    assert stats["depth"] == 4
+    assert stats["shed"] == 2
+    assert stats["priorities"]["low"]["shed"] == 1
+    assert stats["priorities"]["normal"]["shed"] == 1
+
+    release.set()
+    await queue.stop()
+    assert shed == [3, 5]
+
+@pytest.mark.asyncio
+async def test_user_lane_backlog_counts_toward_limits():
+    """
+    Тест того, что обновления, ожидающие в очереди пользователя диспетчера,
+    учитываются при сбросе и отклонении обновлений
+    """
+    release = asyncio.Event()
+    dispatcher = UpdateDispatcher(max_concurrency=4)
+    processed = []
+
+    async def process(update):
+        await release.wait()
+        processed.append(update["update_id"])
+
+    queue = UpdateQueue(
+        lambda update: dispatcher.dispatch(update["user_id"], process(update)),
+        workers=2, maxsize=10,
+        classifier=lambda update: update["priority"],
+        shed_thresholds={PRIORITY_LOW: 5},
+        backlog=lambda: dispatcher.queued
+    )
+    await queue.start()
+
+    # Один пользователь отправляет серию сообщений
+    results = []
+    for update_id in range(500):
+        results.append(await queue.enqueue({"update_id": update_id, "user_id": 42, "priority": PRIORITY_LOW}))
+        await asyncio.sleep(0)
+
+    stats = queue.get_stats()
+    assert stats["enqueued"] <= 6
+    assert stats["shed"] == 500 - stats["enqueued"]
+    assert dispatcher.queued == stats["backlog"] == 5
+
+    # Команды не сбрасываются, но упираются в лимит очереди
+    for update_id in range(500, 510):
+        results.append(await queue.enqueue({"update_id": update_id, "user_id": 42, "priority": PRIORITY_NORMAL}))
+    assert results[-5:] == [False] * 5
+    assert queue.get_stats()["rejected"] == 5
+    assert queue.load == 10
+
+    release.set()
+    await queue.stop()
+    assert len(processed) == stats["enqueued"] + 5
+
+@pytest.mark.asyncio
+async def test_latency_covers_processing_inside_user_lane():
+    """
+    Тест того, что задержка обработки учитывает ожидание в очереди пользователя
+    """
+    dispatcher = UpdateDispatcher(max_concurrency=4)
+
+    async def process(update):
+        await asyncio.sleep(0.02)
+
+    queue = UpdateQueue(
+        lambda update: dispatcher.dispatch(update["user_id"], process(update)),
+        workers=4, maxsize=10,
+        backlog=lambda: dispatcher.queued
+    )
+    for update_id in range(3):
+        await queue.enqueue({"update_id": update_id, "user_id": 42})
+    await queue.stop()
+
+    # Обновления одного пользователя выполняются по очереди: 20, 40 и 60 мс
+    stats = queue.get_stats()
+    assert stats["processing_latency"]["count"] == 3
+    assert stats["processing_latency"]["p50_ms"] >= 40
+    assert stats["total_latency"]["max_ms"] >= 60
+    assert dispatcher.get_stats()["processed"] == 3
+
+@pytest.mark.asyncio
+async def test_failures_inside_user_lane_are_counted():
+    """
+    Тест того, что обновление, упавшее в очереди пользователя, считается ошибкой, а не обработанным
+    """
+    dispatcher = UpdateDispatcher(max_concurrency=4)
+
+    async def process(update):
+        await asyncio.sleep(0.01)
+        if update["update_id"] == 1:
+            raise RuntimeError("handler failed")
+
+    queue = UpdateQueue(
+        lambda update: dispatcher.dispatch(update["user_id"], process(update)),
+        workers=4, maxsize=10,
+        backlog=lambda: dispatcher.queued
+    )
+    for update_id in range(3):
+        await queue.enqueue({"update_id": update_id, "user_id": 42})
+    await queue.stop()
+
+    stats = queue.get_stats()
+    assert stats["processed"] == 2
+    assert stats["failed"] == 1
+    assert stats["total_latency"]["count"] == 3
+
+@pytest.mark.asyncio
+async def test_onboarding_answers_are_not_shed_with_chat_messages():
+    """
+    Тест того, что ответы на вопросы регистрации получают приоритет команд,
+    а обычные сообщения чата - низкий приоритет
+    """
+    store = UserStateStore(backend=MemoryStateBackend())
+    await store.set(1, REGISTRATION_STATES["BIRTH_DATE"])
+    await store.set(2, "chat")
+
+    def message(user_id, text):
+        return {"update_id": user_id, "message": {"message_id": 1, "from": {"id": user_id}, "text": text}}
+
+    with mock.patch("ona.core.services.telegram_service.user_state_store", store):
+        assert TelegramService.get_update_priority(message(1, "15.03.1990")) == PRIORITY_NORMAL
+        assert TelegramService.get_update_priority(message(2, "Привет")) == PRIORITY_LOW
+        # Состояние еще не загружено в кэш - обычный приоритет сообщения
+        assert TelegramService.get_update_priority(message(3, "Привет")) == PRIORITY_LOW
+        assert TelegramService.get_update_priority(message(3, "/start")) == PRIORITY_NORMAL
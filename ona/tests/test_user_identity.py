@@ -0,0 +1,70 @@
+"""
+Тесты для кэша соответствия telegram_id -> users.id
+"""
+import pytest
+from unittest import mock
+from ona.core.services.user_identity import UserIdentityMap
+
+def make_db_client(rows_by_telegram_id):
+    """
+    Клиент Supabase, отвечающий на users.select("id").eq("telegram_id", ...)
+    """
+    db_client = mock.MagicMock()
+    calls = []
+
+    def eq(column, telegram_id):
+        calls.append(telegram_id)
+        query = mock.MagicMock()
+        rows = rows_by_telegram_id.get(telegram_id, [])
+        query.limit.return_value.execute.return_value = mock.Mock(data=rows)
+        return query
+
+    db_client.table.return_value.select.return_value.eq.side_effect = eq
+    return db_client, calls
+
+@pytest.mark.asyncio
+async def test_known_users_are_resolved_once():
+    """
+    Тест того, что users.id запрашивается из базы один раз на пользователя
+    """
+    db_client, calls = make_db_client({42: [{"id": 7}]})
+    identity = UserIdentityMap(db_client=db_client, max_size=2)
+
+    for _ in range(5):
+        assert await identity.resolve(42) == 7
+    assert calls == [42]
+
+    # Вытеснение самых давно использованных при превышении max_size
+    identity.remember(1, 101)
+    identity.remember(2, 102)
+    assert await identity.resolve(42) == 7
+    assert calls == [42, 42]
+
+    stats = identity.get_stats()
+    assert stats["hits"] == 4
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+@pytest.mark.asyncio
+async def test_unknown_users_are_cached_for_negative_ttl():
+    """
+    Тест отрицательного кэширования незарегистрированных пользователей
+    """
+    db_client, calls = make_db_client({})
+    identity = UserIdentityMap(db_client=db_client, negative_ttl=60)
+
+    with mock.patch("ona.core.services.user_identity.time.monotonic", return_value=1000.0):
+        assert await identity.resolve(42) is None
+        assert await identity.resolve(42) is None
+    assert calls == [42]
+    assert identity.get_stats()["negative_hits"] == 1
+
+    # По истечении TTL пользователь запрашивается снова
+    with mock.patch("ona.core.services.user_identity.time.monotonic", return_value=1061.0):
+        assert await identity.resolve(42) is None
+    assert calls == [42, 42]
+
+    # После регистрации отметка об отсутствии снимается
+    identity.remember(42, 7)
+    assert await identity.resolve(42) == 7
+    assert calls == [42, 42]
@@ -0,0 +1,105 @@
+"""
+Компактный версионированный формат callback_data для inline-кнопок
+
+Формат: "<версия>:<код действия>[:<аргумент>...]", например "1:a:3:b" -
+ответ "b" на вопрос 3. Telegram ограничивает callback_data 64 байтами,
+поэтому действия кодируются коротко. Кнопки старого формата
+("answer_3_b", "practice_sleep") из уже отправленных сообщений
+по-прежнему разбираются.
+"""
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+# Текущая версия формата
+CALLBACK_VERSION = 1
+SEPARATOR = ":"
+# Ограничение Telegram на длину callback_data в байтах
+MAX_CALLBACK_BYTES = 64
+
+# Действия inline-кнопок
+ANSWER = "answer"
+PRACTICE = "practice"
+SELECT_PLAN = "select_plan"
+
+# Короткие коды действий в callback_data
+ACTION_CODES = {
+    ANSWER: "a",
+    PRACTICE: "p",
+    SELECT_PLAN: "sp",
+}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+# Действия старого формата "<действие>_<аргумент>[_<аргумент>...]" и количество аргументов
+LEGACY_ACTIONS = {
+    ANSWER: 2,
+    PRACTICE: 1,
+    SELECT_PLAN: 1,
+}
+
+
+class CallbackData(NamedTuple):
+    """
+    Разобранная callback_data
+    """
+    # Имя действия (None - версия формата не поддерживается)
+    action: Optional[str]
+    args: Tuple[str, ...] = ()
+    # 0 - старый формат или простая строка без версии
+    version: int = 0
+
+
+def encode(action: str, *args) -> str:
+    """
+    Кодирование действия и аргументов в callback_data
+
+    Args:
+        action: Имя действия (ключ ACTION_CODES)
+        *args: Аргументы действия
+
+    Returns:
+        str: Строка для InlineKeyboardButton(callback_data=...)
+    """
+    parts = [str(CALLBACK_VERSION), ACTION_CODES[action]]
+    for arg in args:
+        arg = str(arg)
+        if SEPARATOR in arg:
+            raise ValueError(f"Аргумент callback_data не может содержать '{SEPARATOR}': {arg}")
+        parts.append(arg)
+
+    data = SEPARATOR.join(parts)
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_BYTES} байт: {data}")
+    return data
+
+
+@lru_cache(maxsize=4096)
+def decode(data: str) -> CallbackData:
+    """
+    Разбор callback_data (результат кэшируется: набор кнопок ограничен)
+
+    Args:
+        data: callback_data из CallbackQuery
+
+    Returns:
+        CallbackData: Действие, аргументы и версия формата
+    """
+    head, separator, rest = data.partition(SEPARATOR)
+    if separator and head.isdigit():
+        version = int(head)
+        if version != CALLBACK_VERSION:
+            return CallbackData(None, (), version)
+        code, _, args = rest.partition(SEPARATOR)
+        action = CODE_ACTIONS.get(code)
+        if action is None:
+            return CallbackData(None, (), version)
+        return CallbackData(action, tuple(args.split(SEPARATOR)) if args else (), version)
+
+    # Старый формат: "answer_3_b", "practice_sleep", "select_plan_basic"
+    for action, arg_count in LEGACY_ACTIONS.items():
+        if data.startswith(action + "_"):
+            args = data[len(action) + 1:].split("_", arg_count - 1)
+            if len(args) == arg_count:
+                return CallbackData(action, tuple(args))
+
+    # Простые кнопки без аргументов ("start_profiling", "subscribe")
+    return CallbackData(data)
@@ -0,0 +1,166 @@
+"""
+Таблица переходов FSM: (состояние, тип обновления, действие callback) -> обработчик
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from telegram import Update
+
+from ona.utils.callback_data import decode
+
+logger = logging.getLogger(__name__)
+
+# Типы обновлений, различаемые таблицей
+MESSAGE = "message"
+CALLBACK_QUERY = "callback_query"
+
+
+class Route(NamedTuple):
+    """
+    Строка таблицы переходов.
+
+    None в update_type или action означает "любой"; более точная строка
+    имеет приоритет над менее точной.
+    """
+    state: str
+    update_type: Optional[str]
+    action: Optional[str]
+    # Имя метода обработчика, принимающего Update
+    method: str
+
+
+Target = Callable[[Update], Awaitable[Any]]
+RouteKey = Tuple[str, Optional[str], Optional[str]]
+
+_MISSING = object()
+
+
+def get_update_route(update: Update) -> Tuple[str, Optional[str]]:
+    """
+    Тип обновления и действие callback_data для поиска в таблице
+
+    Args:
+        update: Обновление от Telegram
+
+    Returns:
+        Tuple[str, Optional[str]]: (тип обновления, действие или None)
+    """
+    callback_query = update.callback_query
+    if callback_query is not None:
+        return CALLBACK_QUERY, decode(callback_query.data).action if callback_query.data else None
+    return MESSAGE, None
+
+
+class DispatchTable:
+    """
+    Скомпилированная таблица переходов.
+
+    Строки всех обработчиков один раз превращаются в словарь связанных
+    методов вместо цепочек if/elif и разбора строк в обработчиках.
+    Найденный для обновления метод запоминается, поэтому маршрутизация
+    повторяющихся обновлений - одно обращение к словарю.
+    """
+    # Ограничение размера словаря найденных маршрутов (действия приходят из callback_data)
+    MAX_RESOLVED = 4096
+
+    def __init__(self):
+        self._targets: Dict[RouteKey, Target] = {}
+        # (состояние, тип обновления, callback_data) -> найденный метод
+        self._resolved: Dict[Tuple, Optional[Target]] = {}
+
+    def add(self, route: Route, handler: Any):
+        """
+        Добавление строки таблицы
+
+        Args:
+            route: Строка таблицы
+            handler: Объект обработчика, у которого есть метод route.method
+        """
+        target = getattr(handler, route.method, None)
+        if target is None:
+            raise ValueError(f"У обработчика {type(handler).__name__} нет метода {route.method}")
+
+        key = (route.state, route.update_type, route.action)
+        if key in self._targets:
+            logger.warning(f"Маршрут {key} переопределен обработчиком {type(handler).__name__}")
+        self._targets[key] = target
+        self._resolved.clear()
+
+    def compile(self, handler: Any, routes=None):
+        """
+        Добавление всех строк обработчика
+
+        Args:
+            handler: Объект обработчика
+            routes: Строки таблицы (по умолчанию - атрибут ROUTES обработчика)
+        """
+        for route in (routes if routes is not None else handler.ROUTES):
+            self.add(route, handler)
+
+    def match(self, state: str, update: Update) -> Optional[Target]:
+        """
+        Поиск обработчика для обновления.
+
+        Результат запоминается по исходной строке callback_data, поэтому
+        на повторных нажатиях она не разбирается заново.
+
+        Args:
+            state: Текущее состояние пользователя
+            update: Обновление от Telegram
+
+        Returns:
+            Optional[Target]: Метод обработчика или None
+        """
+        callback_query = update.callback_query
+        if callback_query is None:
+            key = (state, MESSAGE, None)
+        else:
+            key = (state, CALLBACK_QUERY, callback_query.data)
+        target = self._resolved.get(key, _MISSING)
+        if target is not _MISSING:
+            return target
+
+        update_type, action = get_update_route(update)
+        target = self._resolve(state, update_type, action)
+        self._remember(key, target)
+        return target
+
+    def lookup(self, state: str, update_type: str, action: Optional[str] = None) -> Optional[Target]:
+        """
+        Поиск обработчика: сначала точное совпадение, затем по типу обновления,
+        затем для состояния целиком
+
+        Args:
+            state: Текущее состояние пользователя
+            update_type: MESSAGE или CALLBACK_QUERY
+            action: Действие из callback_data
+
+        Returns:
+            Optional[Target]: Метод обработчика или None
+        """
+        return self._resolve(state, update_type, action)
+
+    def _remember(self, key: Tuple, target: Optional[Target]):
+        """
+        Запоминание найденного маршрута
+        """
+        if len(self._resolved) >= self.MAX_RESOLVED:
+            self._resolved.clear()
+        self._resolved[key] = target
+
+    def _resolve(self, state: str, update_type: str, action: Optional[str]) -> Optional[Target]:
+        """
+        Поиск по строкам таблицы от самой точной к самой общей
+        """
+        targets = self._targets
+        if action is not None:
+            target = targets.get((state, update_type, action))
+            if target is not None:
+                return target
+        target = targets.get((state, update_type, None))
+        if target is not None:
+            return target
+        return targets.get((state, None, None))
+
+    def __len__(self) -> int:
+        return len(self._targets)
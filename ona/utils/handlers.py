@@ -38,7 +38,11 @@ class BaseHandler:
         next_state = state or self.next_state
         
         if next_state:
-            await state_router.set_user_state(user_id, next_state)
+            try:
+                await state_router.set_user_state(user_id, next_state)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояние {next_state} пользователя {user_id}: {e}")
+                return
             logger.info(f"Установлено следующее состояние для пользователя {user_id}: {next_state}")
 
 
@@ -0,0 +1,210 @@
+"""
+Постепенный вывод генерируемого ответа в Telegram: первое сообщение после
+первых токенов, затем редактирование с ограниченной частотой и перенос
+текста в новое сообщение на границе 4096 символов
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ona.utils.metrics import LatencyStats, metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста сообщения Telegram (в единицах UTF-16)
+MAX_MESSAGE_LENGTH = 4096
+
+
+def telegram_length(text: str) -> int:
+    """
+    Длина текста так, как ее считает Telegram (единицы UTF-16)
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> Tuple[str, str]:
+    """
+    Отделение начала текста, помещающегося в одно сообщение.
+    Разрыв переносится на последний перевод строки или пробел в последней
+    пятой части сообщения, чтобы не разрезать слово
+
+    Args:
+        text: Текст
+        limit: Максимальная длина сообщения
+
+    Returns:
+        Tuple[str, str]: Начало текста и остаток (пустой, если текст помещается)
+    """
+    if telegram_length(text) <= limit:
+        return text, ""
+
+    cut = min(len(text), limit)
+    overflow = telegram_length(text[:cut]) - limit
+    while overflow > 0:
+        # Символ занимает одну или две единицы UTF-16
+        cut -= (overflow + 1) // 2
+        overflow = telegram_length(text[:cut]) - limit
+
+    for separator in ("\n", " "):
+        position = text.rfind(separator, max(0, cut - limit // 5), cut)
+        if position > 0:
+            return text[:position], text[position + 1:]
+    return text[:cut], text[cut:]
+
+
+class StreamStats:
+    """
+    Метрики потокового вывода ответов
+    """
+    def __init__(self):
+        self.streams = 0
+        self.messages = 0
+        self.edits = 0
+        self.edit_errors = 0
+        self.first_visible_text = LatencyStats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики
+
+        Returns:
+            Dict[str, Any]: Количество ответов, сообщений и правок, время до первого видимого текста
+        """
+        return {
+            "streams": self.streams,
+            "messages": self.messages,
+            "edits": self.edits,
+            "edit_errors": self.edit_errors,
+            "first_visible_text": self.first_visible_text.snapshot(),
+        }
+
+
+class MessageStream:
+    """
+    Вывод текста, поступающего частями, в одно или несколько сообщений.
+
+    Первое сообщение отправляется сразу после первого непустого фрагмента,
+    затем сообщение редактируется не чаще одного раза в edit_interval
+    секунд (всегда последним накопленным текстом). Когда текст перестает
+    помещаться в сообщение, оно дописывается до границы, а остаток
+    выводится в новом сообщении. Частоту запросов к Telegram дополнительно
+    ограничивает SendScheduler.
+    """
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        edit_interval: float = 1.0,
+        limit: int = MAX_MESSAGE_LENGTH,
+        stats: Optional[StreamStats] = None,
+        started_at: Optional[float] = None
+    ):
+        """
+        Инициализация вывода
+
+        Args:
+            send: Отправка нового сообщения (например, update.message.reply_text);
+                возвращает сообщение с методом edit_text
+            edit_interval: Минимальный интервал между правками сообщения в секундах
+            limit: Максимальная длина одного сообщения
+            stats: Метрики (по умолчанию - общие метрики потокового вывода)
+            started_at: Начало обработки (time.perf_counter) для метрики первого видимого текста
+        """
+        self._send = send
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.stats = stats if stats is not None else stream_stats
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.messages: List[Any] = []
+        # Сообщение, в которое выводится текущий текст (None - еще не отправлено)
+        self._message = None
+        # Текст текущего сообщения и текст, который в нем показан
+        self._text = ""
+        self._shown = ""
+        self._last_edit_at = 0.0
+        self.stats.streams += 1
+
+    @property
+    def visible(self) -> bool:
+        """
+        Отправлено ли хотя бы одно сообщение
+        """
+        return bool(self.messages)
+
+    async def _edit(self, text: str):
+        """
+        Правка текущего сообщения (ошибка правки не прерывает вывод)
+        """
+        if text == self._shown:
+            return
+        try:
+            await self._message.edit_text(text)
+            self.stats.edits += 1
+        except Exception as e:
+            # Например, "Message is not modified"; следующая правка покажет полный текст
+            self.stats.edit_errors += 1
+            logger.warning(f"Ошибка при обновлении сообщения: {e}")
+            return
+        finally:
+            self._last_edit_at = time.monotonic()
+        self._shown = text
+
+    async def _show(self, text: str):
+        """
+        Вывод текста в текущее сообщение: отправка нового или правка отправленного
+        """
+        if self._message is not None:
+            await self._edit(text)
+            return
+        # Пробельные символы не отправляются отдельным сообщением
+        if not text.strip():
+            return
+        self._message = await self._send(text)
+        self.messages.append(self._message)
+        self.stats.messages += 1
+        if len(self.messages) == 1:
+            self.stats.first_visible_text.observe(time.perf_counter() - self.started_at)
+        self._shown = text
+        self._last_edit_at = time.monotonic()
+
+    async def _overflow(self):
+        """
+        Дописывание текущего сообщения до границы и перенос остатка в новые сообщения
+        """
+        head, tail = split_message(self._text, self.limit)
+        while tail:
+            await self._show(head)
+            self._message = None
+            self._shown = ""
+            self._text = tail
+            head, tail = split_message(self._text, self.limit)
+
+    async def feed(self, delta: str):
+        """
+        Добавление очередного фрагмента текста
+
+        Args:
+            delta: Фрагмент ответа
+        """
+        if not delta:
+            return
+        self._text += delta
+        if telegram_length(self._text) > self.limit:
+            await self._overflow()
+
+        if self._message is None or time.monotonic() - self._last_edit_at >= self.edit_interval:
+            await self._show(self._text)
+
+    async def finish(self) -> bool:
+        """
+        Вывод оставшегося текста после окончания генерации
+
+        Returns:
+            bool: True если ответ выведен (хотя бы одно сообщение отправлено)
+        """
+        await self._show(self._text)
+        return self.visible
+
+
+# Создание экземпляра метрик потокового вывода
+stream_stats = StreamStats()
+metrics_registry.register("chat_stream", stream_stats.get_stats)
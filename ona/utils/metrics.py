@@ -0,0 +1,119 @@
+"""
+Внутрипроцессные метрики приложения
+"""
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional
+
+
+class LatencyStats:
+    """
+    Накопитель задержек: общие счетчики и скользящее окно для перцентилей
+    """
+    def __init__(self, window: int = 1000):
+        """
+        Инициализация накопителя
+
+        Args:
+            window: Количество последних измерений для расчета перцентилей
+        """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._window = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        """
+        Регистрация одного измерения
+
+        Args:
+            seconds: Длительность в секундах
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._window.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Текущее состояние накопителя
+
+        Returns:
+            Dict[str, Any]: Количество измерений и задержки в миллисекундах
+        """
+        window = sorted(self._window)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": round(_percentile(window, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(window, 0.95) * 1000, 3),
+        }
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    """
+    Перцентиль по уже отсортированному списку
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Timer:
+    """
+    Контекстный менеджер для замера длительности блока кода
+    """
+    def __init__(self, stats: Optional[LatencyStats] = None):
+        self.stats = stats
+        self.elapsed = 0.0
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._started
+        if self.stats is not None:
+            self.stats.observe(self.elapsed)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Реестр источников метрик, доступных через /health/metrics
+    """
+    def __init__(self):
+        self._providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, name: str, provider: Callable[[], Dict[str, Any]]):
+        """
+        Регистрация источника метрик
+
+        Args:
+            name: Имя группы метрик
+            provider: Функция, возвращающая словарь с текущими значениями
+        """
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Сбор текущих значений всех зарегистрированных источников
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Метрики, сгруппированные по имени источника
+        """
+        result = {}
+        for name, provider in self._providers.items():
+            try:
+                result[name] = provider()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+
+# Создание общего реестра метрик
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,74 @@
+"""
+Объединение одновременных одинаковых запросов к внешним API (single-flight)
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Одновременные вызовы с одинаковым ключом выполняются один раз.
+
+    Первый вызов запускает запрос отдельной задачей, остальные вызовы с тем
+    же ключом ждут ее и получают тот же результат (или то же исключение).
+    Отмена одного из ожидающих не отменяет запрос для остальных. После
+    завершения запроса ключ освобождается: следующий вызов выполнит его заново.
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+        # Метрики
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполнение запроса или присоединение к уже выполняющемуся
+
+        Args:
+            key: Отпечаток запроса (одинаковые запросы - одинаковый ключ)
+            fn: Запрос (асинхронная функция без аргументов)
+
+        Returns:
+            T: Результат запроса
+        """
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        """
+        Освобождение ключа после завершения запроса
+        """
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Исключение получают ожидающие; если все они отменены, оно только логируется
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Запрос {key!r} завершился ошибкой: {task.exception()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Текущие метрики
+
+        Returns:
+            Dict[str, Any]: Количество вызовов, выполненных и объединенных запросов
+        """
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
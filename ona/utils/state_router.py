@@ -1,20 +1,33 @@
 from telegram import Update
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from ona.utils.handlers import InitialHandler, AwaitingInputHandler
 from ona.core.fsm.handlers.registration_handler import RegistrationHandler, STATES as REGISTRATION_STATES
 from ona.core.fsm.handlers.profiling_psychology_handler import ProfilingPsychologyHandler, STATE as PSYCHOLOGY_STATE
+from ona.core.services.state_store import user_state_store
+from ona.core.services.session_context import session_contexts
+from ona.utils.dispatch_table import DispatchTable, Route
 
 logger = logging.getLogger(__name__)
 
+# Версия состояния, прочитанная при маршрутизации текущего обновления: (user_id, версия)
+_routed_version: ContextVar = ContextVar("routed_state_version", default=None)
+
 class StateRouter:
     """
     Класс для маршрутизации сообщений на основе FSM (Finite State Machine)
     """
-    def __init__(self):
+    def __init__(self, state_store=None):
         """
         Инициализация маршрутизатора состояний
+        
+        Args:
+            state_store: Хранилище состояний пользователей (по умолчанию - общее хранилище)
         """
         self.handlers = {}  # Словарь обработчиков для разных состояний
+        self.table = DispatchTable()  # Скомпилированная таблица переходов
+        self.state_store = state_store if state_store is not None else user_state_store
         self._register_default_handlers()
     
     def _register_default_handlers(self):
@@ -27,11 +40,13 @@ class StateRouter:
         # Регистрация обработчика для профилирования
         registration_handler = RegistrationHandler()
         for state in REGISTRATION_STATES.values():
-            self.register_handler(state, registration_handler)
+            self.handlers[state] = registration_handler
+        self.register_routes(registration_handler)
             
         # Регистрация обработчика для психологического профилирования
         psychology_handler = ProfilingPsychologyHandler()
-        self.register_handler(PSYCHOLOGY_STATE, psychology_handler)
+        self.handlers[PSYCHOLOGY_STATE] = psychology_handler
+        self.register_routes(psychology_handler)
     
     def register_handler(self, state, handler):
         """
@@ -42,8 +57,20 @@ class StateRouter:
             handler: Обработчик для данного состояния
         """
         self.handlers[state] = handler
+        self.table.add(Route(state, None, None, "handle"), handler)
         logger.info(f"Зарегистрирован обработчик для состояния: {state}")
     
+    def register_routes(self, handler, routes=None):
+        """
+        Добавление строк таблицы переходов обработчика
+        
+        Args:
+            handler: Обработчик с атрибутом ROUTES (список Route)
+            routes: Строки таблицы, если они отличаются от handler.ROUTES
+        """
+        self.table.compile(handler, routes)
+        logger.info(f"Зарегистрированы маршруты обработчика {type(handler).__name__}")
+    
     async def route(self, update: Update):
         """
         Маршрутизация сообщения на основе текущего состояния пользователя
@@ -53,21 +80,54 @@ class StateRouter:
         """
         user_id = update.effective_user.id
         
-        # Получение текущего состояния пользователя из базы данных
-        # В будущем это должно быть заменено на реальную функцию получения состояния
-        state = await self.get_user_state(user_id)
+        # Получение текущего состояния пользователя (из кэша или базы данных) и его версии:
+        # переходы обработчика выполняются, только если состояние с тех пор не изменилось
+        state, version = await self.get_user_state_versioned(user_id)
         
         logger.info(f"Маршрутизация сообщения для пользователя {user_id}, состояние: {state}")
         
-        # Получение соответствующего обработчика
-        handler = self.handlers.get(state)
+        # Поиск обработчика в таблице переходов
+        target = self.table.match(state, update)
         
-        if handler:
-            await handler.handle(update)
-        else:
+        if target is None:
             # Обработка неизвестного состояния - используем обработчик начального состояния
             logger.warning(f"Не найден обработчик для состояния {state}, используем обработчик начального состояния")
-            await self.handlers["initial"].handle(update)
+            target = self.table.match("initial", update)
+        
+        # Обработчик получает данные пользователя через контекст обновления
+        with self.expecting(user_id, version):
+            async with session_contexts.scope(user_id):
+                await target(update)
+    
+    @contextmanager
+    def expecting(self, user_id, version):
+        """
+        Версия состояния, на основе которой обработчик выполняет переходы
+        
+        Args:
+            user_id: Идентификатор пользователя
+            version: Версия, прочитанная вместе с состоянием
+        """
+        token = _routed_version.set((user_id, version))
+        try:
+            yield
+        finally:
+            _routed_version.reset(token)
+    
+    def current_version(self, user_id):
+        """
+        Версия состояния пользователя, прочитанная при маршрутизации текущего обновления
+        
+        Args:
+            user_id: Идентификатор пользователя
+            
+        Returns:
+            Версия для transition(..., expected_version=...) или None вне маршрутизации
+        """
+        routed = _routed_version.get()
+        if routed is None or routed[0] != user_id:
+            return None
+        return routed[1]
     
     async def get_user_state(self, user_id):
         """
@@ -79,20 +139,39 @@ class StateRouter:
         Returns:
             Текущее состояние пользователя или состояние по умолчанию
         """
-        # Заглушка - в будущем будет заменена на получение состояния из базы данных
-        return "initial"
+        return await self.state_store.get(user_id)
+    
+    async def get_user_state_versioned(self, user_id):
+        """
+        Получение текущего состояния пользователя вместе с версией
+        
+        Args:
+            user_id: Идентификатор пользователя
+            
+        Returns:
+            Кортеж (состояние, версия) для последующего set_user_state с expected_version
+        """
+        return await self.state_store.get_versioned(user_id)
     
-    async def set_user_state(self, user_id, state):
+    async def set_user_state(self, user_id, state, expected_version=None):
         """
         Установка состояния пользователя в базе данных
         
         Args:
             user_id: Идентификатор пользователя
             state: Новое состояние
+            expected_version: Версия, прочитанная перед переходом; при несовпадении
+                выбрасывается StateConflictError
+            
+        Returns:
+            Новая версия состояния
         """
-        # Заглушка - в будущем будет заменена на сохранение состояния в базе данных
         logger.info(f"Установка состояния {state} для пользователя {user_id}")
-        pass
+        version = await self.state_store.set(user_id, state, expected_version)
+        # Следующий переход в том же обновлении выполняется от новой версии
+        if expected_version is not None and self.current_version(user_id) == expected_version:
+            _routed_version.set((user_id, version))
+        return version
 
 
 # Создание экземпляра маршрутизатора состояний
@@ -0,0 +1,101 @@
+"""
+Локальный подсчет токенов запросов к OpenAI
+"""
+import logging
+from functools import lru_cache
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken - необязательная зависимость
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены формата чата: на каждое сообщение и на начало ответа
+MESSAGE_OVERHEAD = 3
+REPLY_OVERHEAD = 3
+
+# Без tiktoken: в среднем около 4 байт UTF-8 на токен (оценка сверху для кириллицы)
+BYTES_PER_TOKEN = 4
+
+
+# Загрузка кодировки не удалась (например, нет сети для скачивания файла BPE):
+# дальше считаем приближенно, не повторяя загрузку на каждом запросе
+_encoding_failed = False
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    """
+    Кодировка модели (неизвестные модели считаются по cl100k_base)
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _encoding(model: str):
+    """
+    Кодировка модели или None, если tiktoken недоступен или кодировку не удалось загрузить
+    """
+    global _encoding_failed
+    if tiktoken is None or _encoding_failed:
+        return None
+    try:
+        return _load_encoding(model)
+    except Exception as e:
+        _encoding_failed = True
+        logger.warning(f"Не удалось загрузить кодировку tiktoken для {model}, токены считаются приближенно: {e}")
+        return None
+
+
+def preload_encoding(model: str = "gpt-4") -> bool:
+    """
+    Загрузка кодировки заранее (при первом использовании tiktoken скачивает
+    файл BPE). Вызывается при старте приложения вне цикла событий
+
+    Args:
+        model: Модель OpenAI (модели GPT-4 используют одну кодировку cl100k_base)
+
+    Returns:
+        bool: True если подсчет будет точным
+    """
+    return _encoding(model) is not None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """
+    Количество токенов в тексте: точно с tiktoken, иначе приближенно
+
+    Args:
+        text: Текст
+        model: Модель OpenAI
+
+    Returns:
+        int: Количество токенов
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4") -> int:
+    """
+    Количество токенов промпта из сообщений чата (вместе со служебными токенами)
+
+    Args:
+        messages: Сообщения в формате OpenAI (role, content)
+        model: Модель OpenAI
+
+    Returns:
+        int: Количество токенов промпта
+    """
+    return REPLY_OVERHEAD + sum(
+        MESSAGE_OVERHEAD + count_tokens(message["role"], model) + count_tokens(message["content"], model)
+        for message in messages
+    )
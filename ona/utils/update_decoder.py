@@ -0,0 +1,114 @@
+"""
+Быстрое декодирование обновлений Telegram из тела вебхука
+"""
+import json
+from typing import Any, Dict, Optional
+
+from telegram import Update
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость
+    orjson = None
+
+# Поля обновления, в которых Telegram передает отправителя
+_USER_FIELDS = ("from", "user")
+
+
+def loads(body: bytes) -> Dict[str, Any]:
+    """
+    Декодирование JSON: orjson, если он установлен, иначе стандартный json
+
+    Args:
+        body: Сырое тело запроса
+
+    Returns:
+        Dict[str, Any]: Декодированные данные
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class RawUpdate:
+    """
+    Обновление Telegram в виде словаря с заранее извлеченными полями
+    для маршрутизации и дедупликации.
+
+    Полный объект telegram.Update строится только при первом обращении
+    к to_update().
+    """
+    __slots__ = ("data", "update_id", "update_type", "payload", "user_id", "_update")
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Инициализация обновления
+
+        Args:
+            data: JSON-данные обновления от Telegram
+        """
+        self.data = data
+        self.update_id: Optional[int] = data.get("update_id")
+        self.update_type: Optional[str] = None
+        self.payload: Dict[str, Any] = {}
+        self.user_id: Optional[int] = None
+        self._update: Optional[Update] = None
+
+        # В обновлении Telegram кроме update_id ровно одно поле - его тип
+        for key, value in data.items():
+            if key != "update_id" and isinstance(value, dict):
+                self.update_type = key
+                self.payload = value
+                break
+
+        for field in _USER_FIELDS:
+            sender = self.payload.get(field)
+            if isinstance(sender, dict) and "id" in sender:
+                self.user_id = sender["id"]
+                break
+        else:
+            chat = self.payload.get("chat")
+            if isinstance(chat, dict):
+                self.user_id = chat.get("id")
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> "RawUpdate":
+        """
+        Создание обновления из сырого тела запроса
+
+        Args:
+            body: Тело запроса вебхука
+
+        Returns:
+            RawUpdate: Декодированное обновление
+        """
+        data = loads(body)
+        if not isinstance(data, dict):
+            raise ValueError("Тело вебхука не является JSON-объектом")
+        return cls(data)
+
+    @classmethod
+    def coerce(cls, update_data) -> "RawUpdate":
+        """
+        Приведение словаря или RawUpdate к RawUpdate
+        """
+        if isinstance(update_data, cls):
+            return update_data
+        return cls(update_data)
+
+    def to_update(self, bot) -> Update:
+        """
+        Построение (однократное) полного объекта telegram.Update
+
+        Args:
+            bot: Экземпляр бота, к которому привязывается обновление
+
+        Returns:
+            Update: Объект обновления python-telegram-bot
+        """
+        if self._update is None:
+            self._update = Update.de_json(self.data, bot)
+        return self._update
+
+    def __repr__(self) -> str:
+        return f"RawUpdate(update_id={self.update_id}, type={self.update_type}, user_id={self.user_id})"